@@ -1,981 +1,1164 @@
-import pandas as pd
 import argparse 
 import os
-import numpy as np
-import openpyxl
 
-def parse_args():
+from checkpoints import STAGES
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('--month', type=str, help='Monat für Filterung (optional)')
     parser.add_argument('--username', type=str, help='Filter by username')
-    parser.add_argument('--recl', default='recl.xlsx', help='Pfad zur recl.xlsx Datei')
-    parser.add_argument('--grp', default='grp.xlsx', help='Pfad zur grp.xlsx Datei')
-    return parser.parse_args()
-
-# Parcer ergänzt
-args = parse_args()
-
-print(f"Verarbeitung für Monat: {args.month}")
-print(f"Recl-Datei: {args.recl}")
-
-# Überprüfen ob die Datei exists
-if not os.path.exists(args.recl):
-    print(f"Fehler: Datei {args.recl} nicht gefunden!")
-    exit(1)
-
-# 1. Rohdaten komplett einlesen (ohne Header)
-df_raw = pd.read_excel(args.recl, header=None, engine='openpyxl')
-df_grp = pd.read_excel(args.grp, header=None, engine='openpyxl') 
-df_raw.to_excel('file2_raw.xlsx', header=False, index=False)
-print("Rohdaten: file2_raw.xlsx")
-
-# 2. Erste 3 Zeilen entfernen
-df_no_rows = df_raw.iloc[3:].reset_index(drop=True)
+    parser.add_argument('--recl', nargs='+', default=['recl.xlsx'],
+                        help='Pfad zur recl.xlsx Datei (mehrere Dateien werden zusammengeführt)')
+    parser.add_argument('--grp', nargs='+', default=['grp.xlsx'],
+                        help='Pfad zur grp.xlsx Datei (mehrere Dateien werden zusammengeführt)')
+    parser.add_argument('--user-directory', help='Pfad zum User-Regionen-Verzeichnis (optional, Standard user_regionen.db)')
+    parser.add_argument('--chunk-size', type=int, help='Eingaben blockweise mit dieser Zeilenanzahl verarbeiten (optional, für sehr große Exporte)')
+    parser.add_argument('--job-id', help='Zwischenstände unter dieser Auftrags-ID sichern und bei erneutem Lauf fortsetzen (optional)')
+    parser.add_argument('--rerun-from', choices=STAGES,
+                        help='Mit --job-id: Zwischenstände ab diesem Schritt verwerfen und neu berechnen')
+    parser.add_argument('--timeout', type=float,
+                        help='Analyse nach so vielen Sekunden zwischen zwei Schritten abbrechen (optional)')
+    parser.add_argument('--quick-look', action='store_true',
+                        help='Nur Näherungswerte aus einer Stichprobe anzeigen, ohne Ergebnisdatei (siehe quick_look.py)')
+    parser.add_argument('--sample-size', type=int, help='Stichprobengröße für --quick-look (optional, Standard 2000 Zeilen)')
+    parser.add_argument('--debug-dumps', action='store_true',
+                        help='Zwischenstände zur Fehlersuche im Hintergrund ablegen (optional, Standard ANALYSIS_DEBUG_DUMPS, siehe debug_artifacts.py)')
+    parser.add_argument('--frames', help='Eingelesene Rohdaten mit anderen Analyse-Prozessen über diese Datei teilen (optional, siehe shared_frames.py)')
+    return parser.parse_args(argv)
+
+def result_filename_for(month: str | None) -> str:
+    """Name der Ergebnisdatei, z.B. Ergebnis_March.xlsx oder Ergebnis_Alle_Monate.xlsx."""
+    safe_month = month.strip() if month and month.strip() else "Alle_Monate"
+    return f'Ergebnis_{safe_month}.xlsx'
+
+def as_file_list(sources) -> list:
+    """Einzelne Datei oder Liste von Dateien als Liste (None = keine Datei)."""
+    if sources is None:
+        return []
+    return list(sources) if isinstance(sources, (list, tuple)) else [sources]
+
+def load_inputs(recl, grp, debug_dumps: bool = False):
+    """
+    1. Rohdaten komplett einlesen (ohne Header).
+
+    `recl` und `grp` können Dateipfade oder Puffer (z.B. BytesIO) sein; recl
+    darf auch ein PDF mit der Beanstandungstabelle sein (siehe pdf_ingest.py).
+    Listen mit mehreren Dateien werden parallel eingelesen, dedupliziert und
+    nach Datum sortiert zusammengeführt (siehe multi_ingest.py).
+    Mit `debug_dumps` werden die Rohdaten im Hintergrund als Zwischenstand
+    abgelegt (siehe debug_artifacts.py).
+    """
+    import pandas as pd
+    from pdf_ingest import is_pdf, load_recl_pdf
+    recl_files, grp_files = as_file_list(recl), as_file_list(grp)
+    if len(recl_files) > 1 or len(grp_files) > 1:
+        from multi_ingest import load_many
+        df_raw, df_grp = load_many(recl_files, grp_files)
+        if debug_dumps:
+            from debug_artifacts import dump
+            dump(df_raw, 'file2_raw')
+        return df_raw, df_grp
+
+    recl = recl_files[0] if recl_files else None
+    grp = grp_files[0] if grp_files else None
+    if is_pdf(recl):
+        df_raw = load_recl_pdf(recl)
+    else:
+        df_raw = pd.read_excel(recl, header=None, engine='openpyxl')
+    df_grp = pd.read_excel(grp, header=None, engine='openpyxl') 
+    if debug_dumps:
+        from debug_artifacts import dump
+        dump(df_raw, 'file2_raw')
+    return df_raw, df_grp
 
 # 3. Spalten entfernen:
 #    - die ersten 4 Spalten (0–3)
 #    - zusätzlich Spalten 11, 14, 15, 17, 21, 22, 23, 24, 25
 #    - sowie Spalten 27 bis 41 (inklusive)
-cols_to_drop = [0, 1, 2, 3,
-                11, 14, 15, 17,
-                21, 22, 23, 24, 25] + list(range(27, 41))
-
-df_processed = df_no_rows.drop(columns=cols_to_drop, errors='ignore')
-df_processed.to_excel('file2_processed.xlsx', header=False, index=False)
-print("Ohne ausgewählte Spalten: file2_processed.xlsx")
-
-# 4. Filtern:
-#    – Die erste Zeile (Header) unberührt lassen
-header_row = df_processed.iloc[[0]]
-data_rows  = df_processed.iloc[1:]
-
-#    – Nur Zeilen, in denen Spalte 18 == "Einsteller"
-# Bedingung für username: nur wenn args.username gesetzt ist
-if args.username:
-    username_condition = (data_rows[7].astype(str) == args.username)
-else:
-    username_condition = True  # Wenn kein Username gegeben, alle Zeilen durchlassen
-
-mask = (
-    (data_rows[18] == 'Einsteller') &
-    username_condition &
-    (data_rows[19] != 'Wurde abgelehnt'))
-
-filtered_rows = data_rows[mask]
-
-# Monatfilterung ergänzt
-if args.month and len(filtered_rows) > 0:
-    # Monatszuordnung
-    month_map = {
-        'January': 1, 'February': 2, 'March': 3, 'April': 4,
-        'May': 5, 'June': 6, 'July': 7, 'August': 8,
-        'September': 9, 'October': 10, 'November': 11, 'December': 12
-    }
+RECL_COLS_TO_DROP = [0, 1, 2, 3,
+                     11, 14, 15, 17,
+                     21, 22, 23, 24, 25] + list(range(27, 41))
 
-    try:
-        print(f"\n=== Monatsfilterung für {args.month} ===")
+# 10. Spalten entfernen Gruppenreporting:
+GRP_COLS_TO_DROP = [0, 1,
+                    6, 7, 9, 10, 11,
+                    12, 13, 14, 16, 17] + list(range(18, 31))
+
+# Monatszuordnung
+MONTH_MAP = {
+    'January': 1, 'February': 2, 'March': 3, 'April': 4,
+    'May': 5, 'June': 6, 'July': 7, 'August': 8,
+    'September': 9, 'October': 10, 'November': 11, 'December': 12
+}
+
+def _quiet(*args, **kwargs):
+    pass
+
+def filter_recl_rows(data_rows, month: str | None = None, username: str | None = None,
+                     verbose: bool = True, date_format: str | None = None):
+    """
+    Schritt 4: Datenzeilen (ohne Header) nach Einsteller, Status, User und Monat filtern.
+
+    `date_format` legt das Datumsformat fest, statt es aus den Werten zu erraten
+    (wichtig bei blockweiser Verarbeitung, damit jeder Block gleich gelesen wird).
+    """
+    import pandas as pd
+    say = print if verbose else _quiet
+
+    #    – Nur Zeilen, in denen Spalte 18 == "Einsteller"
+    # Bedingung für username: nur wenn username gesetzt ist
+    if username:
+        username_condition = (data_rows[7].astype(str) == username)
+    else:
+        username_condition = True  # Wenn kein Username gegeben, alle Zeilen durchlassen
+
+    mask = (
+        (data_rows[18] == 'Einsteller') &
+        username_condition &
+        (data_rows[19] != 'Wurde abgelehnt'))
+
+    filtered_rows = data_rows[mask]
+
+    # Monatfilterung ergänzt
+    if month and len(filtered_rows) > 0:
+        try:
+            say(f"\n=== Monatsfilterung für {month} ===")
         
-        # Nach dem Löschen der Spalten ist die Datumsspalte jetzt Spalte 0
-        # (weil Spalten 0,1,2,3 gelöscht wurden)
+            # Nach dem Löschen der Spalten ist die Datumsspalte jetzt Spalte 0
+            # (weil Spalten 0,1,2,3 gelöscht wurden)
 
-        date_column_position = 0  # Erste Spalte (positionsmäßig)
-        print(f"Verwende Spalte an Position {date_column_position} für Datumsfilterung")
+            date_column_position = 0  # Erste Spalte (positionsmäßig)
+            say(f"Verwende Spalte an Position {date_column_position} für Datumsfilterung")
 
-        print(f"Erste 5 Werte in Datumsspalte:")
-        print(filtered_rows.iloc[:5, date_column_position] if len(filtered_rows) > 0 else "Keine Daten")
+            say(f"Erste 5 Werte in Datumsspalte:")
+            say(filtered_rows.iloc[:5, date_column_position] if len(filtered_rows) > 0 else "Keine Daten")
         
-        # Datumskonvertierung mit dem richtigen Format DD/MM/YYYY
-        date_series = pd.to_datetime(
-            filtered_rows.iloc[:, 0],  
-            errors='coerce'
-        )
+            # Datumskonvertierung mit dem richtigen Format DD/MM/YYYY
+            date_series = pd.to_datetime(
+                filtered_rows.iloc[:, 0],  
+                format=date_format,
+                errors='coerce'
+            )
         
-        # Wenn nicht alle Daten erkannt wurden, wir versuchen spezifische Formate
-        if date_series.notna().sum() < len(filtered_rows) * 0.5:  # Wenn weniger als 50% erkannt
-            for fmt in date_formats:
-                try:
-                    date_series = pd.to_datetime(filtered_rows[0], format=fmt, errors='coerce')
-                    if date_series.notna().sum() > 0:
-                        print(f"Verwendetes Datumsformat: {fmt}")
-                        break
-                except:
-                    continue
+            # Wenn nicht alle Daten erkannt wurden, wir versuchen spezifische Formate
+            if date_series.notna().sum() < len(filtered_rows) * 0.5:  # Wenn weniger als 50% erkannt
+                for fmt in date_formats:
+                    try:
+                        date_series = pd.to_datetime(filtered_rows[0], format=fmt, errors='coerce')
+                        if date_series.notna().sum() > 0:
+                            say(f"Verwendetes Datumsformat: {fmt}")
+                            break
+                    except:
+                        continue
         
-        # Debug-Informationen
-        valid_dates = date_series.notna().sum()
-        print(f"Erfolgreich konvertierte Datumsangaben: {valid_dates} von {len(date_series)}")
+            # Debug-Informationen
+            valid_dates = date_series.notna().sum()
+            say(f"Erfolgreich konvertierte Datumsangaben: {valid_dates} von {len(date_series)}")
         
-        month_number = month_map.get(args.month, 1)
-        print(f"Filtern nach Monat: {args.month} (Nummer {month_number})")
+            month_number = MONTH_MAP.get(month, 1)
+            say(f"Filtern nach Monat: {month} (Nummer {month_number})")
 
-        if valid_dates > 0:
-            available_months = sorted(date_series.dt.month.dropna().unique())
-            print(f"Verfügbare Monate in den Daten: {available_months}")
+            if valid_dates > 0:
+                available_months = sorted(date_series.dt.month.dropna().unique())
+                say(f"Verfügbare Monate in den Daten: {available_months}")
             
 
-            # Prüfen ob der gewünschte Monat in den Daten vorhanden ist
-            if month_number not in available_months:
-                print(f"ACHTUNG: Monat {args.month} ({month_number}) ist in den Daten nicht vorhanden!")
+                # Prüfen ob der gewünschte Monat in den Daten vorhanden ist
+                if month_number not in available_months:
+                    say(f"ACHTUNG: Monat {month} ({month_number}) ist in den Daten nicht vorhanden!")
             
-            # Monatsfilterung anwenden
-            month_mask = date_series.dt.month == month_number
-            rows_before = len(filtered_rows)
-            filtered_rows = filtered_rows[month_mask]
-            rows_after = len(filtered_rows)
+                # Monatsfilterung anwenden
+                month_mask = date_series.dt.month == month_number
+                rows_before = len(filtered_rows)
+                filtered_rows = filtered_rows[month_mask]
+                rows_after = len(filtered_rows)
             
-            print(f"Zeilen vor Filter: {rows_before}")
-            print(f"Zeilen nach Filter: {rows_after}")
+                say(f"Zeilen vor Filter: {rows_before}")
+                say(f"Zeilen nach Filter: {rows_after}")
             
-            print(f"Gefiltert nach Monat: {args.month}")
-        else:
-            print("Keine Datumsangaben konnten konvertiert werden!")
+                say(f"Gefiltert nach Monat: {month}")
+            else:
+                say("Keine Datumsangaben konnten konvertiert werden!")
             
-    except Exception as e:
-        print(f"Fehler bei der Monatsfilterung: {e}")
-        import traceback
-        traceback.print_exc()
-
-#    Header und gefilterte Daten wieder zusammenfügen
-df_final = pd.concat([header_row, filtered_rows], ignore_index=True)
-
-# 5. Timestamp-Spalten 0 und 6 in reines Datum wandeln (ab Zeile 1)
-for col_idx in (0, 6):
-    df_final.iloc[1:, col_idx] = pd.to_datetime(
-        df_final.iloc[1:, col_idx],
+        except Exception as e:
+            print(f"Fehler bei der Monatsfilterung: {e}")
+            import traceback
+            traceback.print_exc()
+
+    return filtered_rows
+
+def to_date(values):
+    """5. Timestamp-Werte (dd.mm.YYYY HH:MM:SS) in reines Datum wandeln."""
+    import pandas as pd
+    return pd.to_datetime(
+        values,
         format="%d.%m.%Y %H:%M:%S", 
         # infer_datetime_format=True,
         errors='coerce'
     ).dt.date
 
-# 6. Ergebnis in einer Excel-Datei mit mehreren Registerkarten speichern
-safe_month = args.month.strip() if args.month and args.month.strip() else "Alle_Monate"
-result_filename = f'Ergebnis_{safe_month}.xlsx'
+def filter_recl(df_raw, month: str | None = None, username: str | None = None, debug_dumps: bool = False):
+    """Schritte 2-5: recl-Daten bereinigen und nach Einsteller, Status, User und Monat filtern."""
+    import pandas as pd
+    # 2. Erste 3 Zeilen entfernen
+    df_no_rows = df_raw.iloc[3:].reset_index(drop=True)
+
+    # 3. Spalten entfernen
+    df_processed = df_no_rows.drop(columns=RECL_COLS_TO_DROP, errors='ignore')
+    if debug_dumps:
+        from debug_artifacts import dump
+        dump(df_processed, 'file2_processed')
+
+    # 4. Filtern:
+    #    – Die erste Zeile (Header) unberührt lassen
+    header_row = df_processed.iloc[[0]]
+    data_rows  = df_processed.iloc[1:]
+
+    filtered_rows = filter_recl_rows(data_rows, month, username)
+
+    #    Header und gefilterte Daten wieder zusammenfügen
+    df_final = pd.concat([header_row, filtered_rows], ignore_index=True)
+
+    # 5. Timestamp-Spalten 0 und 6 in reines Datum wandeln (ab Zeile 1)
+    for col_idx in (0, 6):
+        df_final.iloc[1:, col_idx] = to_date(df_final.iloc[1:, col_idx])
+
+    return df_final
+
+def filter_grp_rows(data_rows_grp, month: str | None = None, username: str | None = None,
+                    verbose: bool = True, date_format: str | None = None):
+    """Schritte 11-12: Datenzeilen (ohne Header) nach Verkauft, User und Monat filtern."""
+    import pandas as pd
+    say = print if verbose else _quiet
+
+    # Filtern nach Bedingungen (passen Sie die Spaltenpositionen an)
+    # Beispiel: Angenommen, nach dem Löschen ist:
+    # Spalte 0: 'Verkauft'/anderer Wert
+    if len(data_rows_grp.columns) > 1:
+        if username:
+            username_condition_gr = (data_rows_grp.iloc[:, 1].astype(str) == username)
+        else:
+            username_condition_gr = pd.Series(True, index=data_rows_grp.index)
 
-try:
-    # Erste Registerkarte: "Alle" - die gefilterten Daten
-    sheet_name = f'Alle_{safe_month}'
-    # sheet_name = f'Alle_{args.month}'
-    with pd.ExcelWriter(result_filename, engine='openpyxl') as writer:
-        df_final.to_excel(writer, sheet_name=sheet_name, index=False, header=False)
-    
-        # Greifen auf das Worksheet-Objekt zu
-        worksheet_alle = writer.sheets[sheet_name]
-        # Standardbreite ist oft ~8.43, wir setzen z.B. 25
-        worksheet_alle.column_dimensions['A'].width = 15
-        worksheet_alle.column_dimensions['B'].width = 10
-        worksheet_alle.column_dimensions['C'].width = 15
-        worksheet_alle.column_dimensions['D'].width = 10
-        worksheet_alle.column_dimensions['E'].width = 10
-        worksheet_alle.column_dimensions['F'].width = 10
-        worksheet_alle.column_dimensions['G'].width = 15
-        worksheet_alle.column_dimensions['H'].width = 25
-        worksheet_alle.column_dimensions['I'].width = 25
-        worksheet_alle.column_dimensions['J'].width = 40
-        worksheet_alle.column_dimensions['K'].width = 10
-        worksheet_alle.column_dimensions['L'].width = 20
-        worksheet_alle.column_dimensions['M'].width = 20
-        worksheet_alle.column_dimensions['N'].width = 30
-
-    print(f"Gefilterte Daten gespeichert in Registerkarte 'Alle' der Datei: {result_filename}")
-    
-except Exception as e:
-    print(f"Fehler beim Speichern der gefilterten Daten: {e}")
-    import traceback
-    traceback.print_exc()
-
-# 7. Erledigt und Offen excel-sheets 
-try:
-    print(f"\n=== Erledigt und Offen Filterung ===")
-    
-    if len(df_final) > 1 and len(df_final.columns) > 5:
-        # Header und Daten trennen
-        header = df_final.iloc[0:1]  # Erste Zeile (Header)
-        data = df_final.iloc[1:]     # Datenzeilen
-        
-        # Spalte 5 enthält den Status (Erledigt/Offen)
-        status_column = 5
-        
-        print(f"Verfügbare Status in Spalte {status_column}:")
-        print(data.iloc[:, status_column].value_counts(dropna=False))
-        
-        # Filter für "Erledigt"
-        erledigt_mask = data.iloc[:, status_column].astype(str).str.strip() == 'erledigt'
-        erledigt_data = data[erledigt_mask]
-        print(f"Anzahl 'Erledigt': {len(erledigt_data)}")
-        
-        # Filter für "Offen"
-        offen_mask = data.iloc[:, status_column].astype(str).str.strip() == 'offen'
-        offen_data = data[offen_mask]
-        print(f"Anzahl 'Offen': {len(offen_data)}")
-        
-        # Daten mit Header kombinieren
-        erledigt_final = pd.concat([header, erledigt_data], ignore_index=True)
-        offen_final = pd.concat([header, offen_data], ignore_index=True)
-
-        # Registerkarten hinzufügen (zweite und dritte Position)
-        safe_month = args.month or "Alle_Monate"
-        sheet_name_e = f'Erledigt_{safe_month}'
-        sheet_name_o = f'Offen_{safe_month}'
-        with pd.ExcelWriter(result_filename, engine='openpyxl', mode='a') as writer:
-            erledigt_final.to_excel(writer, sheet_name=sheet_name_e, index=False, header=False)
-            offen_final.to_excel(writer, sheet_name=sheet_name_o, index=False, header=False)
-
-            # Greifen auf das Worksheet-Objekt zu
-            worksheet_erledigt = writer.sheets[sheet_name_e]
-
-            worksheet_erledigt.column_dimensions['A'].width = 15
-            worksheet_erledigt.column_dimensions['B'].width = 10
-            worksheet_erledigt.column_dimensions['C'].width = 15
-            worksheet_erledigt.column_dimensions['D'].width = 10
-            worksheet_erledigt.column_dimensions['E'].width = 10
-            worksheet_erledigt.column_dimensions['F'].width = 10
-            worksheet_erledigt.column_dimensions['G'].width = 15
-            worksheet_erledigt.column_dimensions['H'].width = 25
-            worksheet_erledigt.column_dimensions['I'].width = 25
-            worksheet_erledigt.column_dimensions['J'].width = 40
-            worksheet_erledigt.column_dimensions['K'].width = 10
-            worksheet_erledigt.column_dimensions['L'].width = 20
-            worksheet_erledigt.column_dimensions['M'].width = 20
-            worksheet_erledigt.column_dimensions['N'].width = 30
-
-            # Greifen auf das Worksheet-Objekt zu
-            worksheet_offen = writer.sheets[sheet_name_o]
-
-            worksheet_offen.column_dimensions['A'].width = 15
-            worksheet_offen.column_dimensions['B'].width = 10
-            worksheet_offen.column_dimensions['C'].width = 15
-            worksheet_offen.column_dimensions['D'].width = 10
-            worksheet_offen.column_dimensions['E'].width = 10
-            worksheet_offen.column_dimensions['F'].width = 10
-            worksheet_offen.column_dimensions['G'].width = 15
-            worksheet_offen.column_dimensions['H'].width = 25
-            worksheet_offen.column_dimensions['I'].width = 25
-            worksheet_offen.column_dimensions['J'].width = 40
-            worksheet_offen.column_dimensions['K'].width = 10
-            worksheet_offen.column_dimensions['L'].width = 20
-            worksheet_offen.column_dimensions['M'].width = 20
-            worksheet_offen.column_dimensions['N'].width = 30
-        
-        print("Registerkarten 'Erledigt' und 'Offen' hinzugefügt")
-        
+        mask_grp = (
+            (data_rows_grp.iloc[:, 0] == 'Verkauft') &
+            username_condition_gr
+        )
+        filtered_rows_grp = data_rows_grp[mask_grp]
+        say(f"Nach Filter: {len(filtered_rows_grp)} Zeilen")
     else:
-        print("Nicht genügend Daten oder Spalten für Status-Filterung")
-        
-except Exception as e:
-    print(f"Fehler bei der Status-Filterung: {e}")
-    import traceback
-    traceback.print_exc()
-
-# 8. Hauptthema Gruppierung und Analyse
-try:
-    print(f"\n=== Hauptthema Analyse für {args.month} ===")
-    
-    # Sicherstellen, dass genügend Daten und Spalten vorhanden sind
-    if len(df_final) > 1 and len(df_final.columns) > 8:
-        # Datenzeilen (ohne Header)
-        data = df_final.iloc[1:]     
-        
-        print(f"Daten für Analyse: {len(data)} Zeilen")
-        print(f"Verfügbare Spalten: {list(data.columns)}")
+        say("Nicht genügend Spalten für GRP-Filter")
+        filtered_rows_grp = data_rows_grp.iloc[0:0]
 
-        # Debug: Zeige erste Werte der Hauptthema-Spalte
-        print(f"Erste 5 Werte in Hauptthema-Spalte (Index 8):")
-        print(data.iloc[:5, 8] if len(data) > 0 else "Keine Daten")
+    # 12. Monatfilterung ergänzt
+    if month and len(filtered_rows_grp) > 0 and len(filtered_rows_grp.columns) > 4:
+        try:
+            say(f"\n=== Monatsfilterung für {month} (GRP) ===")
         
-        # Gruppierung nach Hauptthema (Spalte 8)
-        hauptthema_column = 8
-        
-        # Ersetze leere oder NaN Werte durch "Sonstiges"
-        data_filled = data.copy()
-        data_filled.iloc[:, hauptthema_column] = data_filled.iloc[:, hauptthema_column].fillna('Sonstiges')
-        data_filled.iloc[:, hauptthema_column] = data_filled.iloc[:, hauptthema_column].replace('', 'Sonstiges')
-        
-        # Entferne komplett leere Zeilen (wenn alle Spalten leer sind)
-        valid_data = data_filled[data_filled.iloc[:, hauptthema_column].notna()]
+            # Datumsspalte position bestimmen
+            date_column_position = 4  
+            say(f"Verwende Spalte an Position {date_column_position} für Datumsfilterung")
 
-        if len(valid_data) > 0:
-            # Gruppieren und zählen
-            hauptthema_counts = valid_data.iloc[:, hauptthema_column].value_counts().reset_index()
-            hauptthema_counts.columns = ['Hauptthema', 'Summe']
-            
-            # Prozentuale Anteile berechnen
-            total_rows = len(valid_data)
-            hauptthema_counts['In % gegenüber allen Beanstandungen'] = (
-                hauptthema_counts['Summe'] / total_rows * 100
-            ).round(2)
-            
-            # Ergebnis sortieren nach Anzahl (absteigend)
-            hauptthema_counts = hauptthema_counts.sort_values('Summe', ascending=False)
+            if len(filtered_rows_grp.columns) > date_column_position:
+                say(f"Erste 5 Werte in Datumsspalte:")
+                say(filtered_rows_grp.iloc[:4, date_column_position] if len(filtered_rows_grp) > 0 else "Keine Daten")
             
-            # GESAMT-Zeile am Ende hinzufügen
-            gesamt_row = pd.DataFrame({
-                'Hauptthema': ['Gesamt'],
-                'Summe': [total_rows],
-                'In % gegenüber allen Beanstandungen': [100.00]
-            })
+                # Datumskonvertierung
+                date_series = pd.to_datetime(
+                    filtered_rows_grp.iloc[:, date_column_position], 
+                    format=date_format,
+                    errors='coerce'
+                )
             
-            # Kombiniere die Ergebnisse mit der Gesamtzeile
-            hauptthema_analysis = pd.concat([hauptthema_counts, gesamt_row], ignore_index=True)
-            hauptthema_analysis['Summe'] = hauptthema_analysis['Summe'].astype(int)
+                # Debug-Informationen
+                valid_dates_grp = date_series.notna().sum()
+                say(f"Erfolgreich konvertierte Datumsangaben: {valid_dates_grp} von {len(date_series)}")
             
-            print(f"Hauptthema Analyse:")
-            print(hauptthema_analysis.head(15))
-
-            # Registerkarte: "Hauptthema Analyse Ergebnis" hinzufügen
-            safe_month = args.month or "Alle_Monate"
-            sheet_name = f'Hauptthema_Analyse_{safe_month}'
-            with pd.ExcelWriter(result_filename, engine='openpyxl', mode='a') as writer:
-                hauptthema_analysis.to_excel(writer, sheet_name=sheet_name, index=False)
-
-                from openpyxl.chart import PieChart, Reference
-                from openpyxl.chart.legend import Legend
-                from openpyxl.chart.layout import Layout, ManualLayout
-                from openpyxl.chart.label import DataLabelList
-                from openpyxl.chart.series import DataPoint
-                from openpyxl.drawing.fill import PatternFillProperties
-                from openpyxl.drawing.colors import ColorChoice
+                month_number = MONTH_MAP.get(month, 1)
+                say(f"Filtern nach Monat: {month} (Nummer {month_number})")
 
+                if valid_dates_grp > 0:
+                    available_months = sorted([int(m) for m in date_series.dt.month.dropna().unique()])
+                    say(f"Verfügbare Monate in den Daten: {available_months}")
                 
-                # Greifen auf das Worksheet-Objekt zu
-                worksheet_haupthema = writer.sheets[sheet_name]
+                    # Prüfen ob der gewünschte Monat in den Daten vorhanden ist
+                    if month_number not in available_months:
+                        say(f"ACHTUNG: Monat {month} ({month_number}) ist in den Daten nicht vorhanden!")
                 
-                worksheet_haupthema.column_dimensions['A'].width = 25
-                worksheet_haupthema.column_dimensions['B'].width = 15
-                worksheet_haupthema.column_dimensions['C'].width = 40
-
-                # Anzahl der Datenzeilen (ohne Gesamt-Zeile)
-                n = len(hauptthema_analysis) - 1
-
-                # 1) Kategorien (Hauptthemen) aus A2:A(n+1)
-                labels = Reference(
-                    worksheet_haupthema,
-                    min_col=1,
-                    min_row=2,
-                    max_row=1 + n
-                )
+                    # Monatsfilterung anwenden
+                    month_mask = date_series.dt.month == month_number
+                    rows_before = len(filtered_rows_grp)
+                    filtered_rows_grp = filtered_rows_grp[month_mask]  
+                    rows_after = len(filtered_rows_grp)  
+                
+                    say(f"Zeilen vor Filter: {rows_before}")
+                    say(f"Zeilen nach Filter: {rows_after}")
+                
+                    say(f"Gefiltert nach Monat: {month}")
+                else:
+                    say("Keine Datumsangaben konnten konvertiert werden!")
+            else:
+                say(f"Nicht genügend Spalten: Benötige mindestens {date_column_position + 1} Spalten")
+            
+        except Exception as e:
+            print(f"Fehler bei der Monatsfilterung: {e}")
+            import traceback
+            traceback.print_exc()
+
+    return filtered_rows_grp
+
+def filter_grp(df_grp, month: str | None = None, username: str | None = None, debug_dumps: bool = False):
+    """Schritte 10-12: Gruppenreporting bereinigen und nach Verkauft, User und Monat filtern."""
+    import pandas as pd
+    # 10. Spalten entfernen Gruppenreporting
+    df_processed_grp = df_grp.drop(columns=GRP_COLS_TO_DROP, errors='ignore')
+    print(f"Verfügbare Spalten in df_processed_grp nach Löschen: {list(df_processed_grp.columns)}")
+    if debug_dumps:
+        from debug_artifacts import dump
+        dump(df_processed_grp, 'grp_processed')
+
+    # 11. Filtern:
+    #    Die erste Zeile (Header) unberührt lassen
+    header_row_grp = df_processed_grp.iloc[[0]]
+    data_rows_grp  = df_processed_grp.iloc[1:]
+
+    print(f"Verfügbare Spalten in df_processed_grp: {list(df_processed_grp.columns)}")
+    print(f"Erste Zeile der Daten:")
+    print(data_rows_grp.iloc[0] if len(data_rows_grp) > 0 else "Keine Daten")
+
+    filtered_rows_grp = filter_grp_rows(data_rows_grp, month, username)
+
+    #    Header und gefilterte Daten wieder zusammenfügen
+    df_final_grp = pd.concat([header_row_grp, filtered_rows_grp], ignore_index=True) 
+
+    return df_final_grp, filtered_rows_grp
+
+def count_values(values, dropna: bool = True):
+    """Zählt Werte in der Reihenfolge ihres ersten Auftretens (value_counts ohne Sortierung)."""
+    return values.value_counts(dropna=dropna, sort=False)
+
+def merge_counts(left, right):
+    """Addiert zwei Zählreihen; die Reihenfolge des ersten Auftretens bleibt erhalten."""
+    import pandas as pd
+    if len(left) == 0:
+        return right
+    if len(right) == 0:
+        return left
+    merged = pd.concat([left, right])
+    levels = list(range(merged.index.nlevels))
+    return merged.groupby(level=levels, sort=False, dropna=False).sum()
+
+def recl_aggregates(data) -> dict:
+    """
+    Zählwerte über die gefilterten recl-Datenzeilen (ohne Header), aus denen
+    die Auswertungen der Schritte 8, 9, 16 und 17 erstellt werden.
+    """
+    import pandas as pd
+    einsteller = data.iloc[:, 3]
+    status = data.iloc[:, 5].astype(str).str.strip()
+
+    # 8. Leere oder NaN Hauptthemen zählen als "Sonstiges"
+    hauptthema = data.iloc[:, 8].fillna('Sonstiges').replace('', 'Sonstiges')
+
+    # 9. Nur Zeilen mit Einsteller und Hauptthema gehen in die Pivot-Tabelle
+    pivot_rows = data.dropna(subset=[data.columns[3], data.columns[8]])
+    einsteller_clean = pivot_rows.iloc[:, 3].astype(str).str.strip()
+    hauptthema_clean = pivot_rows.iloc[:, 8].astype(str).str.strip()
+    valid = (einsteller_clean != '') & (hauptthema_clean != '')
+    pivot_counts = pd.DataFrame({
+        'Hauptthema_Clean': hauptthema_clean[valid],
+        'Einsteller_Clean': einsteller_clean[valid]
+    }).groupby(['Hauptthema_Clean', 'Einsteller_Clean'], sort=False).size()
+
+    # 17. Eindeutige Begründungen (Spalte 9) der offenen Fälle je User (Spalte 3);
+    #     None ohne Spalte 9 (dann keine Offene-Fälle-Auswertung, Schritte 8 und 9 laufen trotzdem)
+    offen = data[status == 'offen']
+    begruendungen = None
+    if len(data.columns) > 9:
+        begruendungen = {}
+        for user, begruendung in zip(offen.iloc[:, 3], offen.iloc[:, 9]):
+            if pd.isna(user):
+                continue
+            eintraege = begruendungen.setdefault(user, set())
+            if not pd.isna(begruendung):
+                eintraege.add(str(begruendung))
+
+    return {
+        'rows': len(data),
+        'offen_rows': len(offen),
+        'hauptthema': count_values(hauptthema[hauptthema.notna()]),
+        'pivot': pivot_counts,
+        'beanstandungen': count_values(einsteller),
+        'erledigt': count_values(einsteller[status == 'erledigt']),
+        'offen': count_values(offen.iloc[:, 3]),
+        'begruendungen': begruendungen,
+    }
 
-                # 2) Werte (Summe) aus B2:B(n+1)
-                data = Reference(
-                    worksheet_haupthema,
-                    min_col=2,
-                    min_row=2,
-                    max_row=1 + n
-                )
+def grp_aggregates(data) -> dict:
+    """Zählwerte über die gefilterten Gruppenreporting-Datenzeilen (ohne Header)."""
+    # User-Spalte ist Spalte 1; dropna=False: NaN zählt als eigene Kategorie
+    return {
+        'rows': len(data),
+        'verkauft': count_values(data.iloc[:, 1], dropna=False),
+    }
 
-                # PieChart erstellen und konfigurieren
-                pie = PieChart()
-                pie.title = "Verteilung der Hauptthemen"
-                pie.add_data(data, titles_from_data=False)
-                pie.set_categories(labels)
-                pie.style = 10 
-
-                pie.legend = Legend()
-                pie.legend.position = 'r'    
-                pie.legend.overlay = False 
-
-                pie.layout = Layout(
-                    manualLayout=ManualLayout(
-                        x=0.1, 
-                        y=0.1,   
-                        w=0.8,  
-                        h=0.8    
-                    )
-                )
+def merge_aggregates(left: dict | None, right: dict) -> dict:
+    """Führt die Teilergebnisse zweier Zeilenblöcke zusammen."""
+    if left is None:
+        return right
+    merged = {}
+    for key, value in right.items():
+        if isinstance(value, int):
+            merged[key] = left[key] + value
+        elif value is None or left[key] is None:
+            merged[key] = None
+        elif isinstance(value, dict):
+            merged[key] = {user: set(eintraege) for user, eintraege in left[key].items()}
+            for user, eintraege in value.items():
+                merged[key].setdefault(user, set()).update(eintraege)
+        else:
+            merged[key] = merge_counts(left[key], value)
+    return merged
+
+def hauptthema_table(counts):
+    """8. Hauptthema-Verteilung mit Anteil in % und Gesamt-Zeile."""
+    import pandas as pd
+    # Gruppieren und zählen
+    hauptthema_counts = counts.sort_values(ascending=False).reset_index()
+    hauptthema_counts.columns = ['Hauptthema', 'Summe']
+
+    # Prozentuale Anteile berechnen
+    total_rows = int(counts.sum())
+    hauptthema_counts['In % gegenüber allen Beanstandungen'] = (
+        hauptthema_counts['Summe'] / total_rows * 100
+    ).round(2)
+
+    # Ergebnis sortieren nach Anzahl (absteigend)
+    hauptthema_counts = hauptthema_counts.sort_values('Summe', ascending=False)
+
+    # GESAMT-Zeile am Ende hinzufügen
+    gesamt_row = pd.DataFrame({
+        'Hauptthema': ['Gesamt'],
+        'Summe': [total_rows],
+        'In % gegenüber allen Beanstandungen': [100.00]
+    })
+
+    # Kombiniere die Ergebnisse mit der Gesamtzeile
+    hauptthema_analysis = pd.concat([hauptthema_counts, gesamt_row], ignore_index=True)
+    hauptthema_analysis['Summe'] = hauptthema_analysis['Summe'].astype(int)
+    return hauptthema_analysis
+
+def pivot_table_from_counts(pair_counts):
+    """9. Kreuztabelle Hauptthema x Einsteller mit Gesamt-Spalte und -Zeile."""
+    import pandas as pd
+    # Zeilen und Spalten in der Reihenfolge wie im Original
+    hauptthemen = pd.unique(pair_counts.index.get_level_values(0))
+    einsteller = pd.unique(pair_counts.index.get_level_values(1))
+    pivot_table = pair_counts.unstack(fill_value=0).reindex(index=hauptthemen, columns=einsteller)
+    pivot_table.index.name = 'Hauptthema_Clean'
+    pivot_table.columns.name = 'Einsteller_Clean'
+
+    # Sortieren die Zeilen nach Gesamtanzahl (absteigend)
+    # Berechnen die Summe pro Zeile *bevor* die Gesamtzeile hinzugefügt wird
+    row_totals = pivot_table.sum(axis=1)
+
+    # Fügen die Gesamt-Spalte hinzu
+    pivot_table['Gesamt'] = row_totals
+
+    # Sortieren die Tabelle nach der Gesamt-Spalte (absteigend)
+    pivot_table_sorted = pivot_table.sort_values(by='Gesamt', ascending=False)
+
+    # Fügen eine Summenzeile am Ende hinzu
+    column_totals = pivot_table_sorted.sum(axis=0)
+    column_totals.name = 'Gesamt'
+    pivot_table_final = pd.concat([pivot_table_sorted, column_totals.to_frame().T])
+    return pivot_table_final
+
+def sales_table(verkauft_counts):
+    """14. Verkäufe je User, absteigend sortiert, mit Gesamt-Zeile."""
+    import pandas as pd
+    user_counts = verkauft_counts.sort_values(ascending=False).reset_index()
+    user_counts.columns = ['User', 'Verkauft']
+
+    # Sortieren nach Anzahl Verkäufe (absteigend)
+    user_counts = user_counts.sort_values('Verkauft', ascending=False)
+
+    # GESAMT-Zeile am Ende hinzufügen
+    total_sales = user_counts['Verkauft'].sum()
+    gesamt_row = pd.DataFrame({
+        'User': ['Gesamt'],
+        'Verkauft': [total_sales]
+    })
+
+    # Kombinieren die Ergebnisse mit der Gesamtzeile
+    return pd.concat([user_counts, gesamt_row], ignore_index=True)
+
+def user_regionen_table(sales_analysis, directory=None):
+    """
+    15. Liste aller User mit PLZ, Region und Standort aus dem User-Verzeichnis
+    (siehe user_directory.py); unbekannte User bekommen leere Felder.
+    """
+    import pandas as pd
+    # Prüfen, ob die Verkaufsstatistik aus Schritt 14 verfügbar ist
+    if sales_analysis is not None and not sales_analysis.empty:
+        # Alle eindeutigen User holen, ohne die "Gesamt"-Zeile
+        users = sales_analysis[sales_analysis['User'] != 'Gesamt']['User'].unique()
+    else:
+        print("Keine Nutzerdaten aus Verkaufsstatistik verfügbar")
+        users = []
 
-                pie.series[0].title = None
+    # Neues DataFrame mit leeren Spalten für PLZ, Region und Standort erstellen
+    df_user_regionen = pd.DataFrame({
+        'User': users,
+        'PLZ': [''] * len(users),       # Spalte für Postleitzahl (leer)
+        'Region': [''] * len(users),    # Spalte für Region (leer)
+        'Stadort': [''] * len(users)    # Spalte für Standort (leer)
+    })
+    if directory is None or directory.empty:
+        return df_user_regionen
 
-                pie.dataLabels = DataLabelList()
-                pie.dataLabels.showSerName   = False
-                # pie.dataLabels.showVal = True
-                pie.dataLabels.showPercent   = True
-                pie.dataLabels.numFmt         = '0.00%'
-                pie.dataLabels.showLegendKey = False
-                pie.dataLabels.showCatName   = True
+    # Werte aus dem Verzeichnis mit einem Merge übernehmen
+    df_user_regionen = df_user_regionen[['User']].merge(
+        directory[['User', 'PLZ', 'Region', 'Stadort']], on='User', how='left'
+    )
+    df_user_regionen[['PLZ', 'Region', 'Stadort']] = df_user_regionen[['PLZ', 'Region', 'Stadort']].fillna('')
+    return df_user_regionen
+
+def regionen_table(kurzuebersicht, column: str, label: str):
+    """18. Beanstandungen, Verkäufe und Beanstandungsquote je Region bzw. Standort mit Gesamt-Zeile."""
+    import pandas as pd
+    import numpy as np
+    daten = kurzuebersicht[kurzuebersicht['User'] != 'Gesamt']
+    gruppe = daten[column].replace('', 'Ohne Zuordnung').rename(label)
+
+    # Summen je Gruppe, sortiert nach Anzahl Beanstandungen (absteigend)
+    summen = daten.groupby(gruppe)[['Beanstandungen', 'Verkauft']].sum()
+    summen.insert(0, 'Anzahl User', daten.groupby(gruppe).size())
+    summen = summen.reset_index().sort_values('Beanstandungen', ascending=False, kind='stable')
+
+    gesamt_row = pd.DataFrame({
+        label: ['Gesamt'],
+        'Anzahl User': [summen['Anzahl User'].sum()],
+        'Beanstandungen': [summen['Beanstandungen'].sum()],
+        'Verkauft': [summen['Verkauft'].sum()]
+    })
+    regionen = pd.concat([summen, gesamt_row], ignore_index=True)
 
-                # Diagrammgröße anpassen (Einheiten sind Excel-intern, ~1 = 1 Zoll)
-                pie.width = 30   # Breite in Zoll
-                pie.height = 15  # Höhe in Zoll
+    # Spalte "Beanstandungsquote(%)", Division durch Null vermeiden
+    regionen['Beanstandungsquote(%)'] = np.where(
+        regionen['Verkauft'] > 0,
+        (regionen['Beanstandungen'] / regionen['Verkauft'] * 100).round(2),
+        0.00
+    )
+    return regionen
+
+def kurzuebersicht_table(df_user_regionen, beanstandungen_counts, sales_analysis):
+    """16. Beanstandungen, Verkäufe und Beanstandungsquote je User mit Gesamt-Zeile."""
+    import pandas as pd
+    import numpy as np
+    # Kopieren die User-Regionen-Daten als Basis
+    kurzuebersicht = df_user_regionen.copy()
+
+    # Spalte "Beanstandungen" hinzufügen
+    # Für jeden User zähle die Einträge der gefilterten recl-Daten (Spalte 3)
+    beanstandungen_dict = beanstandungen_counts.to_dict()
+    kurzuebersicht['Beanstandungen'] = kurzuebersicht['User'].map(beanstandungen_dict).fillna(0).astype(int)
+
+    # Spalte "Verkauft" aus sales_analysis hinzufügen
+    # Erstellen ein Dictionary aus sales_analysis (User -> Verkauft)
+    verkauft_dict = sales_analysis.set_index('User')['Verkauft'].to_dict()
+    # Entfernen die "Gesamt"-Zeile aus dem Dictionary, falls vorhanden
+    verkauft_dict.pop('Gesamt', None)
+
+    # Fügen die Spalte "Verkauft" hinzu
+    kurzuebersicht['Verkauft'] = kurzuebersicht['User'].map(verkauft_dict).fillna(0).astype(int)
+
+    # Spalte "Beanstandungsquote(%)" hinzufügen
+    # Vermeiden Division durch Null
+    kurzuebersicht['Beanstandungsquote(%)'] = np.where(
+        kurzuebersicht['Verkauft'] > 0,
+        (kurzuebersicht['Beanstandungen'] / kurzuebersicht['Verkauft'] * 100).round(2),
+        0.00
+    )
 
-                # Diagramm in das Sheet einfügen (Position E5)
-                worksheet_haupthema.add_chart(pie, "E2")
+    # Gesamtzeile am Ende hinzufügen
+    gesamt_row = pd.DataFrame({
+        'User': ['Gesamt'],
+        'PLZ': [''],
+        'Region': [''],
+        'Stadort': [''],
+        'Beanstandungen': [kurzuebersicht['Beanstandungen'].sum()],
+        'Verkauft': [kurzuebersicht['Verkauft'].sum()],
+        'Beanstandungsquote(%)': [
+            round(
+                (kurzuebersicht['Beanstandungen'].sum() / max(1, kurzuebersicht['Verkauft'].sum())) * 100,
+                2
+            ) if kurzuebersicht['Verkauft'].sum() > 0 else 0.00
+        ]
+    })
+
+    # Kombinieren die Daten mit der Gesamtzeile
+    return pd.concat([kurzuebersicht, gesamt_row], ignore_index=True)
+
+def offene_faelle_table(df_user_regionen, erledigt_counts, offen_counts, begruendungen):
+    """17. Abgeschlossene und offene Fälle je User mit den Begründungen der offenen Fälle."""
+    import pandas as pd
+    # Kopieren die User-Regionen-Daten als Basis
+    offene_falle = df_user_regionen.copy()
+
+    # Spalte "Abgeschlossene Fälle" hinzufügen
+    offene_falle['Abgeschlossene Fälle'] = offene_falle['User'].map(erledigt_counts.to_dict()).fillna(0).astype(int)
+
+    # Spalte "Offene Fälle" hinzufügen
+    offene_falle['Offene Fälle'] = offene_falle['User'].map(offen_counts.to_dict()).fillna(0).astype(int)
+
+    # Spalte "Begründung" hinzufügen: eindeutige Begründungen je User, sortiert
+    begruendungen_dict = {
+        user: '  \n \n'.join(sorted(eintraege)) # Verwenden '  ' (zwei Leerzeichen) als Trenner
+        for user, eintraege in begruendungen.items()
+    }
+    offene_falle['Begründung'] = offene_falle['User'].map(begruendungen_dict).fillna('')
+
+    # Leere Spalten hinzufügen 
+    offene_falle['Hängig bei CA'] = ''   # Leere Spalte
+    offene_falle['Hängig bei AMAG'] = '' # Leere Spalte
+
+    # Gesamtzeile am Ende hinzufügen
+    gesamt_row = pd.DataFrame({
+        'User': ['Gesamt'],
+        'PLZ': [''],
+        'Region': [''],
+        'Stadort': [''],
+        'Abgeschlossene Fälle': [offene_falle['Abgeschlossene Fälle'].sum()],
+        'Offene Fälle': [offene_falle['Offene Fälle'].sum()],
+        'Begründung': [''],
+        'Hängig bei CA': [''],
+        'Hängig bei AMAG': ['']  
+    })
+
+    # Kombinieren die Daten mit der Gesamtzeile
+    return pd.concat([offene_falle, gesamt_row], ignore_index=True)
 
-            print(f"Hauptthema Analyse gespeichert in Registerkarte 'Hauptthema Analyse Ergebnis'")
-            print(f"Gesamtanzahl Beanstandungen: {total_rows}")
-            print(f"Anzahl verschiedener Hauptthemen (ohne Gesamt): {len(hauptthema_analysis) - 1}")
+def write_recl_summaries(sheets, month: str | None, recl_agg: dict | None):
+    """Schritte 8 und 9: Hauptthema-Analyse und Pivot Einsteller x Hauptthema."""
+    import pandas as pd
+    # 8. Hauptthema Gruppierung und Analyse
+    try:
+        print(f"\n=== Hauptthema Analyse für {month} ===")
+    
+        # Sicherstellen, dass genügend Daten und Spalten vorhanden sind
+        if recl_agg is not None and recl_agg['rows'] > 0:
+            if len(recl_agg['hauptthema']) > 0:
+                hauptthema_analysis = hauptthema_table(recl_agg['hauptthema'])
+                total_rows = hauptthema_analysis['Summe'].iloc[-1]
+            
+                print(f"Hauptthema Analyse:")
+                print(hauptthema_analysis.head(15))
+
+                # Registerkarte: "Hauptthema Analyse Ergebnis" hinzufügen
+                safe_month = month or "Alle_Monate"
+                sheet_name = f'Hauptthema_Analyse_{safe_month}'
+                # Kreisdiagramm über die Hauptthemen kommt aus dem Layout 'hauptthema'
+                sheets.write(hauptthema_analysis, sheet_name, 'hauptthema')
+
+                print(f"Hauptthema Analyse gespeichert in Registerkarte 'Hauptthema Analyse Ergebnis'")
+                print(f"Gesamtanzahl Beanstandungen: {total_rows}")
+                print(f"Anzahl verschiedener Hauptthemen (ohne Gesamt): {len(hauptthema_analysis) - 1}")
+            else:
+                print("Keine gültigen Daten für Hauptthema Analyse gefunden")
         else:
-            print("Keine gültigen Daten für Hauptthema Analyse gefunden")
-    else:
-        print("Nicht genügend Daten oder Spalten für Hauptthema Analyse")
-        print(f"Verfügbare Zeilen: {len(df_final)}, Verfügbare Spalten: {len(df_final.columns) if len(df_final) > 0 else 0}")
+            print("Nicht genügend Daten oder Spalten für Hauptthema Analyse")
 
-except Exception as e:
-    print(f"Fehler bei der Hauptthema Analyse: {e}")
-    import traceback
-    traceback.print_exc()
+    except Exception as e:
+        print(f"Fehler bei der Hauptthema Analyse: {e}")
+        import traceback
+        traceback.print_exc()
 
-# 9. Pivot Einsteller Hauptthema
-try:
-    print(f"\n=== Pivot Einsteller Hauptthema für {args.month} ===")
+    # 9. Pivot Einsteller Hauptthema
+    try:
+        print(f"\n=== Pivot Einsteller Hauptthema für {month} ===")
     
-    # Sicherstellen, dass genügend Daten und Spalten vorhanden sind
-    # Benötigt: Hauptthema (Index 8) und Einsteller (Index 3)
-    if len(df_final) > 1 and len(df_final.columns) > max(8, 3):
-        # Datenzeilen (ohne Header)
-        data = df_final.iloc[1:]
-        
-        print(f"Daten für Pivot-Analyse: {len(data)} Zeilen")
-        
-        # Spaltenindizes
-        einsteller_column = 3  # Spalte Einsteller
-        hauptthema_column = 8  # Spalte Hauptthema
-        
-        # Debug: Zeige einige Werte
-        # print(f"Erste 5 Werte in Einsteller-Spalte (Index {einsteller_column}):")
-        # print(data.iloc[:5, einsteller_column] if len(data) > 0 else "Keine Daten")
-        # print(f"Erste 5 Werte in Hauptthema-Spalte (Index {hauptthema_column}):")
-        # print(data.iloc[:5, hauptthema_column] if len(data) > 0 else "Keine Daten")
-        
-        # Entferne Zeilen mit fehlenden Werten in den Schlüsselspalten
-        # und Zeilen mit leerem String in diesen Spalten
-        valid_pivot_data = data.dropna(subset=[data.columns[einsteller_column], data.columns[hauptthema_column]])
-        valid_pivot_data = valid_pivot_data.copy() # Um SettingWithCopyWarning zu vermeiden
-        valid_pivot_data.loc[:, 'Einsteller_Clean'] = valid_pivot_data.iloc[:, einsteller_column].astype(str).str.strip()
-        valid_pivot_data.loc[:, 'Hauptthema_Clean'] = valid_pivot_data.iloc[:, hauptthema_column].astype(str).str.strip()
-        
-        valid_pivot_data = valid_pivot_data[
-            (valid_pivot_data['Einsteller_Clean'] != '') &
-            (valid_pivot_data['Hauptthema_Clean'] != '')
-        ]
-        
-        print(f"Gültige Daten für Pivot: {len(valid_pivot_data)} Zeilen")
+        # Sicherstellen, dass genügend Daten und Spalten vorhanden sind
+        # Benötigt: Hauptthema (Index 8) und Einsteller (Index 3)
+        if recl_agg is not None and recl_agg['rows'] > 0:
+            pair_counts = recl_agg['pivot']
+            print(f"Gültige Daten für Pivot: {int(pair_counts.sum())} Zeilen")
         
-        if len(valid_pivot_data) > 0:
-            # Erstellen die Pivot-Tabelle
-            # Werte: Anzahl der Zeilen (size)
-            # Index: Hauptthema
-            # Columns: Einsteller
-            # fill_value=0 sorgt dafür, dass leere Zellen 0 enthalten
-            pivot_table = pd.pivot_table(
-                valid_pivot_data,
-                values=data.columns[0], # Wir nehmen eine beliebige Spalte, da wir 'size' als aggfunc verwenden
-                index='Hauptthema_Clean',  # Hauptthema
-                columns='Einsteller_Clean', # Einsteller
-                aggfunc='size', # Zähle die Anzahl der Zeilen
-                fill_value=0,
-                sort=False # Reihenfolge wie im Original
-            )
-            
-            # Sortieren die Zeilen nach Gesamtanzahl (absteigend)
-            # Berechnen die Summe pro Zeile *bevor* die Gesamtzeile hinzugefügt wird
-            row_totals = pivot_table.sum(axis=1)
+            if len(pair_counts) > 0:
+                pivot_table_final = pivot_table_from_counts(pair_counts)
             
-            # Fügen die Gesamt-Spalte hinzu
-            pivot_table['Gesamt'] = row_totals
+                print("Pivot-Tabelle (Ausschnitt):")
+                print(pivot_table_final.head(10))
             
-            # Sortieren die Tabelle nach der Gesamt-Spalte (absteigend)
-            pivot_table_sorted = pivot_table.sort_values(by='Gesamt', ascending=False)
+                # Letzte Registerkarte: "Pivot Einsteller Hauptthema" hinzufügen
+                safe_month = month or "Alle_Monate"
+                sheet_name = f'Pivot_Einsteller_Hauptthema_{safe_month}'
+                sheets.write(pivot_table_final, sheet_name, 'pivot')
             
-            # Fügen eine Summenzeile am Ende hinzu
-            column_totals = pivot_table_sorted.sum(axis=0)
-            column_totals.name = 'Gesamt'
-            pivot_table_final = pd.concat([pivot_table_sorted, column_totals.to_frame().T])
+                print(f"Pivot-Tabelle gespeichert in Registerkarte 'Pivot Einsteller Hauptthema'")
+                print(f"Anzahl der Hauptthemen (exkl. Gesamtzeile): {len(pivot_table_final) - 1}")
+                print(f"Anzahl der Einsteller (exkl. Gesamtspalte): {len(pivot_table_final.columns) - 1}") # -1 für 'Gesamt'-Spalte
             
-            print("Pivot-Tabelle (Ausschnitt):")
-            print(pivot_table_final.head(10))
-            
-            # Letzte Registerkarte: "Pivot Einsteller Hauptthema" hinzufügen
-            safe_month = args.month or "Alle_Monate"
-            sheet_name = f'Pivot_Einsteller_Hauptthema_{safe_month}'
-            with pd.ExcelWriter(result_filename, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-                pivot_table_final.to_excel(writer, sheet_name=sheet_name)
-
-                # Greifen auf das Worksheet-Objekt zu
-                worksheet_haupthema = writer.sheets[sheet_name]
-                
-                worksheet_haupthema.column_dimensions['A'].width = 25
-            
-            print(f"Pivot-Tabelle gespeichert in Registerkarte 'Pivot Einsteller Hauptthema'")
-            print(f"Anzahl der Hauptthemen (exkl. Gesamtzeile): {len(pivot_table_sorted)}")
-            print(f"Anzahl der Einsteller (exkl. Gesamtspalte): {len(pivot_table_final.columns) - 1}") # -1 für 'Gesamt'-Spalte
+            else:
+                print("Keine gültigen Daten für Pivot-Erstellung gefunden")
+                # Erstellen eine leere Tabelle mit passendem Namen
+                empty_pivot = pd.DataFrame({'Hinweis': ['Keine Daten für Pivot-Tabelle verfügbar']})
+                sheets.write(empty_pivot, 'Pivot Einsteller Hauptthema', 'hinweis')
             
         else:
-            print("Keine gültigen Daten für Pivot-Erstellung gefunden")
+            print("Nicht genügend Daten oder Spalten für Pivot-Erstellung")
             # Erstellen eine leere Tabelle mit passendem Namen
-            empty_pivot = pd.DataFrame({'Hinweis': ['Keine Daten für Pivot-Tabelle verfügbar']})
-            with pd.ExcelWriter(result_filename, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-                empty_pivot.to_excel(writer, sheet_name='Pivot Einsteller Hauptthema', index=False)
-            
-    else:
-        print("Nicht genügend Daten oder Spalten für Pivot-Erstellung")
-        print(f"Verfügbare Zeilen: {len(df_final)}, Verfügbare Spalten: {len(df_final.columns) if len(df_final) > 0 else 0}")
-        # Erstellen eine leere Tabelle mit passendem Namen
-        empty_pivot = pd.DataFrame({'Hinweis': ['Nicht genügend Spalten für Pivot-Tabelle']})
-        with pd.ExcelWriter(result_filename, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-            empty_pivot.to_excel(writer, sheet_name='Pivot Einsteller Hauptthema', index=False)
-
-except Exception as e:
-    print(f"Fehler bei der Pivot-Erstellung: {e}")
-    import traceback
-    traceback.print_exc()
-
-# 10. Spalten entfernen Gruppenreporting:
-cols_to_drop_grp = [0, 1,
-                6, 7, 9, 10, 11,
-                12, 13, 14, 16, 17] + list(range(18, 31))
-
-df_processed_grp = df_grp.drop(columns=cols_to_drop_grp, errors='ignore')
-df_processed_grp.to_excel('grp_processed.xlsx', header=False, index=False)
-print(f"Verfügbare Spalten in df_processed_grp nach Löschen: {list(df_processed_grp.columns)}")
-print("Ohne ausgewählte Spalten: grp_processed.xlsx")
-
-# 11. Filtern:
-#    Die erste Zeile (Header) unberührt lassen
-header_row_grp = df_processed_grp.iloc[[0]]
-data_rows_grp  = df_processed_grp.iloc[1:]
-
-print(f"Verfügbare Spalten in df_processed_grp: {list(df_processed_grp.columns)}")
-print(f"Erste Zeile der Daten:")
-print(data_rows_grp.iloc[0] if len(data_rows_grp) > 0 else "Keine Daten")
-
-# Filtern nach Bedingungen (passen Sie die Spaltenpositionen an)
-# Beispiel: Angenommen, nach dem Löschen ist:
-# Spalte 0: 'Verkauft'/anderer Wert
-if len(data_rows_grp.columns) > 1:
-    if args.username:
-        username_condition_gr = (data_rows_grp.iloc[:, 1].astype(str) == args.username)
-    else:
-        username_condition_gr = pd.Series(True, index=data_rows_grp.index)
+            empty_pivot = pd.DataFrame({'Hinweis': ['Nicht genügend Spalten für Pivot-Tabelle']})
+            sheets.write(empty_pivot, 'Pivot Einsteller Hauptthema', 'hinweis')
 
-    mask_grp = (
-        (data_rows_grp.iloc[:, 0] == 'Verkauft') &
-        username_condition_gr
-    )
-    filtered_rows_grp = data_rows_grp[mask_grp]
-    print(f"Nach Filter: {len(filtered_rows_grp)} Zeilen")
-else:
-    print("Nicht genügend Spalten für GRP-Filter")
-    filtered_rows_grp = data_rows_grp.iloc[0:0]
-
-# 12. Monatfilterung ergänzt
-if args.month and len(filtered_rows_grp) > 0 and len(filtered_rows_grp.columns) > 4:
-    # Monatszuordnung
-    month_map = {
-        'January': 1, 'February': 2, 'March': 3, 'April': 4,
-        'May': 5, 'June': 6, 'July': 7, 'August': 8,
-        'September': 9, 'October': 10, 'November': 11, 'December': 12
-    }
+    except Exception as e:
+        print(f"Fehler bei der Pivot-Erstellung: {e}")
+        import traceback
+        traceback.print_exc()
 
+def write_grp_summaries(sheets, month: str | None, recl_agg: dict | None, grp_agg: dict | None,
+                        user_directory: str | None = None):
+    """
+    Schritte 14-18: Verkäufe nach User, User Regionen, Kurzübersicht, Offene Fälle
+    und (falls das User-Verzeichnis Regionen enthält) Auswertungen je Region und Standort.
+    """
+    import pandas as pd
+    sales_analysis = None
+    df_user_regionen = None
+    kurzuebersicht_final = None
+
+    # 14. Verkaufsstatistik nach User erstellen, Gruppenreporting
     try:
-        print(f"\n=== Monatsfilterung für {args.month} (GRP) ===")
-        
-        # Datumsspalte position bestimmen
-        date_column_position = 4  
-        print(f"Verwende Spalte an Position {date_column_position} für Datumsfilterung")
-
-        if len(filtered_rows_grp.columns) > date_column_position:
-            print(f"Erste 5 Werte in Datumsspalte:")
-            print(filtered_rows_grp.iloc[:4, date_column_position] if len(filtered_rows_grp) > 0 else "Keine Daten")
-            
-            # Datumskonvertierung
-            date_series = pd.to_datetime(
-                filtered_rows_grp.iloc[:, date_column_position], 
-                errors='coerce'
-            )
-            
-            # Debug-Informationen
-            valid_dates_grp = date_series.notna().sum()
-            print(f"Erfolgreich konvertierte Datumsangaben: {valid_dates_grp} von {len(date_series)}")
-            
-            month_number = month_map.get(args.month, 1)
-            print(f"Filtern nach Monat: {args.month} (Nummer {month_number})")
+        print(f"\n=== Verkaufsstatistik nach User ===")
+    
+        # Sicherstellen, dass genügend Daten und Spalten vorhanden sind
+        if grp_agg is not None and grp_agg['rows'] > 0:
+            print(f"Daten für Verkaufsstatistik: {grp_agg['rows']} Zeilen")
 
-            if valid_dates_grp > 0:
-                available_months = sorted([int(m) for m in date_series.dt.month.dropna().unique()])
-                print(f"Verfügbare Monate in den Daten: {available_months}")
-                
-                # Prüfen ob der gewünschte Monat in den Daten vorhanden ist
-                if month_number not in available_months:
-                    print(f"ACHTUNG: Monat {args.month} ({month_number}) ist in den Daten nicht vorhanden!")
-                
-                # Monatsfilterung anwenden
-                month_mask = date_series.dt.month == month_number
-                rows_before = len(filtered_rows_grp)
-                filtered_rows_grp = filtered_rows_grp[month_mask]  
-                rows_after = len(filtered_rows_grp)  
-                
-                print(f"Zeilen vor Filter: {rows_before}")
-                print(f"Zeilen nach Filter: {rows_after}")
-                
-                print(f"Gefiltert nach Monat: {args.month}")
-            else:
-                print("Keine Datumsangaben konnten konvertiert werden!")
+            sales_analysis = sales_table(grp_agg['verkauft'])
+            total_sales = sales_analysis['Verkauft'].iloc[-1]
+        
+            print("Verkaufsstatistik (Top 10):")
+            print(sales_analysis.head(10))
+        
+            # Registerkarte hinzufügen
+            safe_month = month or "Alle_Monate"
+            sheet_name = f'Verkäufe_nach_User_{safe_month}'
+            sheets.write(sales_analysis, sheet_name, 'verkaeufe')
+        
+            print(f"Verkaufsstatistik gespeichert in Registerkarte 'Verkäufe nach User'")
+            print(f"Gesamtanzahl Verkäufe: {total_sales}")
+            print(f"Anzahl verschiedener User: {len(sales_analysis) - 1}")
+        
         else:
-            print(f"Nicht genügend Spalten: Benötige mindestens {date_column_position + 1} Spalten")
+            print("Nicht genügend Daten oder Spalten für Verkaufsstatistik")
+        
+            # Leere Registerkarte erstellen
+            empty_sales = pd.DataFrame({'Hinweis': ['Nicht genügend Daten für Verkaufsstatistik']})
+            sheets.write(empty_sales, 'Verkäufe nach User', 'hinweis_ohne_header')
             
     except Exception as e:
-        print(f"Fehler bei der Monatsfilterung: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"Fehler bei der Verkaufsstatistik: {e}")
+
+    # 15. User Regionen Tabelle erstellen
+    try:
+        print(f"\n=== User Regionen Tabelle erstellen ===")
 
-#    Header und gefilterte Daten wieder zusammenfügen
-df_final_grp = pd.concat([header_row_grp, filtered_rows_grp], ignore_index=True) 
+        from user_directory import load_directory
+        directory = load_directory(user_directory)
+        print(f"Einträge im User-Verzeichnis: {len(directory)}")
 
-# 13. Ergebnis Gruppenreporting speichern
-try:
-    # Hinzufügen zum bestehenden Excel-File
-    safe_month = args.month or "Alle_Monate"
-    sheet_name = f'Gruppenreporting_{safe_month}'
-    with pd.ExcelWriter(result_filename, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-        df_final_grp.to_excel(writer, sheet_name=sheet_name, index=False, header=False)
+        df_user_regionen = user_regionen_table(sales_analysis, directory)
 
-        # Greifen auf das Worksheet-Objekt zu
-        worksheet_gruppenreporting = writer.sheets[sheet_name]
+        # Daten in eine neue Registerkarte der bestehenden Excel-Datei schreiben
+        sheets.write(df_user_regionen, 'User Regionen', 'user_regionen')
 
-        worksheet_gruppenreporting.column_dimensions['A'].width = 15
-        worksheet_gruppenreporting.column_dimensions['B'].width = 15
-        worksheet_gruppenreporting.column_dimensions['C'].width = 35
-        worksheet_gruppenreporting.column_dimensions['D'].width = 15
-        worksheet_gruppenreporting.column_dimensions['E'].width = 35
-        worksheet_gruppenreporting.column_dimensions['F'].width = 25
+        print("Registerkarte 'User Regionen' hinzugefügt")
+        print(f"Anzahl User: {len(df_user_regionen)}")
 
-    print(f"Gefilterte Daten gespeichert in Registerkarte 'Gruppenreporting' der Datei: {result_filename}")
-    
-except Exception as e:
-    print(f"Fehler beim Speichern der gefilterten Daten: {e}")
-    import traceback
-    traceback.print_exc()
-
-# 14. Verkaufsstatistik nach User erstellen, Gruppenreporting
-try:
-    print(f"\n=== Verkaufsstatistik nach User ===")
+    except Exception as e:
+        print(f"Fehler beim Erstellen der User Regionen Tabelle: {e}")
+        import traceback
+        traceback.print_exc()
+
+    # 16. Kurzübersicht erstellen
+    try:
+        print(f"\n=== Kurzübersicht_{month} erstellen ===")
     
-    # Sicherstellen, dass genügend Daten und Spalten vorhanden sind
-    # Wir brauchen mindestens 2 Zeilen (Header + Daten) und 5 Spalten (für Spalte 4)
-    if len(df_final_grp) > 1 and len(df_final_grp.columns) > 1:
-        # Header trennen und Datenzeilen erhalten
-        # data_rows_grp_final = df_final_grp.iloc[1:] # Wenn df_final_grp der gefilterte DataFrame ist
-        
-        # Da wir direkt aus filtered_rows_grp arbeiten (vor dem Zusammenfügen mit Header):
-        if 'filtered_rows_grp' in locals() and len(filtered_rows_grp) > 0:
-            data_for_sales = filtered_rows_grp
-        else:
-            print("Keine Daten für Verkaufsstatistik verfügbar.")
-            # Leere Statistik erstellen
-            empty_sales = pd.DataFrame({'Hinweis': ['Keine Verkaufsdaten verfügbar']})
-            with pd.ExcelWriter(result_filename, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-                empty_sales.to_excel(writer, sheet_name='Verkäufe nach User', index=False, header=False)
-            print("Leere Registerkarte 'Verkäufe nach User' hinzugefügt.")
-            raise Exception("Keine Daten für Verkaufsstatistik")
-            
-        # User-Spalte ist Spalte 4 (0-basiert Index 4)
-        user_column_index = 1
-        
-        print(f"Daten für Verkaufsstatistik: {len(data_for_sales)} Zeilen")
-        print(f"User-Spalte (Index {user_column_index}):")
-        print(data_for_sales.iloc[:3, user_column_index] if len(data_for_sales) > 0 else "Keine Daten")
-        
-        # Gruppieren nach User (Spalte 4) und zählen
-        # value_counts() zählt automatisch die Anzahl der Zeilen pro eindeutigem Wert
-        # dropna=False: Zähle auch NaN-Werte als separate Kategorie (kann angepasst werden)
-        user_counts = data_for_sales.iloc[:, user_column_index].value_counts(dropna=False).reset_index()
-        user_counts.columns = ['User', 'Verkauft']
+        # Überprüfen, ob alle benötigten Daten vorhanden sind
+        if df_user_regionen is not None and sales_analysis is not None:
+            beanstandungen_counts = recl_agg['beanstandungen'] if recl_agg is not None else pd.Series(dtype=int)
+            kurzuebersicht_final = kurzuebersicht_table(df_user_regionen, beanstandungen_counts, sales_analysis)
         
-        # Sortieren nach Anzahl Verkäufe (absteigend)
-        user_counts = user_counts.sort_values('Verkauft', ascending=False)
+            # Fügen die Registerkarte zur Excel-Datei hinzu
+            safe_month = month or "Alle_Monate"
+            sheet_name = f'Kurzübersicht_{safe_month}'
+            sheets.write(kurzuebersicht_final, sheet_name, 'kurzuebersicht')
         
-        # GESAMT-Zeile am Ende hinzufügen
-        total_sales = user_counts['Verkauft'].sum()
-        gesamt_row = pd.DataFrame({
-            'User': ['Gesamt'],
-            'Verkauft': [total_sales]
-        })
+            print(f"Registerkarte '{sheet_name}' hinzugefügt")
+            print(f"Gesamt Beanstandungen: {kurzuebersicht_final['Beanstandungen'].iloc[-1]}")
+            print(f"Gesamt Verkäufe: {kurzuebersicht_final['Verkauft'].iloc[-1]}")
         
-        # Kombinieren die Ergebnisse mit der Gesamtzeile
-        sales_analysis = pd.concat([user_counts, gesamt_row], ignore_index=True)
-        
-        print("Verkaufsstatistik (Top 10):")
-        print(sales_analysis.head(10))
-        
-        # Registerkarte hinzufügen
-        safe_month = args.month or "Alle_Monate"
-        sheet_name = f'Verkäufe_nach_User_{safe_month}'
-        with pd.ExcelWriter(result_filename, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-            sales_analysis.to_excel(writer, sheet_name=sheet_name, index=False)
-
-            # Greifen auf das Worksheet-Objekt zu
-            worksheet_user = writer.sheets[sheet_name]
-            # Standardbreite ist oft ~8.43, wir setzen z.B. 25
-            worksheet_user.column_dimensions['A'].width = 15
-            worksheet_user.column_dimensions['B'].width = 15
+        else:
+            print("Nicht alle benötigten Daten sind verfügbar für die Kurzübersicht")
+            # Erstellen eine leere Registerkarte mit einer Fehlermeldung
+            error_data = pd.DataFrame({'Fehler': ['Benötigte Daten nicht verfügbar']})
+            sheets.write(error_data, f'Kurzübersicht_{month}', 'hinweis')
+            
+    except Exception as e:
+        print(f"Fehler beim Erstellen der Kurzübersicht: {e}")
+        import traceback
+        traceback.print_exc()
+
+    # 17. Offene Fälle
+    try:
+        print(f"\n=== Offene_Fälle_{month} erstellen ===")
+    
+        # Überprüfen, ob alle benötigten Daten vorhanden sind
+        if (df_user_regionen is not None and recl_agg is not None and recl_agg['offen_rows'] > 0
+                and recl_agg['begruendungen'] is not None):
+            offene_final = offene_faelle_table(
+                df_user_regionen, recl_agg['erledigt'], recl_agg['offen'], recl_agg['begruendungen']
+            )
         
-        print(f"Verkaufsstatistik gespeichert in Registerkarte 'Verkäufe nach User'")
-        print(f"Gesamtanzahl Verkäufe: {total_sales}")
-        print(f"Anzahl verschiedener User: {len(user_counts)}")
+            # Fügen die Registerkarte zur Excel-Datei hinzu
+            safe_month = month or "Alle_Monate"
+            sheet_name = f'Offene_Fälle_{safe_month}'
+            sheets.write(offene_final, sheet_name, 'offene_faelle')
         
-    else:
-        print("Nicht genügend Daten oder Spalten für Verkaufsstatistik")
-        print(f"Verfügbare Zeilen: {len(df_final_grp) if 'df_final_grp' in locals() else 'df_final_grp nicht definiert'}, " +
-              f"Verfügbare Spalten: {len(df_final_grp.columns) if 'df_final_grp' in locals() and len(df_final_grp) > 0 else 0}")
+            print(f"Registerkarte '{sheet_name}' hinzugefügt")
         
-        # Leere Registerkarte erstellen
-        empty_sales = pd.DataFrame({'Hinweis': ['Nicht genügend Daten für Verkaufsstatistik']})
-        with pd.ExcelWriter(result_filename, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-            empty_sales.to_excel(writer, sheet_name='Verkäufe nach User', index=False, header=False)
+        else:
+            print("Nicht alle benötigten Daten sind verfügbar für die Offen Fälle")
+            # Erstellen eine leere Registerkarte mit einer Fehlermeldung
+            error_data = pd.DataFrame({'Fehler': ['Benötigte Daten nicht verfügbar']})
+            sheets.write(error_data, f'Offene_Fälle_{month}', 'hinweis')
             
-except Exception as e:
-    print(f"Fehler bei der Verkaufsstatistik: {e}")
-    # Kein traceback, da wir den Fehler bereits behandelt haben
-    pass # Oder entfernen Sie den try/except Block, wenn Sie Fehler sehen wollen
+    except Exception as e:
+        print(f"Fehler beim Erstellen der Offene Fälle: {e}")
+        import traceback
+        traceback.print_exc()
 
-# 15. User Regionen Tabelle erstellen
-try:
-    print(f"\n=== User Regionen Tabelle erstellen ===")
+    # 18. Auswertung je Region und Standort (nur mit gepflegtem User-Verzeichnis)
+    try:
+        if kurzuebersicht_final is not None and (df_user_regionen[['Region', 'Stadort']] != '').any().any():
+            print(f"\n=== Regionen und Standorte erstellen ===")
+            safe_month = month or "Alle_Monate"
+            for column, label, sheet_prefix in (('Region', 'Region', 'Regionen'), ('Stadort', 'Standort', 'Standorte')):
+                regionen = regionen_table(kurzuebersicht_final, column, label)
+                sheet_name = f'{sheet_prefix}_{safe_month}'
+                sheets.write(regionen, sheet_name, 'regionen')
+                print(f"Registerkarte '{sheet_name}' hinzugefügt ({len(regionen) - 1} Einträge)")
 
-    # Prüfen, ob die Verkaufsstatistik aus Schritt 14 verfügbar ist
-    if 'sales_analysis' in locals() and not sales_analysis.empty:
-        # Alle eindeutigen User holen, ohne die "Gesamt"-Zeile
-        users = sales_analysis[sales_analysis['User'] != 'Gesamt']['User'].unique()
-    else:
-        print("Keine Nutzerdaten aus Verkaufsstatistik verfügbar")
-        users = []
+    except Exception as e:
+        print(f"Fehler beim Erstellen der Regionen: {e}")
+        import traceback
+        traceback.print_exc()
 
-    # Neues DataFrame mit leeren Spalten für PLZ, Region und Standort erstellen
-    df_user_regionen = pd.DataFrame({
-        'User': users,
-        'PLZ': [''] * len(users),       # Spalte für Postleitzahl (leer)
-        'Region': [''] * len(users),    # Spalte für Region (leer)
-        'Stadort': [''] * len(users)    # Spalte für Standort (leer)
-    })
+def build_report(df_raw, df_grp, month: str | None = None, username: str | None = None, output=None,
+                 debug_dumps: bool = False, user_directory: str | None = None, checkpoints=None, job=None,
+                 writer_workers: int | None = None):
+    """
+    Schritte 2-18: filtert die Rohdaten und schreibt alle Registerkarten in eine
+    Ergebnisdatei. `output` kann ein Dateipfad oder ein Puffer (z.B. BytesIO) sein;
+    ohne Angabe wird Ergebnis_<Monat>.xlsx im aktuellen Verzeichnis geschrieben.
+    Mit `checkpoints` (siehe checkpoints.py) werden gefilterte Daten und Zählwerte
+    aus früheren Läufen übernommen bzw. gesichert. Mit `job` (siehe job_control.py)
+    wird zwischen den Schritten auf Abbruch und Frist geprüft. Große Registerkarten
+    werden mit `writer_workers` > 1 in einem Prozess-Pool geschrieben; nur im
+    eigenen Analyse-Prozess, nicht im Web-Prozess (siehe report_renderer.py).
+    """
+    import pandas as pd
+    from checkpoints import cached
+    from job_control import check_job
+    from report_renderer import ReportRenderer
+
+    check_job(job, 'Schritt 2')
+    df_final = cached(checkpoints, 'recl', lambda: filter_recl(df_raw, month, username, debug_dumps))
+    check_job(job, 'Schritt 6')
+
+    # 6. Ergebnis in einer Excel-Datei mit mehreren Registerkarten speichern
+    safe_month = month.strip() if month and month.strip() else "Alle_Monate"
+    result_filename = result_filename_for(month)
+    target = output if output is not None else result_filename
+
+    # Alle Registerkarten werden in eine einzige Arbeitsmappe geschrieben und am Ende einmal gespeichert;
+    # Formate und Spaltenbreiten kommen aus report_layout.py
+    sheets = ReportRenderer(writer_workers)
 
-    # Daten in eine neue Registerkarte der bestehenden Excel-Datei schreiben
-    with pd.ExcelWriter(result_filename, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-        df_user_regionen.to_excel(writer, sheet_name='User Regionen', index=False)
+    try:
+        # Erste Registerkarte: "Alle" - die gefilterten Daten
+        sheet_name = f'Alle_{safe_month}'
+        # sheet_name = f'Alle_{month}'
+        sheets.write(df_final, sheet_name, 'detail')
 
-        # Auf das Worksheet-Objekt zugreifen und Spaltenbreiten setzen
-        ws = writer.sheets['User Regionen']
-        ws.column_dimensions['A'].width = 15
-        ws.column_dimensions['B'].width = 15
-        ws.column_dimensions['C'].width = 15
-        ws.column_dimensions['D'].width = 25
+        print(f"Gefilterte Daten gespeichert in Registerkarte 'Alle' der Datei: {result_filename}")
+    
+    except Exception as e:
+        print(f"Fehler beim Speichern der gefilterten Daten: {e}")
+        import traceback
+        traceback.print_exc()
 
-    print("Registerkarte 'User Regionen' hinzugefügt")
-    print(f"Anzahl User: {len(df_user_regionen)}")
+    # 7. Erledigt und Offen excel-sheets 
+    check_job(job, 'Schritt 7')
+    try:
+        print(f"\n=== Erledigt und Offen Filterung ===")
+    
+        if len(df_final) > 1 and len(df_final.columns) > 5:
+            # Header und Daten trennen
+            header = df_final.iloc[0:1]  # Erste Zeile (Header)
+            data = df_final.iloc[1:]     # Datenzeilen
+    
+            # Spalte 5 enthält den Status (Erledigt/Offen)
+            status_column = 5
+    
+            print(f"Verfügbare Status in Spalte {status_column}:")
+            print(data.iloc[:, status_column].value_counts(dropna=False))
+    
+            # Filter für "Erledigt"
+            erledigt_mask = data.iloc[:, status_column].astype(str).str.strip() == 'erledigt'
+            erledigt_data = data[erledigt_mask]
+            print(f"Anzahl 'Erledigt': {len(erledigt_data)}")
+    
+            # Filter für "Offen"
+            offen_mask = data.iloc[:, status_column].astype(str).str.strip() == 'offen'
+            offen_data = data[offen_mask]
+            print(f"Anzahl 'Offen': {len(offen_data)}")
+    
+            # Daten mit Header kombinieren
+            erledigt_final = pd.concat([header, erledigt_data], ignore_index=True)
+            offen_final = pd.concat([header, offen_data], ignore_index=True)
+
+            # Registerkarten hinzufügen (zweite und dritte Position)
+            safe_month = month or "Alle_Monate"
+            sheets.write(erledigt_final, f'Erledigt_{safe_month}', 'detail')
+            sheets.write(offen_final, f'Offen_{safe_month}', 'detail')
+    
+            print("Registerkarten 'Erledigt' und 'Offen' hinzugefügt")
+    
+        else:
+            print("Nicht genügend Daten oder Spalten für Status-Filterung")
+    
+    except Exception as e:
+        print(f"Fehler bei der Status-Filterung: {e}")
+        import traceback
+        traceback.print_exc()
+
+    # Zählwerte für die Auswertungen (Schritte 8, 9, 16, 17)
+    check_job(job, 'Schritt 8')
+    saved_aggregates = checkpoints.load('aggregates') if checkpoints else None
+    recl_agg = None
+    try:
+        if saved_aggregates is not None:
+            recl_agg = saved_aggregates[0]
+        elif len(df_final.columns) > 8:
+            data = df_final.iloc[1:]
+            print(f"\nDaten für Analyse: {len(data)} Zeilen")
+            print(f"Verfügbare Spalten: {list(data.columns)}")
+            recl_agg = recl_aggregates(data)
+        else:
+            print(f"Nicht genügend Spalten für die Auswertungen: {len(df_final.columns)}")
+    except Exception as e:
+        print(f"Fehler bei der Auswertung der recl-Daten: {e}")
+        import traceback
+        traceback.print_exc()
+
+    write_recl_summaries(sheets, month, recl_agg)
 
-except Exception as e:
-    print(f"Fehler beim Erstellen der User Regionen Tabelle: {e}")
-    import traceback
-    traceback.print_exc()
+    check_job(job, 'Schritt 10')
+    df_final_grp, filtered_rows_grp = cached(checkpoints, 'grp', lambda: filter_grp(df_grp, month, username, debug_dumps))
+
+    # 13. Ergebnis Gruppenreporting speichern
+    check_job(job, 'Schritt 13')
+    try:
+        # Hinzufügen zum bestehenden Excel-File
+        safe_month = month or "Alle_Monate"
+        sheet_name = f'Gruppenreporting_{safe_month}'
+        sheets.write(df_final_grp, sheet_name, 'gruppenreporting')
 
-# 16. Kurzübersicht erstellen
-try:
-    print(f"\n=== Kurzübersicht_{args.month} erstellen ===")
+        print(f"Gefilterte Daten gespeichert in Registerkarte 'Gruppenreporting' der Datei: {result_filename}")
     
-    # Überprüfen, ob alle benötigten Daten vorhanden sind
-    if 'df_user_regionen' in locals() and 'df_final' in locals() and 'sales_analysis' in locals():
-        
-        # Kopieren die User-Regionen-Daten als Basis
-        kurzuebersicht = df_user_regionen.copy()
-        
-        # Spalte "Beanstandungen" hinzufügen
-        # Für jeden User (Spalte 0 in df_user_regionen) zähle die Einträge in df_final (Spalte 3)
-        # Beginnen ab der zweiten Zeile (ohne Header)
-        beanstandungen_counts = df_final.iloc[1:, 3].value_counts()  
-        
-        # Erstellen ein Dictionary für schnelle Suche
-        beanstandungen_dict = beanstandungen_counts.to_dict()
-        
-        # Fügen die Spalte "Beanstandungen" hinzu
-        kurzuebersicht['Beanstandungen'] = kurzuebersicht['User'].map(beanstandungen_dict).fillna(0).astype(int)
-        
-        # Spalte "Verkauft" aus sales_analysis hinzufügen
-        # Erstellen ein Dictionary aus sales_analysis (User -> Verkauft)
-        verkauft_dict = sales_analysis.set_index('User')['Verkauft'].to_dict()
-        # Entfernen die "Gesamt"-Zeile aus dem Dictionary, falls vorhanden
-        verkauft_dict.pop('Gesamt', None)
-        
-        # Fügen die Spalte "Verkauft" hinzu
-        kurzuebersicht['Verkauft'] = kurzuebersicht['User'].map(verkauft_dict).fillna(0).astype(int)
-        
-        # Spalte "Beanstandungsquote(%)" hinzufügen
-        # Vermeiden Division durch Null
-        kurzuebersicht['Beanstandungsquote(%)'] = np.where(
-            kurzuebersicht['Verkauft'] > 0,
-            (kurzuebersicht['Beanstandungen'] / kurzuebersicht['Verkauft'] * 100).round(2),
-            0.00
-        )
-        
-        # Gesamtzeile am Ende hinzufügen
-        gesamt_row = pd.DataFrame({
-            'User': ['Gesamt'],
-            'PLZ': [''],
-            'Region': [''],
-            'Stadort': [''],
-            'Beanstandungen': [kurzuebersicht['Beanstandungen'].sum()],
-            'Verkauft': [kurzuebersicht['Verkauft'].sum()],
-            'Beanstandungsquote(%)': [
-                round(
-                    (kurzuebersicht['Beanstandungen'].sum() / max(1, kurzuebersicht['Verkauft'].sum())) * 100,
-                    2
-                ) if kurzuebersicht['Verkauft'].sum() > 0 else 0.00
-            ]
-        })
-        
-        # Kombinieren die Daten mit der Gesamtzeile
-        kurzuebersicht_final = pd.concat([kurzuebersicht, gesamt_row], ignore_index=True)
-        
-        # Fügen die Registerkarte zur Excel-Datei hinzu
-        safe_month = args.month or "Alle_Monate"
-        sheet_name = f'Kurzübersicht_{safe_month}'
-        with pd.ExcelWriter(result_filename, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-            kurzuebersicht_final.to_excel(writer, sheet_name=sheet_name, index=False)
-
-            # Greifen auf das Worksheet-Objekt zu
-            worksheet_kurzübersicht = writer.sheets[sheet_name]
-            # Standardbreite ist oft ~8.43, wir setzen z.B. 25
-            worksheet_kurzübersicht.column_dimensions['A'].width = 10
-            worksheet_kurzübersicht.column_dimensions['B'].width = 10
-            worksheet_kurzübersicht.column_dimensions['C'].width = 15
-            worksheet_kurzübersicht.column_dimensions['D'].width = 25
-            worksheet_kurzübersicht.column_dimensions['E'].width = 15
-            worksheet_kurzübersicht.column_dimensions['F'].width = 15
-            worksheet_kurzübersicht.column_dimensions['G'].width = 25
-        
-        print(f"Registerkarte '{sheet_name}' hinzugefügt")
-        print(f"Gesamt Beanstandungen: {kurzuebersicht['Beanstandungen'].sum()}")
-        print(f"Gesamt Verkäufe: {kurzuebersicht['Verkauft'].sum()}")
-        
+    except Exception as e:
+        print(f"Fehler beim Speichern der gefilterten Daten: {e}")
+        import traceback
+        traceback.print_exc()
+
+    if saved_aggregates is not None:
+        grp_agg = saved_aggregates[1]
     else:
-        print("Nicht alle benötigten Daten sind verfügbar für die Kurzübersicht")
-        # Erstellen eine leere Registerkarte mit einer Fehlermeldung
-        error_data = pd.DataFrame({'Fehler': ['Benötigte Daten nicht verfügbar']})
-        sheet_name = f'Kurzübersicht_{args.month}'
-        with pd.ExcelWriter(result_filename, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-            error_data.to_excel(writer, sheet_name=sheet_name, index=False)
-            
-except Exception as e:
-    print(f"Fehler beim Erstellen der Kurzübersicht: {e}")
-    import traceback
-    traceback.print_exc()
-
-# 17. Offene Fälle
-try:
-    print(f"\n=== Offene_Fälle_{args.month} erstellen ===")
-    
-    # Überprüfen, ob alle benötigten Daten vorhanden sind
-    if ('df_user_regionen' in locals() and 'erledigt_final' in locals() and 'offen_final' in locals() and len(offen_final) > 1):
-        
-        # Kopieren die User-Regionen-Daten als Basis
-        offene_falle = df_user_regionen.copy()
-        
-        # Spalte "Beanstandungen" hinzufügen
-        # Für jeden User (Spalte 0 in df_user_regionen) zähle die Einträge in df_final (Spalte 3)
-        # Beginnen ab der zweiten Zeile (ohne Header)
-        abgeschlossene_counts = erledigt_final.iloc[1:, 3].value_counts()  
-        
-        # Erstellen ein Dictionary für schnelle Suche
-        abgeschlossene_dict = abgeschlossene_counts.to_dict()
-        
-        # Fügen die Spalte "Beanstandungen" hinzu
-        offene_falle['Abgeschlossene Fälle'] = offene_falle['User'].map(abgeschlossene_dict).fillna(0).astype(int)
-        
-        # Spalte "Verkauft" hinzufügen
-        offene_counts = offen_final.iloc[1:, 3].value_counts()  
-        offene_dict = offene_counts.to_dict()
-        
-        # Fügen die Spalte "Verkauft" hinzu
-        offene_falle['Offene Fälle'] = offene_falle['User'].map(offene_dict).fillna(0).astype(int)
+        grp_agg = grp_aggregates(filtered_rows_grp) if len(filtered_rows_grp.columns) > 1 else None
+        if checkpoints:
+            checkpoints.save('aggregates', (recl_agg, grp_agg))
+
+    check_job(job, 'Schritt 14')
+    write_grp_summaries(sheets, month, recl_agg, grp_agg, user_directory)
+
+    check_job(job, 'dem Speichern')
+    sheets.save(target)
+    return target
+
+def report_aggregates(df_raw, df_grp, month: str | None = None, username: str | None = None,
+                      debug_dumps: bool = False, job=None):
+    """
+    Schritte 2-12 ohne Ergebnisdatei: filtert die Rohdaten und liefert nur die
+    Zählwerte (recl_agg, grp_agg) für die Auswertungen, z.B. für die Vorschau.
+    """
+    from job_control import check_job
+
+    check_job(job, 'Schritt 2')
+    df_final = filter_recl(df_raw, month, username, debug_dumps)
+    check_job(job, 'Schritt 8')
+    recl_agg = recl_aggregates(df_final.iloc[1:]) if len(df_final.columns) > 8 else None
+
+    check_job(job, 'Schritt 10')
+    _, filtered_rows_grp = filter_grp(df_grp, month, username, debug_dumps)
+    grp_agg = grp_aggregates(filtered_rows_grp) if len(filtered_rows_grp.columns) > 1 else None
+    return recl_agg, grp_agg
+
+def run_pipeline(recl, grp, month: str | None = None, username: str | None = None, output=None,
+                 debug_dumps: bool = False, chunk_size: int | None = None, user_directory: str | None = None,
+                 job_id: str | None = None, rerun_from: str | None = None, job=None, frames: str | None = None,
+                 writer_workers: int | None = None):
+    """
+    Liest die Eingabedateien ein und erstellt die Ergebnisdatei. Mit `chunk_size`
+    werden die Eingaben blockweise verarbeitet (siehe chunked_report.py).
+    `recl` und `grp` können auch Listen von Dateien sein.
+
+    Mit `job_id` werden die Zwischenstände der großen Schritte gesichert; ein
+    erneuter Lauf mit derselben ID setzt beim letzten gültigen Zwischenstand fort
+    (siehe checkpoints.py). `rerun_from` verwirft die Zwischenstände ab diesem Schritt.
+    `job` (siehe job_control.py) bricht zwischen den Schritten bei Abbruch oder Frist ab.
+    Mit `frames` werden die Rohdaten aus dieser Datei übernommen, falls ein anderer
+    Prozess dieselben Eingabedateien schon eingelesen hat, sonst dort abgelegt
+    (siehe shared_frames.py).
+    """
+    recl_files, grp_files = as_file_list(recl), as_file_list(grp)
+    if job_id:
+        if chunk_size:
+            # Blockweise Verarbeitung hält keine vollständigen Zwischenergebnisse
+            print("Mit --job-id wird im Speicher verarbeitet, --chunk-size wird nicht verwendet")
+        if frames:
+            # Die Rohdaten liegen schon im Checkpoint 'ingest', keine zweite Kopie
+            print("Mit --job-id kommen die Rohdaten aus dem Checkpoint, --frames wird nicht verwendet")
+        from checkpoints import Checkpoints, cached, inputs_key
+        checkpoints = Checkpoints(job_id, inputs_key(recl_files, grp_files), month, username)
+        if rerun_from:
+            checkpoints.discard_from(rerun_from)
+        if checkpoints.has('recl') and checkpoints.has('grp'):
+            # Rohdaten werden nur für die Filter gebraucht
+            df_raw = df_grp = None
+        else:
+            df_raw, df_grp = cached(checkpoints, 'ingest', lambda: load_inputs(recl, grp, debug_dumps))
+        return build_report(df_raw, df_grp, month, username, output, debug_dumps, user_directory, checkpoints, job,
+                            writer_workers)
+
+    if chunk_size and len(recl_files) <= 1 and len(grp_files) <= 1:
+        from chunked_report import build_report_chunked
+        return build_report_chunked(recl_files[0] if recl_files else None, grp_files[0] if grp_files else None,
+                                    month, username, output, chunk_size, user_directory, job, writer_workers)
+    if chunk_size:
+        # Deduplizieren und Sortieren braucht alle Zeilen gleichzeitig
+        print("Mehrere Dateien werden im Speicher zusammengeführt, --chunk-size wird nicht verwendet")
+    if frames:
+        from shared_frames import load_shared
+        df_raw, df_grp = load_shared(frames, recl_files, grp_files, lambda: load_inputs(recl, grp, debug_dumps))
+    else:
+        df_raw, df_grp = load_inputs(recl, grp, debug_dumps)
+    return build_report(df_raw, df_grp, month, username, output, debug_dumps, user_directory, job=job,
+                        writer_workers=writer_workers)
 
-        # Spalte "Begründung" hinzufügen
-        # Extrahieren die Datenzeilen aus offen_final (ohne Header)
-        offen_data_rows = offen_final.iloc[1:]
-        
-        # Gruppieren nach User (Spalte 3 in offen_final) und sammlen eindeutige Begründungen (Spalte 9 in offen_final)
-        # Verwenden dropna=False, um auch leere Begründungen zu berücksichtigen, falls nötig
-        begruendungen_grouped = offen_data_rows.groupby(offen_data_rows.iloc[:, 3])[offen_data_rows.columns[9]].apply(
-            lambda x: '  \n \n'.join(sorted(x.dropna().astype(str).unique())) # Verwenden '  ' (zwei Leerzeichen) als Trenner
-        )
+def print_quick_look(args):
+    """Schnellansicht: Näherungswerte ausgeben, keine Ergebnisdatei."""
+    import pandas as pd
+    from quick_look import SAMPLE_SIZE, quick_look
 
-        # Erstellen ein Dictionary aus der Gruppierung
-        begruendungen_dict = begruendungen_grouped.to_dict()
-
-        # Fügen die Spalte "Begründung" hinzu
-        offene_falle['Begründung'] = offene_falle['User'].map(begruendungen_dict).fillna('')
-
-        # Leere Spalten hinzufügen 
-        offene_falle['Hängig bei CA'] = ''   # Leere Spalte
-        offene_falle['Hängig bei AMAG'] = '' # Leere Spalte
-
-        # Gesamtzeile am Ende hinzufügen
-        gesamt_row = pd.DataFrame({
-            'User': ['Gesamt'],
-            'PLZ': [''],
-            'Region': [''],
-            'Stadort': [''],
-            'Abgeschlossene Fälle': [offene_falle['Abgeschlossene Fälle'].sum()],
-            'Offene Fälle': [offene_falle['Offene Fälle'].sum()],
-            'Begründung': [''],
-            'Hängig bei CA': [''],
-            'Hängig bei AMAG': ['']  
-        })
-        
-        # Kombinieren die Daten mit der Gesamtzeile
-        offene_final = pd.concat([offene_falle, gesamt_row], ignore_index=True)
-        
-        # Fügen die Registerkarte zur Excel-Datei hinzu
-        safe_month = args.month or "Alle_Monate"
-        sheet_name = f'Offene_Fälle_{safe_month}'
-        with pd.ExcelWriter(result_filename, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-            offene_final.to_excel(writer, sheet_name=sheet_name, index=False)
-
-            from openpyxl import load_workbook
-
-            worksheet_offen = writer.sheets[sheet_name] 
-            from openpyxl.utils import get_column_letter
-            spalte_begründung_buchstabe = get_column_letter(7)
-
-            # Iterieren durch alle Zeilen mit Daten in dieser Spalte (beginnend mit Zeile 2, da Zeile 1 der Header ist)
-            for reihe in range(2, len(offene_final) + 2): # +2 weil: 1-basiert + Header-Zeile
-                zelle = worksheet_offen[f'{spalte_begründung_buchstabe}{reihe}']
-                # Aktivieren den automatischen Zeilenumbruch für diese Zelle
-                zelle.alignment = openpyxl.styles.Alignment(wrap_text=True, vertical='top')
-
-            # Greifen auf das Worksheet-Objekt zu
-            worksheet_kurzübersicht = writer.sheets[sheet_name]
-
-            worksheet_offen.column_dimensions['A'].width = 10
-            worksheet_offen.column_dimensions['B'].width = 10
-            worksheet_offen.column_dimensions['C'].width = 15
-            worksheet_offen.column_dimensions['D'].width = 25
-            worksheet_offen.column_dimensions['E'].width = 25
-            worksheet_offen.column_dimensions['F'].width = 25
-            worksheet_offen.column_dimensions['G'].width = 45
-            worksheet_offen.column_dimensions['H'].width = 20 
-            worksheet_offen.column_dimensions['I'].width = 20
-        
-        print(f"Registerkarte '{sheet_name}' hinzugefügt")
-        
+    try:
+        result = quick_look(args.recl, args.grp, args.month, args.username,
+                            sample_size=args.sample_size or SAMPLE_SIZE, user_directory=args.user_directory)
+    except ValueError as e:
+        print(f"Fehler: {e}")
+        exit(1)
+
+    if result['exact']:
+        print("Alle Zeilen ausgewertet, die Werte sind exakt.")
     else:
-        print("Nicht alle benötigten Daten sind verfügbar für die Offen Fälle")
-        # Erstellen eine leere Registerkarte mit einer Fehlermeldung
-        error_data = pd.DataFrame({'Fehler': ['Benötigte Daten nicht verfügbar']})
-        sheet_name = f'Offene_Fälle_{args.month}'
-        with pd.ExcelWriter(result_filename, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-            error_data.to_excel(writer, sheet_name=sheet_name, index=False)
-            
-except Exception as e:
-    print(f"Fehler beim Erstellen der Offene Fälle: {e}")
-    import traceback
-    traceback.print_exc()
-
-print(f"\nFertig! Ergebnis gespeichert in: {result_filename}")
-print("Verfügbare Registerkarten:")
-print("1. 'Alle' - Alle gefilterten Daten")
-print("2. 'Erledigt' - Nur erledigte Beanstandungen")
-print("3. 'Offen' - Nur offene Beanstandungen")
-print("4. 'Hauptthema Analyse Ergebnis' - Statistische Auswertung")
-print("5. 'Pivot Einsteller Hauptthema' - Kreuztabelle Einsteller x Hauptthema")
-print("6. 'Gruppenreporting' - Die Daten mit der Info über die Verkäufe")
-print("7. 'Verkäufe nach User' - wie viele Fahrzeuge hat jeder AMAG-User verkauft")
-print("8. 'User Regionen' - einfach die Liste mit allen AMAG Usern")
-print("9. 'Kurzübersicht' - die Hauptdatei")
-print("10. 'Offene Fälle' - Alle Beanstandungen, die offen sind")
\ No newline at end of file
+        print(f"Näherungswerte aus Stichprobe ({result['sampled']} von {result['population']} Zeilen, "
+              f"95%-Konfidenzintervall). Exakte Werte liefert der Lauf ohne --quick-look.")
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 200):
+        for name, table in result['tables'].items():
+            print(f"\n=== {name} ===")
+            print(table.to_string(index=False))
+
+def main(argv=None):
+    # Parcer ergänzt
+    args = parse_args(argv)
+
+    # Sofort ausgeben, damit der Aufrufer den Start sieht, bevor pandas geladen wird
+    print(f"Verarbeitung für Monat: {args.month}")
+    print(f"Recl-Datei: {', '.join(args.recl)}", flush=True)
+
+    # Überprüfen ob die Dateien existieren (vor dem Import von pandas)
+    for path in args.recl + args.grp:
+        if not os.path.exists(path):
+            print(f"Fehler: Datei {path} nicht gefunden!")
+            exit(1)
+    if args.chunk_size is not None and args.chunk_size < 1:
+        print(f"Fehler: --chunk-size muss mindestens 1 sein!")
+        exit(1)
+    if args.rerun_from and not args.job_id:
+        print(f"Fehler: --rerun-from nur zusammen mit --job-id!")
+        exit(1)
+    if args.job_id and os.path.basename(args.job_id) != args.job_id:
+        print(f"Fehler: --job-id darf keinen Pfad enthalten!")
+        exit(1)
+
+    if args.timeout is not None and args.timeout <= 0:
+        print(f"Fehler: --timeout muss größer als 0 sein!")
+        exit(1)
+    if args.sample_size is not None and args.sample_size < 1:
+        print(f"Fehler: --sample-size muss mindestens 1 sein!")
+        exit(1)
+
+    # Vorprüfung: nur die Header-Zeile lesen, bevor die Analyse startet
+    from upload_validation import validate_uploads
+    errors = validate_uploads(args.recl, args.grp)
+    if errors:
+        for error in errors:
+            print(f"Fehler: {error}")
+        exit(1)
+
+    if args.quick_look:
+        print_quick_look(args)
+        return
+
+    from debug_artifacts import DEBUG_DUMPS
+    from job_control import STOPPED_EXIT_CODE, Job, JobStopped
+    from report_renderer import pool_workers
+    # Frist ab Programmstart; der Aufrufer beendet den Prozess, falls ein Schritt länger hängt
+    job = Job(args.job_id or 'cli', args.timeout) if args.timeout else None
+    try:
+        result_filename = run_pipeline(args.recl, args.grp, args.month, args.username,
+                                       debug_dumps=args.debug_dumps or DEBUG_DUMPS,
+                                       chunk_size=args.chunk_size, user_directory=args.user_directory,
+                                       job_id=args.job_id, rerun_from=args.rerun_from, job=job,
+                                       frames=args.frames, writer_workers=pool_workers())
+    except JobStopped as e:
+        print(f"Abbruch: {e}")
+        exit(STOPPED_EXIT_CODE)
+
+    print(f"\nFertig! Ergebnis gespeichert in: {result_filename}")
+    print("Verfügbare Registerkarten:")
+    print("1. 'Alle' - Alle gefilterten Daten")
+    print("2. 'Erledigt' - Nur erledigte Beanstandungen")
+    print("3. 'Offen' - Nur offene Beanstandungen")
+    print("4. 'Hauptthema Analyse Ergebnis' - Statistische Auswertung")
+    print("5. 'Pivot Einsteller Hauptthema' - Kreuztabelle Einsteller x Hauptthema")
+    print("6. 'Gruppenreporting' - Die Daten mit der Info über die Verkäufe")
+    print("7. 'Verkäufe nach User' - wie viele Fahrzeuge hat jeder AMAG-User verkauft")
+    print("8. 'User Regionen' - einfach die Liste mit allen AMAG Usern")
+    print("9. 'Kurzübersicht' - die Hauptdatei")
+    print("10. 'Offene Fälle' - Alle Beanstandungen, die offen sind")
+    print("11. 'Regionen' / 'Standorte' - Auswertung je Region und Standort (mit User-Verzeichnis)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Zulassungssteuerung für Analysen im Web-Prozess.
+
+Höchstens `max_active` Analysen laufen gleichzeitig, weitere Anfragen warten in
+einer begrenzten Warteschlange. Ist die Warteschlange voll (insgesamt oder für
+einen einzelnen Client), wird die Anfrage sofort mit AdmissionRejected
+abgelehnt; die App antwortet dann mit 429 und Retry-After.
+
+Freie Plätze werden reihum an die wartenden Clients vergeben (Round Robin je
+Client-Schlüssel), damit ein einzelner ZIP-Export mit vielen Berichten andere
+Benutzer nicht aushungert.
+
+Wird ein wartender Auftrag abgebrochen (job_control.Job, z.B. Schließen des
+Tabs), verlässt er die Warteschlange sofort mit JobStopped, statt seinen Platz
+in der Runde bis zur Zulassung zu behalten.
+
+Die Grenzen gelten pro Prozess; bei mehreren gunicorn-Workern pro Worker.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from job_control import POLL_INTERVAL, JobStopped
+
+class AdmissionRejected(Exception):
+    """Anfrage wurde nicht zugelassen; `retry_after` ist eine Schätzung in Sekunden."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class _Ticket:
+    __slots__ = ('client', 'admitted')
+
+    def __init__(self, client: str):
+        self.client = client
+        self.admitted = False
+
+class AdmissionController:
+    def __init__(self, max_active: int = 2, max_queue: int = 10, max_queue_per_client: int = 3,
+                 queue_timeout: float = 300.0, initial_duration: float = 30.0):
+        self.max_active = max(1, max_active)
+        self.max_queue = max(0, max_queue)
+        self.max_queue_per_client = max(1, max_queue_per_client)
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._active = 0
+        # Client -> wartende Tickets; Reihenfolge der Schlüssel = Reihenfolge der Vergabe
+        self._waiting = OrderedDict()
+        self._queued = 0
+        # Gleitender Mittelwert der Analysedauer für Retry-After
+        self._avg_duration = initial_duration
+
+        self.admitted_total = 0
+        self.completed_total = 0
+        self.rejected_queue_full = 0
+        self.rejected_client_limit = 0
+        self.rejected_timeout = 0
+        self.cancelled_waiting = 0
+
+    @classmethod
+    def from_env(cls):
+        """Grenzen aus ANALYSIS_MAX_ACTIVE, ANALYSIS_MAX_QUEUE, ANALYSIS_MAX_QUEUE_PER_USER, ANALYSIS_QUEUE_TIMEOUT."""
+        return cls(
+            max_active=int(os.environ.get('ANALYSIS_MAX_ACTIVE', 2)),
+            max_queue=int(os.environ.get('ANALYSIS_MAX_QUEUE', 10)),
+            max_queue_per_client=int(os.environ.get('ANALYSIS_MAX_QUEUE_PER_USER', 3)),
+            queue_timeout=float(os.environ.get('ANALYSIS_QUEUE_TIMEOUT', 300)),
+        )
+
+    def retry_after(self) -> int:
+        """Geschätzte Wartezeit in Sekunden, bis wieder ein Platz in der Warteschlange frei ist."""
+        rounds = (self._queued + 1) / self.max_active
+        return max(1, math.ceil(self._avg_duration * rounds))
+
+    def _check(self, client: str, bounded: bool):
+        """Wirft AdmissionRejected, wenn die Anfrage nicht warten darf. Erwartet gehaltenen Lock."""
+        if not bounded:
+            return
+        if self._queued >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(
+                f"Zu viele Analysen in der Warteschlange ({self._queued}). Bitte später erneut versuchen.",
+                self.retry_after()
+            )
+        if len(self._waiting.get(client, ())) >= self.max_queue_per_client:
+            self.rejected_client_limit += 1
+            raise AdmissionRejected(
+                f"Für '{client}' warten bereits {self.max_queue_per_client} Analysen. Bitte später erneut versuchen.",
+                self.retry_after()
+            )
+
+    def check(self, client: str):
+        """Prüft ohne Platz zu belegen, ob eine neue Anfrage zugelassen würde."""
+        with self._cond:
+            if self._active < self.max_active and not self._queued:
+                return
+            self._check(client, bounded=True)
+
+    def _dispatch(self):
+        """Vergibt freie Plätze reihum an die Clients mit wartenden Tickets. Erwartet gehaltenen Lock."""
+        admitted = False
+        while self._active < self.max_active and self._waiting:
+            client, tickets = next(iter(self._waiting.items()))
+            ticket = tickets.popleft()
+            self._queued -= 1
+            if tickets:
+                # Client ans Ende der Runde stellen
+                self._waiting.move_to_end(client)
+            else:
+                del self._waiting[client]
+            ticket.admitted = True
+            self._active += 1
+            self.admitted_total += 1
+            admitted = True
+        if admitted:
+            self._cond.notify_all()
+
+    def _leave(self, client: str, ticket: _Ticket):
+        """Wartendes Ticket aus der Warteschlange nehmen. Erwartet gehaltenen Lock."""
+        tickets = self._waiting.get(client)
+        if tickets is not None:
+            tickets.remove(ticket)
+            if not tickets:
+                del self._waiting[client]
+        self._queued -= 1
+
+    def acquire(self, client: str, bounded: bool = True, job=None):
+        """
+        Belegt einen Platz für `client` und wartet dafür höchstens queue_timeout Sekunden.
+        Mit bounded=False gelten die Grenzen der Warteschlange nicht (für Folgeaufträge
+        einer bereits zugelassenen Anfrage, z.B. weitere Berichte eines ZIP-Exports).
+        Wird `job` während der Wartezeit abgebrochen, wirft acquire JobStopped.
+        """
+        with self._cond:
+            if self._active < self.max_active and not self._queued:
+                self._active += 1
+                self.admitted_total += 1
+                return
+
+            self._check(client, bounded)
+            ticket = _Ticket(client)
+            self._waiting.setdefault(client, deque()).append(ticket)
+            self._queued += 1
+
+            deadline = time.monotonic() + self.queue_timeout
+            while not ticket.admitted:
+                if job is not None and job.cancelled():
+                    self._leave(client, ticket)
+                    self.cancelled_waiting += 1
+                    # Grund im Auftrag vermerken (für die Meldung an den Benutzer)
+                    job.stopped()
+                    raise JobStopped(f"Auftrag {job.job_id} in der Warteschlange abgebrochen", 'cancelled')
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._leave(client, ticket)
+                    self.rejected_timeout += 1
+                    raise AdmissionRejected(
+                        f"Wartezeit von {self.queue_timeout:.0f}s überschritten. Bitte später erneut versuchen.",
+                        self.retry_after()
+                    )
+                # Mit Auftrag regelmäßig aufwachen, um einen Abbruch zu bemerken
+                self._cond.wait(min(remaining, POLL_INTERVAL) if job is not None else remaining)
+
+    def release(self, duration: float | None = None):
+        with self._cond:
+            self._active -= 1
+            self.completed_total += 1
+            if duration is not None:
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, client: str, bounded: bool = True, job=None):
+        """Kontextmanager: Platz belegen, Analyse ausführen, Platz freigeben."""
+        self.acquire(client, bounded, job)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self) -> dict:
+        """Aktuelle Auslastung und Zähler (für /metrics)."""
+        with self._cond:
+            return {
+                'max_active': self.max_active,
+                'max_queue': self.max_queue,
+                'max_queue_per_user': self.max_queue_per_client,
+                'active': self._active,
+                'queue_depth': self._queued,
+                'queue_depth_per_user': {client: len(tickets) for client, tickets in self._waiting.items()},
+                'admitted_total': self.admitted_total,
+                'completed_total': self.completed_total,
+                'rejected_total': self.rejected_queue_full + self.rejected_client_limit + self.rejected_timeout,
+                'rejected_queue_full': self.rejected_queue_full,
+                'rejected_user_limit': self.rejected_client_limit,
+                'rejected_timeout': self.rejected_timeout,
+                'cancelled_waiting_total': self.cancelled_waiting,
+                'avg_duration_seconds': round(self._avg_duration, 2),
+            }
@@ -1,10 +1,22 @@
+import io
 import os
 import subprocess
 import sys
-from flask import Flask, render_template, request, redirect, flash, url_for, send_file
-import tempfile
+from flask import Flask, render_template, request, redirect, flash, url_for, send_file, Response, stream_with_context, jsonify
 import shutil
 
+from zip_stream import stream_zip, iter_file
+from upload_validation import validate_uploads
+from admission import AdmissionController, AdmissionRejected
+from job_control import JobRegistry, JobStopped, STOPPED_EXIT_CODE, run_process
+from temp_janitor import TempJanitor, WorkspaceFull
+from drop_folder import find_report, precomputed_key
+from shared_frames import FRAMES_FILE
+from user_directory import USERNAMES
+from report_preview import PreviewCache, PAGE_SIZE, build_preview, table_page
+from quick_look import quick_look as quick_look_tables
+from Reads_excel_columns import load_inputs, build_report, result_filename_for, run_pipeline, as_file_list
+
 app = Flask(__name__)
 app.secret_key = 'dein_geheimer_schluessel'
 
@@ -13,51 +25,109 @@ LOG_FILE   = os.path.join(BASE_DIR, 'analysis.log')
 
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
+# 'subprocess': Analyse als eigener Prozess in einem temporären Verzeichnis (Standard)
+# 'memory':     Analyse im Web-Prozess, Uploads und Ergebnis nur im Speicher (BytesIO)
+ANALYSIS_MODE = os.environ.get('ANALYSIS_MODE', 'subprocess')
+
+# Zeilen pro Block für sehr große Exporte (leer = ganze Datei im Speicher einlesen)
+ANALYSIS_CHUNK_SIZE = int(os.environ.get('ANALYSIS_CHUNK_SIZE') or 0) or None
+
+# ZIP-Export: nur der erste Analyse-Prozess liest die Uploads ein, die weiteren übernehmen
+# seine Rohdaten per mmap (siehe shared_frames.py); '0' = jeder Prozess liest selbst
+ANALYSIS_SHARED_FRAMES = os.environ.get('ANALYSIS_SHARED_FRAMES', '1') != '0'
+
+# Höchstens ANALYSIS_MAX_ACTIVE Analysen gleichzeitig, weitere warten reihum je Benutzer
+admission = AdmissionController.from_env()
+
+# Laufende Analysen mit Frist (ANALYSIS_JOB_TIMEOUT) und Abbruch über /jobs/<id>/cancel
+running_jobs = JobRegistry.from_env()
+
+# Arbeitsverzeichnisse mit Speichergrenze und Höchstalter (ANALYSIS_WORK_DIR_QUOTA_MB, ANALYSIS_WORK_DIR_MAX_AGE)
+workspace = TempJanitor.from_env()
+# Erwarteter Platzbedarf einer Analyse als Vielfaches der Upload-Größe (Uploads, Kopien, Ergebnis)
+WORKSPACE_FACTOR = 3
+# Dazu beim ZIP-Export die gemeinsamen Rohdaten (shared_frames.py, ungepackt etwa 3-4x die xlsx-Größe)
+FRAMES_FACTOR = 4
+
+# Vorschau-Aufträge mit Uploads und Auswertungstabellen in den Arbeitsverzeichnissen,
+# für alle Worker lesbar (PREVIEW_MAX_JOBS, PREVIEW_TTL)
+preview_cache = PreviewCache.from_env(workspace)
+
+MONTHS = [
+    'January', 'February', 'March', 'April', 'May', 'June',
+    'July', 'August', 'September', 'October', 'November', 'December'
+]
+
 def log(message: str):
     """Schreibt einen Zeilen-Eintrag in analysis.log."""
     with open(LOG_FILE, 'a', encoding='utf-8') as f:
         f.write(message + '\n')
 
-def run_analysis_in_temp_dir(month: str, recl_file_path: str, grp_file_path: str, temp_dir: str, username: str = None) -> str | None:
-    """Führt die Analyse in einem temporären Verzeichnis durch."""
+def run_analysis_in_temp_dir(month: str, recl_file_path, grp_file_path, temp_dir: str, username: str = None,
+                             job=None, frames: str | None = None) -> str | None:
+    """
+    Führt die Analyse in einem temporären Verzeichnis durch. `recl_file_path` und
+    `grp_file_path` können auch Listen von Pfaden sein (mehrere Exporte).
+    Mit `job` (siehe job_control.py) wird der Analyse-Prozess bei Abbruch oder
+    überschrittener Frist samt seinen Pool-Prozessen beendet. Über die Datei
+    `frames` teilen sich die Analysen eines ZIP-Exports die eingelesenen Rohdaten.
+    """
     script = os.path.join(BASE_DIR, 'Reads_excel_columns.py')
     log(f"\n=== Analyse starten für Monat {month} ===")
     log(f"Temporäres Verzeichnis: {temp_dir}")
 
-    # Kopiere die hochgeladenen Dateien ins temporäre Verzeichnis
-    temp_recl = os.path.join(temp_dir, 'recl.xlsx')
-    temp_grp = os.path.join(temp_dir, 'grp.xlsx')
-    
-    shutil.copy2(recl_file_path, temp_recl)
-    if grp_file_path and os.path.exists(grp_file_path):
-        shutil.copy2(grp_file_path, temp_grp)
+    # Kopiere die hochgeladenen Dateien ins temporäre Verzeichnis (recl.xlsx, recl_2.xlsx, ...)
+    recl_paths = as_file_list(recl_file_path)
+    grp_paths = [path for path in as_file_list(grp_file_path) if path and os.path.exists(path)]
+    temp_recl = [os.path.join(temp_dir, 'recl.xlsx' if n == 1 else f'recl_{n}.xlsx') for n in range(1, len(recl_paths) + 1)]
+    temp_grp = [os.path.join(temp_dir, 'grp.xlsx' if n == 1 else f'grp_{n}.xlsx') for n in range(1, len(grp_paths) + 1)]
+
+    for source, target in zip(recl_paths + grp_paths, temp_recl + temp_grp):
+        shutil.copy2(source, target)
 
     # Subprocess aufrufen
-    cmd = [sys.executable, script, '--recl', temp_recl]
+    cmd = [sys.executable, script, '--recl', *temp_recl]
     if month and month.strip():
         cmd.extend(['--month', month.strip()]) 
 
-    if grp_file_path and os.path.exists(grp_file_path):
-        cmd.extend(['--grp', temp_grp])
+    if temp_grp:
+        cmd.extend(['--grp', *temp_grp])
     
     if username:
         cmd.extend(['--username', username])
+
+    if ANALYSIS_CHUNK_SIZE:
+        cmd.extend(['--chunk-size', str(ANALYSIS_CHUNK_SIZE)])
+    elif frames:
+        cmd.extend(['--frames', frames])
+
+    if job is not None and job.remaining() is not None:
+        # Der Prozess hört nach der Frist zwischen zwei Schritten selbst auf
+        cmd.extend(['--timeout', f'{max(job.remaining(), 1):.0f}'])
     
     try:
-        result = subprocess.run(
-            cmd,
-            cwd=temp_dir,
-            capture_output=True,
-            text=True
-        )
+        if job is not None:
+            job.check('dem Start')
+        result = run_process(cmd, temp_dir, job, running_jobs)
         log("--- stdout ---\n" + result.stdout)
         log("--- stderr ---\n" + result.stderr)
         log(f"Return code: {result.returncode}")
-        
+
+        if job is not None and result.returncode == STOPPED_EXIT_CODE:
+            # Der Prozess hat die Frist selbst festgestellt
+            job.expire()
+        if job is not None and job.stopped():
+            log(f"Analyse {job.job_id} beendet: {job.reason}")
+            return None
+
         if result.returncode != 0:
             log("Script beendet mit Fehler!")
             return None
-            
+
+    except JobStopped as e:
+        # Abbruch oder Frist vor dem Start: kein Fehler des Analyse-Prozesses
+        log(f"Analyse {job.job_id} beendet: {e}")
+        return None
     except Exception as e:
         log("Subprocess-Fehler: " + str(e))
         return None
@@ -86,38 +156,291 @@ def run_analysis_in_temp_dir(month: str, recl_file_path: str, grp_file_path: str
     log("Keine Ergebnisdatei gefunden")
     return None
 
+def run_analysis_in_memory(month: str, recl_buffer, grp_buffer, username: str = None,
+                           job=None) -> io.BytesIO | None:
+    """
+    Führt die Analyse ohne Dateisystem durch und liefert das Ergebnis als BytesIO.
+    `recl_buffer` und `grp_buffer` können auch Listen von Puffern sein. Mit `job`
+    wird zwischen den Schritten auf Abbruch und Frist geprüft.
+    """
+    log(f"\n=== Analyse im Speicher starten für Monat {month} ===")
+    try:
+        output = io.BytesIO()
+        run_pipeline(recl_buffer, grp_buffer, month, username, output=output,
+                     debug_dumps=False, chunk_size=ANALYSIS_CHUNK_SIZE, job=job)
+    except Exception as e:
+        log("Analyse-Fehler: " + str(e))
+        return None
+
+    output.seek(0)
+    log(f"Ergebnis im Speicher erstellt: {output.getbuffer().nbytes} Bytes")
+    return output
+
+def client_key() -> str:
+    """Schlüssel für die faire Vergabe der Analyseplätze: Benutzername, sonst IP-Adresse."""
+    return request.form.get('username') or request.remote_addr or 'anonym'
+
+def failure_message(job=None) -> str:
+    """Meldung für eine Analyse ohne Ergebnis, je nach Grund."""
+    reason = job.reason if job is not None else None
+    if reason == 'cancelled':
+        return "Analyse abgebrochen."
+    if reason == 'timeout':
+        return f"Analyse nach {job.timeout:.0f} Sekunden abgebrochen (Zeitlimit). Bitte kleinere Dateien oder einen Monat wählen."
+    return "Analyse fehlgeschlagen. Schau in analysis.log."
+
+def too_many_requests(error: AdmissionRejected):
+    """Antwort 429 mit Retry-After, wenn keine Analyse zugelassen wird."""
+    log(f"Anfrage abgelehnt (429): {error}")
+    return Response(
+        f"{error}\n",
+        status=429,
+        mimetype='text/plain',
+        headers={'Retry-After': str(error.retry_after)}
+    )
+
+def uploaded_files(name: str) -> list:
+    """Alle im Feld `name` hochgeladenen Dateien (das Formular erlaubt mehrere Exporte je Feld)."""
+    return [f for f in request.files.getlist(name) if f and f.filename]
+
+def save_uploads(files, directory: str, prefix: str) -> list[str]:
+    """Speichert Uploads als <prefix>.xlsx, <prefix>_2.xlsx, ... und gibt die Pfade zurück."""
+    paths = []
+    for number, file in enumerate(files, start=1):
+        path = os.path.join(directory, f'{prefix}.xlsx' if number == 1 else f'{prefix}_{number}.xlsx')
+        file.save(path)
+        paths.append(path)
+    return paths
+
+def reject_invalid_uploads(recl_files, grp_files) -> bool:
+    """Vorprüfung der Uploads (nur die Header-Zeile); meldet Fehler per flash."""
+    errors = validate_uploads([f.stream for f in recl_files], [f.stream for f in grp_files] or None)
+    if errors:
+        log("Upload abgelehnt: " + " | ".join(errors))
+        for error in errors:
+            flash(error)
+    return bool(errors)
+
+def _iter_and_cleanup(path: str, temp_dir: str):
+    """Liest die Ergebnisdatei blockweise und löscht danach ihr temporäres Verzeichnis."""
+    try:
+        yield from iter_file(path)
+    finally:
+        workspace.remove(temp_dir)
+        log(f"Temporäres Verzeichnis gelöscht: {temp_dir}")
+
+def workspace_needed(upload_bytes: int | None = None, shared_frames: bool = False) -> int:
+    """
+    Erwarteter Platzbedarf einer Analyse für Uploads dieser Größe (Standard: aktuelle
+    Anfrage); mit `shared_frames` auch für die gemeinsamen Rohdaten eines ZIP-Exports.
+    """
+    if upload_bytes is None:
+        upload_bytes = request.content_length or 0
+    factor = WORKSPACE_FACTOR + (FRAMES_FACTOR if shared_frames else 0)
+    return upload_bytes * factor
+
+@app.errorhandler(WorkspaceFull)
+def workspace_full(error: WorkspaceFull):
+    """Antwort 507, wenn die Speichergrenze für Arbeitsverzeichnisse erreicht ist."""
+    log(f"Anfrage abgelehnt (507): {error}")
+    return Response(f"{error}\n", status=507, mimetype='text/plain')
+
+def batch_cancelled(job) -> bool:
+    """ZIP-Export abgebrochen: keine weiteren Berichte starten."""
+    return job is not None and job.stopped() == 'cancelled'
+
+CANCELLED_NOTE = ('ABGEBROCHEN.txt', [b"Der Export wurde abgebrochen, weitere Berichte fehlen.\n"])
+
+def iter_batch_reports(jobs, recl_paths: list[str], grp_paths: list[str], client: str = 'anonym', job=None,
+                       upload_dir: str | None = None, precomputed: str | None = None):
+    """
+    Führt die Analysen nacheinander aus und liefert jede Ergebnisdatei als
+    (Name im Archiv, Byte-Blöcke), sobald sie fertig ist. Es liegt immer nur
+    ein Ergebnis gleichzeitig auf der Platte. Jeder Bericht belegt einen eigenen
+    Analyseplatz, damit andere Benutzer zwischendurch an die Reihe kommen.
+    Die Frist von `job` gilt je Bericht; ein Abbruch beendet den ganzen Export.
+    Mit `precomputed` (Schlüssel der Uploads) kommen vorberechnete Berichte direkt
+    aus drop_folder.py. Die Uploads liest nur der erste Analyse-Prozess ein; die
+    Rohdaten liegen danach in `upload_dir` für die weiteren (shared_frames.py).
+    """
+    upload_bytes = sum(os.path.getsize(path) for path in recl_paths + grp_paths)
+    frames = os.path.join(upload_dir, FRAMES_FILE) if upload_dir and ANALYSIS_SHARED_FRAMES else None
+    for month, username in jobs:
+        if batch_cancelled(job):
+            yield CANCELLED_NOTE
+            return
+        folder = username or 'Alle_User'
+        report = find_report(precomputed, month, username)
+        if report:
+            yield f'{folder}/{result_filename_for(month)}', iter_file(report)
+            continue
+        if upload_dir:
+            # Die gemeinsamen Uploads werden noch gebraucht
+            workspace.touch(upload_dir)
+        try:
+            temp_dir = workspace.create(f'analysis_{month}_', workspace_needed(upload_bytes))
+        except WorkspaceFull as e:
+            log(f"Bericht {folder} / {month}: {e}")
+            yield f'{folder}/FEHLER_{month or "Alle_Monate"}.txt', [f"{e}\n".encode('utf-8')]
+            continue
+        try:
+            with admission.slot(client, bounded=False, job=job):
+                if job is not None:
+                    job.start()
+                result_filename = run_analysis_in_temp_dir(month, recl_paths, grp_paths, temp_dir, username, job,
+                                                           frames)
+        except AdmissionRejected as e:
+            log(f"Bericht {folder} / {month} nicht zugelassen: {e}")
+            result_filename = None
+        except JobStopped as e:
+            log(f"Bericht {folder} / {month}: {e}")
+            result_filename = None
+
+        if not result_filename:
+            workspace.remove(temp_dir)
+            safe_month = month.strip() if month and month.strip() else "Alle_Monate"
+            message = f"{failure_message(job)} ({folder} / {safe_month})\n"
+            yield f'{folder}/FEHLER_{safe_month}.txt', [message.encode('utf-8')]
+            continue
+
+        result_path = os.path.join(temp_dir, result_filename)
+        yield f'{folder}/{result_filename}', _iter_and_cleanup(result_path, temp_dir)
+
+def iter_batch_reports_in_memory(jobs, recl_buffers, grp_buffers, client: str = 'anonym', job=None,
+                                 precomputed: str | None = None):
+    """
+    Wie iter_batch_reports, aber ohne Dateisystem: die Uploads werden einmal
+    eingelesen und jeder Bericht wird in ein eigenes BytesIO geschrieben.
+    Mit ANALYSIS_CHUNK_SIZE wird stattdessen jeder Bericht blockweise aus den
+    Upload-Puffern erstellt, ohne die Tabellen vollständig einzulesen.
+    """
+    reports = [(month, username, find_report(precomputed, month, username)) for month, username in jobs]
+    for month, username, report in reports:
+        if report:
+            yield f'{username or "Alle_User"}/{result_filename_for(month)}', iter_file(report)
+    # Nur die Berichte ohne vorberechnete Datei werden erstellt (die Uploads dann einmal eingelesen)
+    jobs = [(month, username) for month, username, report in reports if not report]
+    if not jobs:
+        return
+
+    if ANALYSIS_CHUNK_SIZE:
+        for month, username in jobs:
+            if batch_cancelled(job):
+                yield CANCELLED_NOTE
+                return
+            folder = username or 'Alle_User'
+            result_filename = result_filename_for(month)
+            try:
+                with admission.slot(client, bounded=False, job=job):
+                    if job is not None:
+                        job.start()
+                    output = run_analysis_in_memory(month, recl_buffers, grp_buffers, username, job)
+            except AdmissionRejected as e:
+                log(f"Bericht {folder} / {month} nicht zugelassen: {e}")
+                output = None
+            except JobStopped as e:
+                log(f"Bericht {folder} / {month}: {e}")
+                output = None
+            if output is None:
+                message = f"{failure_message(job)} ({folder} / {result_filename})\n"
+                yield f'{folder}/FEHLER_{result_filename}.txt', [message.encode('utf-8')]
+                continue
+            yield f'{folder}/{result_filename}', iter_file(output)
+        return
+
+    try:
+        with admission.slot(client, bounded=False, job=job):
+            df_raw, df_grp = load_inputs(recl_buffers, grp_buffers, debug_dumps=False)
+    except JobStopped as e:
+        log(f"ZIP-Export: {e}")
+        yield CANCELLED_NOTE
+        return
+    except Exception as e:
+        log("Fehler beim Einlesen der Uploads: " + str(e))
+        yield 'FEHLER.txt', [b"Uploads konnten nicht eingelesen werden. Schau in analysis.log.\n"]
+        return
+
+    for month, username in jobs:
+        if batch_cancelled(job):
+            yield CANCELLED_NOTE
+            return
+        folder = username or 'Alle_User'
+        result_filename = result_filename_for(month)
+        try:
+            output = io.BytesIO()
+            with admission.slot(client, bounded=False, job=job):
+                if job is not None:
+                    job.start()
+                build_report(df_raw, df_grp, month, username, output=output, debug_dumps=False, job=job)
+        except Exception as e:
+            log(f"Analyse-Fehler für {folder} / {month}: {e}")
+            message = f"{failure_message(job)} ({folder} / {result_filename})\n"
+            yield f'{folder}/FEHLER_{result_filename}.txt', [message.encode('utf-8')]
+            continue
+
+        yield f'{folder}/{result_filename}', iter_file(output)
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
-        month     = request.form.get('month')
-        username  = request.form.get('username')
-        recl_file = request.files.get('recl')
-        grp_file  = request.files.get('grp')
+        month      = request.form.get('month')
+        username   = request.form.get('username')
+        recl_files = uploaded_files('recl')
+        grp_files  = uploaded_files('grp')
 
-        if not recl_file:
+        if not recl_files:
             flash("Excel-Datei (recl) sind Pflicht.")
             return redirect(request.url)
 
-        # Erstelle ein temporäres Verzeichnis für diese Anfrage
-        temp_dir = tempfile.mkdtemp(prefix=f'analysis_{month}_')
+        if reject_invalid_uploads(recl_files, grp_files):
+            return redirect(request.url)
+
+        # Dieselben Exporte wie im Ablage-Ordner: vorberechnete Ergebnisdatei sofort ausliefern
+        report = find_report(precomputed_key([f.stream for f in recl_files], [f.stream for f in grp_files]),
+                             month, username)
+        if report:
+            log(f"Vorberechnete Ergebnisdatei ausgeliefert: {report}")
+            return send_file(report, as_attachment=True, download_name=result_filename_for(month))
+
+        if ANALYSIS_MODE == 'memory':
+            recl_buffers = [io.BytesIO(f.read()) for f in recl_files]
+            grp_buffers = [io.BytesIO(f.read()) for f in grp_files] or None
+            try:
+                with running_jobs.run(request.form.get('job_id')) as job, admission.slot(client_key(), job=job):
+                    job.start()
+                    output = run_analysis_in_memory(month, recl_buffers, grp_buffers, username, job)
+            except AdmissionRejected as e:
+                return too_many_requests(e)
+            except JobStopped as e:
+                log("Analyse beendet: " + str(e))
+                output = None
+            if output is None:
+                flash(failure_message(job))
+                return redirect(request.url)
+            return send_file(
+                output,
+                as_attachment=True,
+                download_name=result_filename_for(month),
+                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
+
+        # Erstelle ein temporäres Verzeichnis für diese Anfrage (oder lehne sie ab, wenn der Platz fehlt)
+        temp_dir = workspace.create(f'analysis_{month}_', workspace_needed())
         
         try:
             # Speichere hochgeladene Dateien temporär
-            recl_path = os.path.join(temp_dir, 'upload_recl.xlsx')
-            recl_file.save(recl_path)
-            
-            grp_path = None
-            if grp_file and grp_file.filename:
-                grp_path = os.path.join(temp_dir, 'upload_grp.xlsx')
-                grp_file.save(grp_path)
+            recl_paths = save_uploads(recl_files, temp_dir, 'upload_recl')
+            grp_paths = save_uploads(grp_files, temp_dir, 'upload_grp')
 
-            # Führe Analyse durch
-            result_filename = run_analysis_in_temp_dir(month, recl_path, grp_path, temp_dir, username)
+            # Führe Analyse durch, sobald ein Analyseplatz frei ist
+            with running_jobs.run(request.form.get('job_id')) as job, admission.slot(client_key(), job=job):
+                job.start()
+                result_filename = run_analysis_in_temp_dir(month, recl_paths, grp_paths, temp_dir, username, job)
             
             if not result_filename:
-                flash("Analyse fehlgeschlagen. Schau in analysis.log.")
+                flash(failure_message(job))
                 # Lösche temporäres Verzeichnis
-                shutil.rmtree(temp_dir)
+                workspace.remove(temp_dir)
                 return redirect(request.url)
 
             # Sende Ergebnisdatei
@@ -130,29 +453,304 @@ def index():
                 )
                 
                 # Lösche temporäres Verzeichnis nach dem Senden
-                try:
-                    shutil.rmtree(temp_dir)
-                    log(f"Temporäres Verzeichnis gelöscht: {temp_dir}")
-                except Exception as e:
-                    log(f"Fehler beim Löschen des temporären Verzeichnisses: {e}")
+                workspace.remove(temp_dir)
+                log(f"Temporäres Verzeichnis gelöscht: {temp_dir}")
                 
                 return response
             else:
                 flash("Ergebnisdatei nicht gefunden.")
-                shutil.rmtree(temp_dir)
+                workspace.remove(temp_dir)
                 return redirect(request.url)
+
+        except AdmissionRejected as e:
+            workspace.remove(temp_dir)
+            return too_many_requests(e)
+
+        except JobStopped as e:
+            # In der Warteschlange abgebrochen
+            workspace.remove(temp_dir)
+            log("Analyse beendet: " + str(e))
+            flash(failure_message(job))
+            return redirect(request.url)
                 
         except Exception as e:
             # Im Fehlerfall temporäres Verzeichnis löschen
-            try:
-                shutil.rmtree(temp_dir)
-            except:
-                pass
+            workspace.remove(temp_dir)
             log(f"Fehler bei der Verarbeitung: {e}")
             flash("Ein Fehler ist aufgetreten. Schau in analysis.log.")
             return redirect(request.url)
 
-    return render_template('index.html')
+    return render_template('index.html', months=MONTHS, usernames=USERNAMES)
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    """Erstellt mehrere Ergebnisdateien (Monate x User) und streamt sie als ZIP."""
+    months    = [m for m in request.form.getlist('months') if m.strip()] or [request.form.get('month') or '']
+    usernames = [u for u in request.form.getlist('usernames') if u.strip()] or USERNAMES
+    recl_files = uploaded_files('recl')
+    grp_files  = uploaded_files('grp')
+
+    if not recl_files:
+        flash("Excel-Datei (recl) sind Pflicht.")
+        return redirect(url_for('index'))
+
+    if reject_invalid_uploads(recl_files, grp_files):
+        return redirect(url_for('index'))
+
+    # Neue Exporte nur annehmen, wenn die Warteschlange Platz hat
+    client = client_key()
+    try:
+        admission.check(client)
+    except AdmissionRejected as e:
+        return too_many_requests(e)
+
+    jobs = [(month, username) for month in months for username in usernames]
+    job_id = request.form.get('job_id')
+    precomputed = precomputed_key([f.stream for f in recl_files], [f.stream for f in grp_files])
+    log(f"\n=== ZIP-Export: {len(jobs)} Berichte ===")
+
+    if ANALYSIS_MODE == 'memory':
+        recl_buffers = [io.BytesIO(f.read()) for f in recl_files]
+        grp_buffers = [io.BytesIO(f.read()) for f in grp_files] or None
+
+        def generate():
+            with running_jobs.run(job_id) as job:
+                yield from stream_zip(iter_batch_reports_in_memory(jobs, recl_buffers, grp_buffers, client, job,
+                                                                      precomputed))
+    else:
+        # Die Uploads werden einmal gespeichert und von allen Analysen gemeinsam genutzt
+        upload_dir = workspace.create('batch_upload_',
+                                      workspace_needed(shared_frames=ANALYSIS_SHARED_FRAMES and not ANALYSIS_CHUNK_SIZE))
+        try:
+            recl_paths = save_uploads(recl_files, upload_dir, 'upload_recl')
+            grp_paths = save_uploads(grp_files, upload_dir, 'upload_grp')
+        except BaseException:
+            # z.B. volle Platte oder abgebrochener Upload: generate() läuft dann nie
+            workspace.remove(upload_dir)
+            raise
+
+        def generate():
+            try:
+                with running_jobs.run(job_id) as job:
+                    yield from stream_zip(iter_batch_reports(jobs, recl_paths, grp_paths, client, job, upload_dir,
+                                                            precomputed))
+            finally:
+                workspace.remove(upload_dir)
+                log(f"Upload-Verzeichnis gelöscht: {upload_dir}")
+
+    archive_name = 'Ergebnisse_' + '_'.join(m or 'Alle_Monate' for m in months) + '.zip'
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{archive_name}"'}
+    )
+
+@app.route('/preview', methods=['POST'])
+def preview():
+    """Berechnet nur die Zählwerte und zeigt die Auswertungstabellen im Browser an."""
+    month      = request.form.get('month')
+    username   = request.form.get('username')
+    recl_files = uploaded_files('recl')
+    grp_files  = uploaded_files('grp')
+
+    if not recl_files:
+        flash("Excel-Datei (recl) sind Pflicht.")
+        return redirect(url_for('index'))
+
+    if reject_invalid_uploads(recl_files, grp_files):
+        return redirect(url_for('index'))
+
+    log(f"\n=== Vorschau für Monat {month} ===")
+    # Die Uploads bleiben für den späteren Download im Arbeitsverzeichnis des Auftrags
+    preview_dir = preview_cache.create(request.content_length or 0)
+    try:
+        recl_paths = save_uploads(recl_files, preview_dir, 'upload_recl')
+        grp_paths = save_uploads(grp_files, preview_dir, 'upload_grp')
+        with running_jobs.run(request.form.get('job_id')) as run, admission.slot(client_key(), job=run):
+            run.start()
+            job = build_preview(month, username, recl_paths, grp_paths, job=run)
+        job_id = preview_cache.put(preview_dir, {**job, 'recl': recl_paths, 'grp': grp_paths})
+    except AdmissionRejected as e:
+        workspace.remove(preview_dir)
+        return too_many_requests(e)
+    except JobStopped as e:
+        workspace.remove(preview_dir)
+        log("Vorschau beendet: " + str(e))
+        flash(failure_message(run))
+        return redirect(url_for('index'))
+    except Exception as e:
+        workspace.remove(preview_dir)
+        log("Vorschau-Fehler: " + str(e))
+        flash("Vorschau fehlgeschlagen. Schau in analysis.log.")
+        return redirect(url_for('index'))
+    except BaseException:
+        workspace.remove(preview_dir)
+        raise
+
+    log(f"Vorschau {job_id}: {len(job['tables'])} Tabellen")
+    return redirect(url_for('preview_table', job_id=job_id))
+
+@app.route('/quick-look', methods=['POST'])
+def quick_look():
+    """Schnellansicht: Hauptthema-Analyse und Kurzübersicht als Näherung aus einer Stichprobe."""
+    month      = request.form.get('month')
+    username   = request.form.get('username')
+    recl_files = uploaded_files('recl')
+    grp_files  = uploaded_files('grp')
+
+    if not recl_files:
+        flash("Excel-Datei (recl) sind Pflicht.")
+        return redirect(url_for('index'))
+
+    if reject_invalid_uploads(recl_files, grp_files):
+        return redirect(url_for('index'))
+
+    log(f"\n=== Schnellansicht für Monat {month} ===")
+    # Wie ein Vorschau-Auftrag, damit die vollständige Datei heruntergeladen werden kann
+    preview_dir = preview_cache.create(request.content_length or 0)
+    try:
+        recl_paths = save_uploads(recl_files, preview_dir, 'upload_recl')
+        grp_paths = save_uploads(grp_files, preview_dir, 'upload_grp')
+        with running_jobs.run(request.form.get('job_id')) as run, admission.slot(client_key(), job=run):
+            run.start()
+            result = quick_look_tables(recl_paths, grp_paths, month, username, job=run)
+        job_id = preview_cache.put(preview_dir, {
+            'month': month,
+            'username': username,
+            'recl': recl_paths,
+            'grp': grp_paths,
+            'tables': result['tables'],
+            'approximate': None if result['exact'] else {
+                'sampled': result['sampled'],
+                'population': result['population'],
+            },
+        })
+    except AdmissionRejected as e:
+        workspace.remove(preview_dir)
+        return too_many_requests(e)
+    except JobStopped as e:
+        workspace.remove(preview_dir)
+        log("Schnellansicht beendet: " + str(e))
+        flash(failure_message(run))
+        return redirect(url_for('index'))
+    except ValueError as e:
+        workspace.remove(preview_dir)
+        flash(str(e))
+        return redirect(url_for('index'))
+    except Exception as e:
+        workspace.remove(preview_dir)
+        log("Schnellansicht-Fehler: " + str(e))
+        flash("Schnellansicht fehlgeschlagen. Schau in analysis.log.")
+        return redirect(url_for('index'))
+    except BaseException:
+        workspace.remove(preview_dir)
+        raise
+
+    log(f"Schnellansicht {job_id}: {result['sampled']} von {result['population']} Zeilen")
+    return redirect(url_for('preview_table', job_id=job_id))
+
+@app.route('/preview/<job_id>')
+def preview_table(job_id):
+    """Eine Seite einer Auswertungstabelle aus dem Cache (?table=&page=&sort=&order=desc)."""
+    job = preview_cache.get(job_id)
+    if job is None:
+        flash("Die Vorschau ist abgelaufen. Bitte die Dateien erneut hochladen.")
+        return redirect(url_for('index'))
+
+    names = list(job['tables'])
+    if not names:
+        flash("Keine Auswertungen für diese Auswahl verfügbar.")
+        return redirect(url_for('index'))
+    name = request.args.get('table')
+    if name not in job['tables']:
+        # Standard: Kurzübersicht, sonst die erste Tabelle
+        name = next((n for n in names if n.startswith('Kurzübersicht')), names[0])
+
+    page = table_page(
+        job['tables'][name],
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', PAGE_SIZE, type=int),
+        sort=request.args.get('sort'),
+        descending=request.args.get('order') == 'desc',
+    )
+    return render_template(
+        'download.html',
+        job_id=job_id,
+        month=job['month'] or 'Alle_Monate',
+        username=job['username'],
+        tables=names,
+        table=name,
+        filename=result_filename_for(job['month']),
+        approximate=job.get('approximate'),
+        **page
+    )
+
+@app.route('/preview/<job_id>/download')
+def preview_download(job_id):
+    """Erstellt die vollständige Ergebnisdatei aus den Uploads des Vorschau-Auftrags."""
+    job = preview_cache.get(job_id)
+    if job is None:
+        flash("Die Vorschau ist abgelaufen. Bitte die Dateien erneut hochladen.")
+        return redirect(url_for('index'))
+
+    month, username = job['month'], job['username']
+
+    if ANALYSIS_MODE == 'memory':
+        try:
+            with running_jobs.run() as run, admission.slot(client_key()):
+                run.start()
+                output = run_analysis_in_memory(month, job['recl'], job['grp'] or None, username, run)
+        except AdmissionRejected as e:
+            return too_many_requests(e)
+        if output is None:
+            flash(failure_message(run))
+            return redirect(url_for('preview_table', job_id=job_id))
+        return send_file(
+            output,
+            as_attachment=True,
+            download_name=result_filename_for(month),
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+
+    upload_bytes = sum(os.path.getsize(path) for path in job['recl'] + job['grp'])
+    temp_dir = workspace.create(f'analysis_{month}_', workspace_needed(upload_bytes))
+    try:
+        # run_analysis_in_temp_dir kopiert die Uploads aus dem Vorschau-Auftrag
+        with running_jobs.run() as run, admission.slot(client_key()):
+            run.start()
+            result_filename = run_analysis_in_temp_dir(month, job['recl'], job['grp'], temp_dir, username, run)
+    except AdmissionRejected as e:
+        workspace.remove(temp_dir)
+        return too_many_requests(e)
+    except BaseException:
+        workspace.remove(temp_dir)
+        raise
+
+    if not result_filename:
+        workspace.remove(temp_dir)
+        flash(failure_message(run))
+        return redirect(url_for('preview_table', job_id=job_id))
+
+    # Ergebnisdatei blockweise senden, danach das temporäre Verzeichnis löschen
+    result_path = os.path.join(temp_dir, result_filename)
+    return Response(
+        stream_with_context(_iter_and_cleanup(result_path, temp_dir)),
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={'Content-Disposition': f'attachment; filename="{result_filename}"'}
+    )
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Bricht eine laufende oder wartende Analyse ab (z.B. Schaltfläche oder Schließen des Tabs)."""
+    if not running_jobs.cancel(job_id):
+        return jsonify({'job_id': job_id, 'cancelled': False}), 404
+    log(f"Abbruch angefordert: {job_id}")
+    return jsonify({'job_id': job_id, 'cancelled': True}), 202
+
+@app.route('/metrics')
+def metrics():
+    """Auslastung: laufende Analysen, Warteschlange und abgelehnte Anfragen."""
+    return jsonify({**admission.stats(), **running_jobs.stats(), **workspace.stats(), **preview_cache.stats()})
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""
+Zwischenstände einer Analyse pro Auftrags-ID, damit ein erneuter Lauf nach
+einem Fehler in einem späten Schritt nicht wieder beim Einlesen beginnt.
+
+Gesichert werden die Ergebnisse der großen Schritte:
+
+    ingest      Rohdaten (df_raw, df_grp) nach dem Einlesen
+    recl        gefilterte recl-Daten (Schritte 2-5)
+    grp         gefiltertes Gruppenreporting (Schritte 10-12)
+    aggregates  Zählwerte für die Auswertungen (recl_agg, grp_agg)
+
+Jeder Zwischenstand gehört zu einem Schlüssel aus den Inhalten der
+Eingabedateien (und ab `recl` auch Monat und Benutzer). Passt der Schlüssel
+nicht mehr, wird der Zwischenstand nicht verwendet. Die Registerkarten werden
+bei jedem Lauf neu geschrieben.
+
+Die Dateien sind DataFrame-Pickles wie im PDF-Cache (pdf_ingest.py): Parquet
+bzw. Feather bräuchten pyarrow, und die Rohdaten haben gemischte
+object-Spalten (Header-Zeile zwischen Datums- und Zahlenwerten).
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+
+CHECKPOINT_DIR = os.environ.get('CHECKPOINT_DIR', os.path.join(tempfile.gettempdir(), 'beanstandungen_checkpoints'))
+# Bei Änderungen am Format der Zwischenstände erhöhen
+CHECKPOINT_VERSION = 1
+
+# Reihenfolge der Schritte; ein erneutes Ausführen ab einem Schritt verwirft auch alle folgenden
+STAGES = ('ingest', 'recl', 'grp', 'aggregates')
+
+def _digest(source, digest):
+    """Inhalt einer Datei (Pfad) oder eines Puffers in den Hash aufnehmen."""
+    if hasattr(source, 'read'):
+        position = source.tell()
+        source.seek(0)
+        for block in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(block)
+        source.seek(position)
+    elif source is not None:
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    digest.update(b'\0')
+
+def inputs_key(recl_files, grp_files) -> str:
+    """Hash über die Inhalte aller Eingabedateien (Reihenfolge zählt, sie bestimmt die Zusammenführung)."""
+    digest = hashlib.sha256()
+    for sources in (recl_files, grp_files):
+        for source in sources:
+            _digest(source, digest)
+        digest.update(b'|')
+    return digest.hexdigest()
+
+class Checkpoints:
+    """Zwischenstände eines Auftrags in <root>/<job_id>/<Schritt>.pkl."""
+
+    def __init__(self, job_id: str, inputs: str, month: str | None = None, username: str | None = None,
+                 root: str = CHECKPOINT_DIR):
+        if not job_id or os.path.basename(job_id) != job_id or job_id in ('.', '..'):
+            raise ValueError(f"Ungültige Auftrags-ID: {job_id!r}")
+        self.job_id = job_id
+        self.directory = os.path.join(root, job_id)
+        # Bereits geprüfte Zwischenstände, None = nicht verwendbar (has() und load() lesen die Datei nur einmal)
+        self._loaded = {}
+        self._keys = {}
+        for stage in STAGES:
+            # Die Rohdaten hängen nur von den Dateien ab, die gefilterten Daten auch vom Filter
+            self._keys[stage] = (CHECKPOINT_VERSION, inputs) if stage == 'ingest' else \
+                (CHECKPOINT_VERSION, inputs, month or None, username or None)
+
+    def _path(self, stage: str) -> str:
+        return os.path.join(self.directory, f'{stage}.pkl')
+
+    def load(self, stage: str):
+        """Gesicherter Wert des Schritts oder None (fehlt, veraltet oder nicht lesbar)."""
+        if stage in self._loaded:
+            return self._loaded[stage]
+        path = self._path(stage)
+        self._loaded[stage] = None
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                key, value = pickle.load(f)
+        except Exception as e:
+            print(f"Checkpoint '{stage}' nicht lesbar, wird neu berechnet: {e}")
+            return None
+        if key != self._keys[stage]:
+            print(f"Checkpoint '{stage}' passt nicht zu Eingaben oder Filtern, wird neu berechnet")
+            return None
+        print(f"Checkpoint '{stage}' geladen: {path}")
+        self._loaded[stage] = value
+        return value
+
+    def has(self, stage: str) -> bool:
+        return self.load(stage) is not None
+
+    def save(self, stage: str, value):
+        """Wert des Schritts sichern; erst vollständig schreiben, dann umbenennen."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(stage)
+            partial = f'{path}.{os.getpid()}.tmp'
+            with open(partial, 'wb') as f:
+                pickle.dump((self._keys[stage], value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(partial, path)
+            self._loaded[stage] = value
+            print(f"Checkpoint '{stage}' gespeichert: {path}")
+        except Exception as e:
+            # Ein fehlender Zwischenstand kostet nur Zeit beim nächsten Lauf
+            print(f"Checkpoint '{stage}' konnte nicht gespeichert werden: {e}")
+
+    def discard_from(self, stage: str):
+        """Zwischenstände ab `stage` verwerfen (z.B. nach einer Änderung an den Filtern)."""
+        for later in STAGES[STAGES.index(stage):]:
+            self._loaded.pop(later, None)
+            if os.path.exists(self._path(later)):
+                os.remove(self._path(later))
+                print(f"Checkpoint '{later}' verworfen")
+
+def cached(checkpoints: Checkpoints | None, stage: str, compute):
+    """Ergebnis des Schritts aus dem Zwischenstand, sonst berechnen und sichern."""
+    if checkpoints is None:
+        return compute()
+    value = checkpoints.load(stage)
+    if value is None:
+        value = compute()
+        checkpoints.save(stage, value)
+    return value
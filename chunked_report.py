@@ -0,0 +1,236 @@
+"""
+Blockweise Erstellung der Ergebnisdatei für sehr große recl/grp-Exporte.
+
+Die Eingaben werden zeilenweise mit openpyxl (read_only) gelesen und in Blöcken
+von `chunk_size` Zeilen gefiltert. Gefilterte Zeilen gehen sofort in eine
+write-only Arbeitsmappe, für die Auswertungen werden nur Zählwerte pro Block
+zusammengeführt. Der Speicherbedarf hängt damit von der Blockgröße ab und nicht
+von der Länge des Exports.
+
+Die Auswertungs-Registerkarten entstehen mit denselben Funktionen wie in
+Reads_excel_columns.build_report und sind identisch zum Ergebnis im Speicher.
+Zwischenstände zur Fehlersuche (debug_artifacts.py) werden in diesem Modus nicht geschrieben.
+"""
+import numpy as np
+import openpyxl
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from job_control import check_job
+from Reads_excel_columns import (
+    GRP_COLS_TO_DROP, RECL_COLS_TO_DROP,
+    filter_grp_rows, filter_recl_rows, grp_aggregates, merge_aggregates,
+    recl_aggregates, result_filename_for, to_date,
+    write_grp_summaries, write_recl_summaries,
+)
+from report_renderer import ReportRenderer
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# Werte, die pd.read_excel standardmäßig als fehlend (NaN) einliest
+NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a',
+    'nan', 'null',
+}
+
+def _convert_value(value):
+    """Zellwert so umwandeln, wie pd.read_excel ihn einlesen würde."""
+    if value is None:
+        return np.nan
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value in NA_STRINGS:
+        return np.nan
+    return value
+
+def iter_excel_chunks(source, chunk_size: int = DEFAULT_CHUNK_SIZE, skip_rows: int = 0):
+    """
+    Liest das erste Tabellenblatt von `source` (Pfad oder Puffer) und liefert
+    DataFrames mit höchstens `chunk_size` Zeilen. Der erste Block beginnt mit der
+    Header-Zeile nach `skip_rows` übersprungenen Zeilen.
+
+    Die Spaltenanzahl wird aus dem ersten Block bestimmt und für alle weiteren
+    Blöcke beibehalten; Spaltenbezeichnungen sind wie bei header=None 0, 1, 2, ...
+
+    PDFs (siehe pdf_ingest.py) werden vollständig extrahiert und dann in Blöcken geliefert.
+    """
+    from pdf_ingest import is_pdf, load_recl_pdf
+    if is_pdf(source):
+        frame = load_recl_pdf(source).iloc[skip_rows:].reset_index(drop=True)
+        for start in range(0, len(frame), chunk_size):
+            yield frame.iloc[start:start + chunk_size].reset_index(drop=True)
+        return
+
+    wb = openpyxl.load_workbook(source, read_only=True, data_only=True, keep_links=False)
+    try:
+        ws = wb.worksheets[0]
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+        for _ in range(skip_rows):
+            if next(rows, None) is None:
+                return
+
+        width = None
+        block = []
+        for row in rows:
+            block.append(row)
+            if len(block) >= chunk_size:
+                width = width or _block_width(block)
+                yield _to_frame(block, width)
+                block = []
+        if block:
+            width = width or _block_width(block)
+            yield _to_frame(block, width)
+    finally:
+        wb.close()
+
+def _block_width(block) -> int:
+    width = 0
+    for row in block:
+        filled = [i for i, value in enumerate(row) if value is not None]
+        if filled:
+            width = max(width, filled[-1] + 1)
+    return width
+
+def _to_frame(block, width: int):
+    data = [[_convert_value(v) for v in (tuple(row[:width]) + (None,) * (width - len(row)))] for row in block]
+    return pd.DataFrame(data, columns=range(width), dtype=object)
+
+def _pin_date_format(values) -> str | None:
+    """Datumsformat aus dem ersten Text-Wert erraten, damit alle Blöcke gleich gelesen werden."""
+    for value in values:
+        if isinstance(value, str):
+            return guess_datetime_format(value)
+        if not pd.isna(value):
+            return None
+    return None
+
+def build_report_chunked(recl, grp, month: str | None = None, username: str | None = None,
+                         output=None, chunk_size: int = DEFAULT_CHUNK_SIZE, user_directory: str | None = None,
+                         job=None, writer_workers: int | None = None):
+    """
+    Wie Reads_excel_columns.run_pipeline, aber blockweise. `recl` und `grp`
+    können Dateipfade oder Puffer sein, `output` ein Pfad oder Puffer. Mit `job`
+    wird nach jedem Block auf Abbruch und Frist geprüft (siehe job_control.py).
+    `writer_workers` wie bei Reads_excel_columns.build_report.
+    """
+    safe_month = month.strip() if month and month.strip() else "Alle_Monate"
+    result_filename = result_filename_for(month)
+    target = output if output is not None else result_filename
+    sheets = ReportRenderer(writer_workers)
+
+    # Schritte 2-7: recl blockweise filtern, Detail-Registerkarten direkt schreiben
+    print(f"\n=== recl blockweise verarbeiten (Blockgröße {chunk_size}) ===")
+    sheet_alle = sheets.open(f'Alle_{safe_month}', 'detail')
+    sheet_erledigt = sheet_offen = None
+    header = None
+    recl_month = month
+    recl_date_format = None
+    recl_format_pinned = False
+    recl_agg = None
+    total_rows = 0
+    filtered_total = 0
+
+    # 2. Erste 3 Zeilen entfernen
+    for chunk in iter_excel_chunks(recl, chunk_size, skip_rows=3):
+        check_job(job, 'dem nächsten recl-Block')
+        # 3. Spalten entfernen
+        processed = chunk.drop(columns=RECL_COLS_TO_DROP, errors='ignore')
+        if header is None:
+            header = processed.iloc[[0]]
+            processed = processed.iloc[1:]
+            sheets.append(sheet_alle, header)
+        total_rows += len(processed)
+
+        # 4. Filtern: erst Einsteller/abgelehnt/User, dann Monat. Das Datumsformat
+        #    wird wie bei pd.to_datetime aus der ersten passenden Zeile bestimmt.
+        filtered = filter_recl_rows(processed, None, username, verbose=False)
+        if recl_month and not recl_format_pinned and len(filtered) > 0:
+            recl_format_pinned = True
+            recl_date_format = _pin_date_format(filtered.iloc[:, 0])
+            # Wie im Gesamtlauf: wird weniger als die Hälfte der Datumsangaben erkannt,
+            # bleibt die Monatsfilterung aus (hier am ersten Block entschieden)
+            date_series = pd.to_datetime(filtered.iloc[:, 0], format=recl_date_format, errors='coerce')
+            if date_series.notna().sum() < len(filtered) * 0.5:
+                print(f"Datumsangaben nicht erkannt, Monatsfilterung für {month} wird übersprungen")
+                recl_month = None
+        filtered = filter_recl_rows(filtered, recl_month, None, verbose=False, date_format=recl_date_format)
+        if len(filtered) == 0:
+            continue
+        filtered_total += len(filtered)
+
+        # 5. Timestamp-Spalten 0 und 6 in reines Datum wandeln
+        filtered = filtered.copy()
+        for col_idx in (0, 6):
+            if len(filtered.columns) > col_idx:
+                filtered.iloc[:, col_idx] = to_date(filtered.iloc[:, col_idx])
+        sheets.append(sheet_alle, filtered)
+
+        # 7. Erledigt und Offen
+        if len(filtered.columns) > 5:
+            if sheet_erledigt is None:
+                sheet_erledigt = sheets.open(f'Erledigt_{month or "Alle_Monate"}', 'detail')
+                sheet_offen = sheets.open(f'Offen_{month or "Alle_Monate"}', 'detail')
+                sheets.append(sheet_erledigt, header)
+                sheets.append(sheet_offen, header)
+            status = filtered.iloc[:, 5].astype(str).str.strip()
+            sheets.append(sheet_erledigt, filtered[status == 'erledigt'])
+            sheets.append(sheet_offen, filtered[status == 'offen'])
+
+        if len(filtered.columns) > 8:
+            recl_agg = merge_aggregates(recl_agg, recl_aggregates(filtered))
+
+        print(f"recl: {total_rows} Zeilen gelesen, {filtered_total} nach Filter")
+
+    if header is None:
+        raise ValueError("recl enthält keine Header-Zeile")
+
+    # Leere Auswertung, wenn keine Zeile den Filter passiert hat
+    if recl_agg is None and len(header.columns) > 8:
+        recl_agg = recl_aggregates(header.iloc[0:0])
+
+    # Schritte 8-9
+    check_job(job, 'Schritt 8')
+    write_recl_summaries(sheets, month, recl_agg)
+
+    # Schritte 10-13: Gruppenreporting blockweise filtern und schreiben
+    print(f"\n=== Gruppenreporting blockweise verarbeiten ===")
+    sheet_grp = sheets.open(f'Gruppenreporting_{month or "Alle_Monate"}', 'gruppenreporting')
+    header_grp = None
+    grp_date_format = None
+    grp_agg = None
+    total_rows_grp = 0
+    filtered_total_grp = 0
+
+    for chunk in iter_excel_chunks(grp, chunk_size):
+        check_job(job, 'dem nächsten Gruppenreporting-Block')
+        # 10. Spalten entfernen
+        processed = chunk.drop(columns=GRP_COLS_TO_DROP, errors='ignore')
+        if header_grp is None:
+            header_grp = processed.iloc[[0]]
+            processed = processed.iloc[1:]
+            sheets.append(sheet_grp, header_grp)
+        total_rows_grp += len(processed)
+
+        # 11-12. Filtern, Datumsformat wie oben aus der ersten passenden Zeile
+        filtered = filter_grp_rows(processed, None, username, verbose=False)
+        if month and grp_date_format is None and len(filtered) > 0 and len(filtered.columns) > 4:
+            grp_date_format = _pin_date_format(filtered.iloc[:, 4])
+        filtered = filter_grp_rows(filtered, month, None, verbose=False, date_format=grp_date_format)
+        filtered_total_grp += len(filtered)
+        sheets.append(sheet_grp, filtered)
+
+        if len(filtered.columns) > 1:
+            grp_agg = merge_aggregates(grp_agg, grp_aggregates(filtered))
+
+        print(f"Gruppenreporting: {total_rows_grp} Zeilen gelesen, {filtered_total_grp} nach Filter")
+
+    # Schritte 14-17
+    check_job(job, 'Schritt 14')
+    write_grp_summaries(sheets, month, recl_agg, grp_agg, user_directory)
+
+    check_job(job, 'dem Speichern')
+    sheets.save(target)
+    print(f"Ergebnis gespeichert: {result_filename if output is None else 'Puffer'} ({safe_month})")
+    return target
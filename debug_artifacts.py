@@ -0,0 +1,113 @@
+"""
+Zwischenstände einer Analyse zur Fehlersuche (früher file2_raw.xlsx,
+file2_processed.xlsx und grp_processed.xlsx im Arbeitsverzeichnis).
+
+Standardmäßig wird nichts geschrieben. Mit --debug-dumps bzw.
+ANALYSIS_DEBUG_DUMPS=1 legt die Analyse die Zwischenstände ab, aber nicht mehr
+als xlsx und nicht mehr im Ablauf der Analyse: ein Hintergrund-Thread schreibt
+sie als DataFrame-Pickle (wie checkpoints.py; Parquet bräuchte pyarrow), die
+Analyse läuft sofort weiter. Beim Beenden des Prozesses wartet Python, bis
+alle Zwischenstände geschrieben sind.
+
+Jeder Lauf bekommt ein eigenes Verzeichnis unter DEBUG_DUMP_DIR
+(<Zeitpunkt>_<Prozess-ID>). Läufe älter als DEBUG_DUMP_RETENTION Sekunden
+werden beim nächsten Lauf mit Zwischenständen gelöscht.
+
+Ansehen:
+    python debug_artifacts.py                         # Läufe und Zwischenstände auflisten
+    python debug_artifacts.py <Lauf>/file2_raw.pkl    # als file2_raw.xlsx daneben speichern
+"""
+import argparse
+import datetime
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+# Zwischenstände schreiben ('1') oder nicht ('0', Standard)
+DEBUG_DUMPS = os.environ.get('ANALYSIS_DEBUG_DUMPS', '0') != '0'
+DUMP_DIR = os.environ.get('DEBUG_DUMP_DIR', os.path.join(tempfile.gettempdir(), 'beanstandungen_debug'))
+# Aufbewahrung der Läufe in Sekunden
+RETENTION = float(os.environ.get('DEBUG_DUMP_RETENTION', 24 * 3600))
+
+DUMP_SUFFIX = '.pkl'
+
+_lock = threading.Lock()
+_writer = None
+_run_dir = None
+
+def _prune(root: str, retention: float):
+    """Läufe älter als `retention` Sekunden löschen."""
+    now = time.time()
+    for entry in os.scandir(root):
+        if entry.is_dir(follow_symlinks=False) and now - entry.stat().st_mtime > retention:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            print(f"Alte Zwischenstände gelöscht: {entry.path}")
+
+def run_directory() -> str:
+    """Verzeichnis dieses Laufs; beim ersten Aufruf anlegen und alte Läufe löschen."""
+    global _run_dir
+    if _run_dir is None:
+        os.makedirs(DUMP_DIR, exist_ok=True)
+        _prune(DUMP_DIR, RETENTION)
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        _run_dir = os.path.join(DUMP_DIR, f'{stamp}_{os.getpid()}')
+        os.makedirs(_run_dir, exist_ok=True)
+    return _run_dir
+
+def _write(df, path: str):
+    """Läuft im Hintergrund-Thread: erst vollständig schreiben, dann umbenennen."""
+    try:
+        partial = f'{path}.tmp'
+        df.to_pickle(partial)
+        os.replace(partial, path)
+    except Exception as e:
+        # Ein fehlender Zwischenstand stört die Analyse nicht
+        print(f"Zwischenstand {os.path.basename(path)} konnte nicht geschrieben werden: {e}")
+
+def dump(df, name: str):
+    """
+    Zwischenstand `name` (z.B. 'file2_raw') im Hintergrund ablegen. `df` darf
+    danach nicht mehr verändert werden.
+    """
+    global _writer
+    try:
+        with _lock:
+            path = os.path.join(run_directory(), name + DUMP_SUFFIX)
+            if _writer is None:
+                # Die Threads eines ThreadPoolExecutor werden beim Beenden des Prozesses abgewartet
+                from concurrent.futures import ThreadPoolExecutor
+                _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='debug-dumps')
+        _writer.submit(_write, df, path)
+        print(f"Zwischenstand {name}: {path}")
+    except Exception as e:
+        print(f"Zwischenstand {name} konnte nicht abgelegt werden: {e}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Zwischenstände der Analysen auflisten oder als xlsx speichern')
+    parser.add_argument('dump', nargs='?', help=f'Zwischenstand (*{DUMP_SUFFIX}), absolut oder relativ zu {DUMP_DIR}')
+    args = parser.parse_args(argv)
+
+    if not args.dump:
+        if not os.path.isdir(DUMP_DIR):
+            print(f"Keine Zwischenstände in {DUMP_DIR}")
+            return 0
+        for entry in sorted(os.scandir(DUMP_DIR), key=lambda entry: entry.name):
+            if entry.is_dir():
+                print(f"{entry.name}: {', '.join(sorted(os.listdir(entry.path)))}")
+        return 0
+
+    import pandas as pd
+
+    path = args.dump if os.path.exists(args.dump) else os.path.join(DUMP_DIR, args.dump)
+    if not os.path.exists(path):
+        print(f"Fehler: Zwischenstand {args.dump} nicht gefunden!")
+        return 1
+    target = os.path.splitext(path)[0] + '.xlsx'
+    pd.read_pickle(path).to_excel(target, header=False, index=False)
+    print(f"Gespeichert: {target}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
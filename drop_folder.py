@@ -0,0 +1,245 @@
+"""
+Vorberechnete Ergebnisdateien aus einem Ablage-Ordner.
+
+Das ERP legt jede Nacht die recl- und grp-Exporte in einen gemeinsamen Ordner.
+Dieser Dienst prüft den Ordner regelmäßig auf neue Dateien, erkennt recl und
+grp an der Header-Zeile (upload_validation.py) und erstellt für das
+neueste Paar die Ergebnisdateien des aktuellen Monats: einmal für alle User und
+einmal je Benutzer aus USERNAMES.
+
+Die Ergebnisse liegen unter <PRECOMPUTED_DIR>/<Schlüssel>/<User>/Ergebnis_<Monat>.xlsx.
+Der Schlüssel ist der Inhalts-Hash der beiden Dateien (checkpoints.inputs_key).
+Lädt jemand morgens dieselben Dateien hoch, findet die Web-App den Bericht über
+den Hash der Uploads und liefert ihn sofort aus, ohne Analyse.
+
+Eine Datei gilt erst als vollständig, wenn sich Größe und Änderungszeit zwischen
+zwei Prüfungen nicht mehr geändert haben oder sie seit einem Prüfintervall
+unverändert ist (das ERP schreibt große Exporte länger).
+Ein Satz Ergebnisse wird erst in ein temporäres Verzeichnis geschrieben und
+dann umbenannt; es bleiben die KEEP_SETS neuesten Sätze.
+
+Aufruf (als eigener Prozess, nicht in den gunicorn-Workern):
+    python drop_folder.py /pfad/zum/ablageordner            # dauerhaft überwachen
+    python drop_folder.py /pfad/zum/ablageordner --once     # einmal prüfen, z.B. per cron
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from checkpoints import inputs_key
+
+DROP_FOLDER = os.environ.get('DROP_FOLDER')
+PRECOMPUTED_DIR = os.environ.get('PRECOMPUTED_DIR', os.path.join(tempfile.gettempdir(), 'beanstandungen_precomputed'))
+# Sekunden zwischen zwei Prüfungen des Ordners
+POLL_INTERVAL = float(os.environ.get('DROP_FOLDER_POLL', 60))
+# So viele Ergebnis-Sätze (verschiedene Export-Paare) bleiben erhalten
+KEEP_SETS = 3
+# Beschreibung eines fertigen Satzes (Quellen, Monat, Zeitpunkt)
+MANIFEST_FILE = 'manifest.json'
+
+EXPORT_SUFFIXES = ('.xlsx',)
+
+def current_month(today: datetime.date | None = None) -> str:
+    """Monatsname wie im Formular (z.B. 'March')."""
+    from Reads_excel_columns import MONTH_MAP
+
+    number = (today or datetime.date.today()).month
+    return next(name for name, value in MONTH_MAP.items() if value == number)
+
+def report_path(key: str, month: str | None, username: str | None, root: str = PRECOMPUTED_DIR) -> str:
+    """Ort der vorberechneten Ergebnisdatei eines Satzes."""
+    from Reads_excel_columns import result_filename_for
+
+    return os.path.join(root, key, username or 'Alle_User', result_filename_for(month))
+
+def precomputed_key(recl_sources, grp_sources, root: str = PRECOMPUTED_DIR) -> str | None:
+    """Schlüssel der Uploads, falls es überhaupt vorberechnete Ergebnisse gibt (sonst wird nicht gehasht)."""
+    if not os.path.isdir(root) or not any(not name.startswith('.') for name in os.listdir(root)):
+        return None
+    return inputs_key(recl_sources, grp_sources)
+
+def find_report(key: str | None, month: str | None, username: str | None, root: str = PRECOMPUTED_DIR) -> str | None:
+    """Pfad der vorberechneten Ergebnisdatei oder None."""
+    if not key:
+        return None
+    path = report_path(key, month, username, root)
+    # Monat und Benutzer kommen aus dem Formular: nur Dateien innerhalb des Satzes
+    if os.path.dirname(os.path.dirname(os.path.abspath(path))) != os.path.abspath(os.path.join(root, key)):
+        return None
+    return path if os.path.exists(path) else None
+
+def classify(path: str) -> str | None:
+    """
+    'recl' oder 'grp', wenn die Header-Zeile die Spaltenbezeichnungen genau
+    eines der beiden Exporte trägt; None für andere oder nicht eindeutige Dateien.
+    """
+    from upload_validation import validate_grp, validate_recl
+
+    kinds = [kind for kind, validate in (('recl', validate_recl), ('grp', validate_grp)) if not validate(path)]
+    if len(kinds) > 1:
+        print(f"{os.path.basename(path)}: passt zu recl und grp, wird übersprungen")
+    return kinds[0] if len(kinds) == 1 else None
+
+def snapshot(directory: str) -> dict:
+    """Größe und Änderungszeit aller Exporte im Ordner."""
+    files = {}
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.lower().endswith(EXPORT_SUFFIXES) and not entry.name.startswith(('.', '~$')):
+            stat = entry.stat()
+            files[entry.path] = (stat.st_size, stat.st_mtime)
+    return files
+
+def latest_pair(files: dict, kinds: dict) -> tuple[str | None, str | None]:
+    """Neueste recl- und grp-Datei (nach Änderungszeit)."""
+    newest = {}
+    for path, (_, mtime) in files.items():
+        kind = kinds.get(path)
+        if kind and (kind not in newest or mtime > files[newest[kind]][1]):
+            newest[kind] = path
+    return newest.get('recl'), newest.get('grp')
+
+def _prune(root: str, keep: int = KEEP_SETS):
+    """Nur die `keep` neuesten fertigen Sätze behalten."""
+    sets = [os.path.join(root, name) for name in os.listdir(root)
+            if not name.startswith('.') and os.path.exists(os.path.join(root, name, MANIFEST_FILE))]
+    sets.sort(key=lambda path: os.path.getmtime(os.path.join(path, MANIFEST_FILE)), reverse=True)
+    for path in sets[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+        print(f"Alter Ergebnis-Satz gelöscht: {path}")
+
+def precompute(recl: str, grp: str, months: list[str], usernames: list[str], root: str = PRECOMPUTED_DIR) -> str:
+    """
+    Ergebnisdateien für alle User und jeden Benutzer erstellen. Die Rohdaten
+    werden einmal eingelesen; gibt den Schlüssel des Satzes zurück.
+    """
+    from Reads_excel_columns import build_report, load_inputs
+
+    key = inputs_key([recl], [grp])
+    target = os.path.join(root, key)
+    if os.path.exists(os.path.join(target, MANIFEST_FILE)):
+        print(f"Ergebnisse für {os.path.basename(recl)} / {os.path.basename(grp)} liegen bereits vor: {target}")
+        return key
+
+    print(f"\n=== Vorberechnung für {os.path.basename(recl)} / {os.path.basename(grp)} ===")
+    started = time.monotonic()
+    os.makedirs(root, exist_ok=True)
+    partial = tempfile.mkdtemp(prefix=f'.{key[:12]}_', dir=root)
+    try:
+        df_raw, df_grp = load_inputs(recl, grp, debug_dumps=False)
+        reports = 0
+        for month in months:
+            for username in [None] + list(usernames):
+                path = report_path(os.path.basename(partial), month, username, root)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                try:
+                    build_report(df_raw, df_grp, month, username, output=path, debug_dumps=False)
+                    reports += 1
+                except Exception as e:
+                    # Ein fehlender Bericht wird beim Upload normal berechnet
+                    print(f"Vorberechnung fehlgeschlagen für {username or 'Alle_User'} / {month}: {e}")
+                    if os.path.exists(path):
+                        os.remove(path)
+
+        with open(os.path.join(partial, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                'recl': os.path.abspath(recl),
+                'grp': os.path.abspath(grp),
+                'months': months,
+                'usernames': list(usernames),
+                'reports': reports,
+                'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(partial, target)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+
+    print(f"{reports} Ergebnisdateien in {time.monotonic() - started:.0f}s erstellt: {target}")
+    _prune(root)
+    return key
+
+class DropFolderWatcher:
+    """Überwacht einen Ablage-Ordner und berechnet für neue Export-Paare die Ergebnisse vor."""
+
+    def __init__(self, directory: str, usernames: list[str], months: list[str] | None = None,
+                 root: str = PRECOMPUTED_DIR, interval: float = POLL_INTERVAL):
+        self.directory = directory
+        self.usernames = usernames
+        self.months = months
+        self.root = root
+        self.interval = interval
+        self._previous = {}
+        # Art je (Pfad, Größe, Änderungszeit); andere Dateien werden nur einmal geprüft
+        self._kinds = {}
+        self._done = None
+
+    def poll(self) -> str | None:
+        """Einmal prüfen; gibt den Schlüssel zurück, wenn ein neuer Satz berechnet wurde."""
+        files = snapshot(self.directory)
+        # Nur fertig geschriebene Dateien: seit der letzten Prüfung oder seit einem Intervall unverändert
+        now = time.time()
+        stable = {path: state for path, state in files.items()
+                  if self._previous.get(path) == state or now - state[1] > self.interval}
+        self._previous = files
+
+        kinds = {}
+        for path, state in stable.items():
+            if (path, state) not in self._kinds:
+                try:
+                    self._kinds[(path, state)] = classify(path)
+                except Exception as e:
+                    print(f"Datei {path} nicht lesbar: {e}")
+                    self._kinds[(path, state)] = None
+            kinds[path] = self._kinds[(path, state)]
+        self._kinds = {(path, state): self._kinds[(path, state)] for path, state in stable.items()}
+
+        recl, grp = latest_pair(stable, kinds)
+        if not recl or not grp:
+            return None
+        months = self.months or [current_month()]
+        pair = (recl, stable[recl], grp, stable[grp], tuple(months))
+        if pair == self._done:
+            return None
+        key = precompute(recl, grp, months, self.usernames, self.root)
+        self._done = pair
+        return key
+
+    def watch(self):
+        print(f"Überwache {self.directory} alle {self.interval:.0f}s, Ergebnisse in {self.root}")
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Fehler bei der Vorberechnung: {e}")
+                import traceback
+                traceback.print_exc()
+            time.sleep(self.interval)
+
+def main(argv=None):
+    from user_directory import USERNAMES
+
+    parser = argparse.ArgumentParser(description='Ablage-Ordner überwachen und Ergebnisdateien vorberechnen')
+    parser.add_argument('directory', nargs='?', default=DROP_FOLDER, help='Ablage-Ordner (Standard: DROP_FOLDER)')
+    parser.add_argument('--results', default=PRECOMPUTED_DIR, help=f'Ziel der Ergebnisse (Standard {PRECOMPUTED_DIR})')
+    parser.add_argument('--month', action='append', help='Monat statt des aktuellen (mehrfach möglich)')
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help='Sekunden zwischen zwei Prüfungen')
+    parser.add_argument('--once', action='store_true', help='Nur einmal prüfen (Dateien müssen seit --interval Sekunden unverändert sein)')
+    args = parser.parse_args(argv)
+
+    if not args.directory or not os.path.isdir(args.directory):
+        print(f"Fehler: Ablage-Ordner {args.directory} nicht gefunden!")
+        return 1
+
+    watcher = DropFolderWatcher(args.directory, USERNAMES, args.month, args.results, args.interval)
+    if args.once:
+        watcher.poll()
+        return 0
+    watcher.watch()
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,248 @@
+"""
+Zeitlimits und Abbruch für Analyse-Aufträge.
+
+Jeder Auftrag bekommt eine Frist (ANALYSIS_JOB_TIMEOUT Sekunden) und kann über
+seine Auftrags-ID abgebrochen werden (/jobs/<id>/cancel). Die Analyse prüft
+zwischen den Schritten mit `check_job`, ob sie weiterlaufen darf, und bricht
+sonst mit JobStopped ab.
+
+Läuft die Analyse als eigener Prozess (run_process), startet sie in einer
+eigenen Prozessgruppe. Bei einem Abbruch oder wenn der Prozess die Frist plus
+KILL_GRACE Sekunden überschreitet (z.B. weil ein einzelner Schritt hängt),
+wird die ganze Gruppe beendet, einschließlich der Prozess-Pools für das
+Einlesen und Schreiben. Speicher und temporäre Dateien werden damit sofort frei.
+
+Die Zähler gelten pro Prozess; bei mehreren gunicorn-Workern pro Worker.
+"""
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Frist je Analyse in Sekunden (0 = keine Frist)
+JOB_TIMEOUT = float(os.environ.get('ANALYSIS_JOB_TIMEOUT', 900))
+# So lange darf ein Analyse-Prozess nach der Frist noch selbst aufräumen, bevor er beendet wird
+KILL_GRACE = float(os.environ.get('ANALYSIS_KILL_GRACE', 10))
+# Wartezeit zwischen SIGTERM und SIGKILL
+TERMINATE_WAIT = 5.0
+# Wie oft der Elternprozess Abbruch und Frist prüft
+POLL_INTERVAL = 0.5
+
+# Rückgabewert des Analyse-Prozesses, wenn er wegen Abbruch oder Frist selbst aufhört (wie timeout(1))
+STOPPED_EXIT_CODE = 124
+
+_JOB_ID = re.compile(r'^[0-9a-f]{8,64}$')
+
+class JobStopped(Exception):
+    """Auftrag wurde abgebrochen (`reason` = 'cancelled') oder hat seine Frist überschritten ('timeout')."""
+
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.reason = reason
+
+class Job:
+    """Frist und Abbruch-Signal eines Auftrags."""
+
+    def __init__(self, job_id: str, timeout: float | None = JOB_TIMEOUT):
+        self.job_id = job_id
+        self.timeout = timeout or None
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason = None
+        # Überschrittene Fristen (ein ZIP-Export startet die Frist je Bericht neu)
+        self.timeouts = 0
+        self._cancelled = threading.Event()
+
+    def start(self):
+        """
+        Frist ab jetzt, z.B. sobald ein Analyseplatz frei ist (die Wartezeit zählt
+        nicht mit) oder für den nächsten Bericht eines ZIP-Exports.
+        """
+        if self.timeout:
+            self.deadline = time.monotonic() + self.timeout
+        if self.reason == 'timeout':
+            self.reason = None
+
+    def expire(self):
+        """Frist als überschritten vermerken (z.B. vom Analyse-Prozess selbst festgestellt)."""
+        if self.reason is None:
+            self.reason = 'timeout'
+            self.timeouts += 1
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def cancelled(self) -> bool:
+        """Abbruch angefordert (ohne die Frist zu prüfen, z.B. während der Wartezeit auf einen Analyseplatz)."""
+        return self._cancelled.is_set()
+
+    def remaining(self) -> float | None:
+        """Sekunden bis zur Frist (None = keine Frist)."""
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def stopped(self, grace: float = 0.0) -> str | None:
+        """'cancelled', 'timeout' (Frist plus `grace` abgelaufen) oder None."""
+        if self.reason is None:
+            if self._cancelled.is_set():
+                self.reason = 'cancelled'
+            elif self.deadline is not None and time.monotonic() > self.deadline + grace:
+                self.expire()
+        return self.reason
+
+    def check(self, step: str = ''):
+        """Wirft JobStopped, wenn der Auftrag nicht weiterlaufen soll."""
+        reason = self.stopped()
+        if reason is None:
+            return
+        where = f" vor {step}" if step else ""
+        if reason == 'cancelled':
+            raise JobStopped(f"Auftrag {self.job_id} abgebrochen{where}", reason)
+        raise JobStopped(f"Auftrag {self.job_id}: Frist von {self.timeout:.0f}s überschritten{where}", reason)
+
+def check_job(job: Job | None, step: str = ''):
+    """Abbruch-Prüfung zwischen zwei Schritten; ohne Auftrag (job=None) ohne Wirkung."""
+    if job is not None:
+        job.check(step)
+
+def valid_job_id(job_id: str | None) -> str:
+    """Vom Browser mitgeschickte Auftrags-ID übernehmen, sonst eine neue erzeugen."""
+    return job_id if job_id and _JOB_ID.match(job_id) else uuid.uuid4().hex
+
+def _signal_group(process, sig):
+    """Signal an die Prozessgruppe des Analyse-Prozesses (unter Windows nur an den Prozess)."""
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, sig)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def _group_alive(process) -> bool:
+    """
+    Gibt es noch Prozesse in der Gruppe des Analyse-Prozesses? Solange ein
+    Mitglied lebt, vergibt das System die Gruppen-ID nicht neu; ein SIGKILL
+    danach trifft also nur die eigenen Pool-Prozesse.
+    """
+    if not hasattr(os, 'killpg'):
+        return process.poll() is None
+    try:
+        os.killpg(process.pid, 0)
+    except (ProcessLookupError, PermissionError):
+        return False
+    return True
+
+def _kill_group(process):
+    """SIGKILL an die Gruppe, aber nur, wenn sie noch Mitglieder hat (sonst könnte die ID schon vergeben sein)."""
+    if _group_alive(process):
+        _signal_group(process, getattr(signal, 'SIGKILL', signal.SIGTERM))
+
+def terminate_group(process):
+    """Prozessgruppe beenden: erst SIGTERM, nach TERMINATE_WAIT Sekunden SIGKILL."""
+    _signal_group(process, signal.SIGTERM)
+    try:
+        process.wait(TERMINATE_WAIT)
+    except subprocess.TimeoutExpired:
+        pass
+    # Auch Pool-Prozesse, die SIGTERM überlebt haben oder den Hauptprozess überleben würden
+    _kill_group(process)
+
+def run_process(cmd: list[str], cwd: str, job: Job | None = None, registry=None) -> subprocess.CompletedProcess:
+    """
+    Wie subprocess.run(cmd, cwd=cwd, capture_output=True, text=True), aber in einer
+    eigenen Prozessgruppe, die bei Abbruch oder überschrittener Frist beendet wird.
+    Der Grund steht danach in job.reason.
+    """
+    process = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, start_new_session=True)
+    try:
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                # Bei Abbruch sofort beenden; bei der Frist erst, wenn der Prozess nicht selbst aufhört
+                if job is not None and job.stopped(grace=KILL_GRACE):
+                    terminate_group(process)
+                    if registry is not None:
+                        registry.count_kill()
+                    stdout, stderr = process.communicate()
+                    break
+    finally:
+        if process.poll() is None:
+            # z.B. Ausnahme im Elternprozess: kein Analyse-Prozess darf übrig bleiben
+            terminate_group(process)
+            process.communicate()
+        else:
+            # Übrig gebliebene Pool-Prozesse der Gruppe aufräumen; nach einem sauberen
+            # Ende ist die Gruppe meist leer, dann wird kein Signal verschickt
+            _kill_group(process)
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+class JobRegistry:
+    """Laufende Aufträge nach ID, für den Abbruch über die Web-Oberfläche und /metrics."""
+
+    def __init__(self, timeout: float | None = JOB_TIMEOUT):
+        self.timeout = timeout
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+        self.started_total = 0
+        self.cancelled_total = 0
+        self.timed_out_total = 0
+        self.killed_total = 0
+
+    @classmethod
+    def from_env(cls):
+        """Frist aus ANALYSIS_JOB_TIMEOUT."""
+        return cls(timeout=JOB_TIMEOUT)
+
+    @contextmanager
+    def run(self, job_id: str | None = None, timeout: float | None = None):
+        """
+        Kontextmanager: Auftrag anmelden, ausführen, abmelden und nach Ausgang zählen.
+        Ist die ID schon vergeben, bekommt der Auftrag eine neue.
+        """
+        job_id = valid_job_id(job_id)
+        with self._lock:
+            if job_id in self._jobs:
+                job_id = uuid.uuid4().hex
+            job = Job(job_id, self.timeout if timeout is None else timeout)
+            self._jobs[job_id] = job
+            self.started_total += 1
+        try:
+            yield job
+        finally:
+            with self._lock:
+                del self._jobs[job_id]
+                # Nur Aufträge, die tatsächlich wegen Abbruch oder Frist geendet haben
+                if job.reason == 'cancelled':
+                    self.cancelled_total += 1
+                self.timed_out_total += job.timeouts
+
+    def cancel(self, job_id: str) -> bool:
+        """Auftrag abbrechen; False, wenn er nicht (mehr) läuft."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        job.cancel()
+        return True
+
+    def count_kill(self):
+        with self._lock:
+            self.killed_total += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'job_timeout_seconds': self.timeout,
+                'jobs_running': len(self._jobs),
+                'jobs_started_total': self.started_total,
+                'jobs_cancelled_total': self.cancelled_total,
+                'jobs_timed_out_total': self.timed_out_total,
+                'jobs_killed_total': self.killed_total,
+            }
@@ -0,0 +1,462 @@
+"""
+Lasttest für den Upload-Endpunkt der App (lokal).
+
+Erzeugt synthetische recl/grp-Dateien (oder nimmt vorhandene), startet die App
+mit gunicorn auf einem freien Port (oder nutzt eine laufende Instanz über --url)
+und schickt die Uploads mit der gewünschten Parallelität an `/`. Gemessen werden:
+
+  - Latenz je Anfrage bis zum letzten Byte der Antwort (p50/p95/p99, Max)
+  - Durchsatz (erfolgreiche Antworten pro Sekunde)
+  - Fehlerquote (alles außer --expect-status), 429 zusätzlich getrennt gezählt
+  - Spitzen-Speicher des Hosts (/proc/meminfo, über dem Stand vor dem Test)
+    und des gestarteten Server-Prozessbaums inkl. Analyse-Unterprozessen
+
+Die Ergebnisse werden als JSON gespeichert (Standard load_test_results/) und
+können mit --compare einem früheren Lauf gegenübergestellt werden.
+
+Aufruf:
+    python load_test.py --concurrency 4 --requests 20
+    python load_test.py --rows 20000 --workers 2 --threads 4 --mode memory
+    python load_test.py --url http://127.0.0.1:8000/ --recl recl.xlsx --grp grp.xlsx
+    python load_test.py --path /preview --expect-status 302
+    python load_test.py --concurrency 8 --duration 60 --compare load_test_results/vorher.json
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BASE_DIR, 'load_test_results')
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Werte für die synthetischen Exporte (Spaltenpositionen wie in upload_validation.py)
+SYNTHETIC_USERS = ['Schweizz', 'leo2810', 'RRGLEM', 'arval1', 'bankno', 'alpher', 'SixtRAC']
+SYNTHETIC_THEMEN = ['Motor', 'Karosserie', 'Reifen', 'Innenraum', 'Elektrik', 'Sonstiges']
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Lasttest für den Upload-Endpunkt der App')
+    parser.add_argument('--url', help='Laufende Instanz, z.B. http://127.0.0.1:8000/ (ohne: gunicorn wird gestartet)')
+    parser.add_argument('--path', default='/', help='Endpunkt für die Uploads (Standard /)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Gleichzeitige Clients (Standard 4)')
+    parser.add_argument('--requests', type=int, default=20, help='Anzahl Anfragen insgesamt (Standard 20)')
+    parser.add_argument('--duration', type=float, help='Stattdessen so viele Sekunden lang Anfragen schicken')
+    parser.add_argument('--timeout', type=float, default=600, help='Timeout je Anfrage in Sekunden')
+    parser.add_argument('--month', default='March', help='Monat im Formular (leer = alle Monate)')
+    parser.add_argument('--username', action='append', default=None,
+                        help='Benutzer im Formular, mehrfach angebbar; die Clients wechseln reihum')
+    parser.add_argument('--expect-status', type=int, default=200, help='Erwarteter HTTP-Status (Standard 200)')
+    parser.add_argument('--recl', help='Vorhandene recl.xlsx statt synthetischer Daten')
+    parser.add_argument('--grp', help='Vorhandene grp.xlsx statt synthetischer Daten')
+    parser.add_argument('--rows', type=int, default=2000, help='Zeilen der synthetischen recl-Datei (grp doppelt so viele)')
+    parser.add_argument('--seed', type=int, default=1, help='Zufallsstartwert für synthetische Daten')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn-Worker des gestarteten Servers')
+    parser.add_argument('--threads', type=int, default=4, help='Threads je gunicorn-Worker')
+    parser.add_argument('--mode', choices=['subprocess', 'memory'], help='ANALYSIS_MODE des gestarteten Servers')
+    parser.add_argument('--label', default='', help='Bezeichnung des Laufs (z.B. "vor Caching")')
+    parser.add_argument('--output', help='Ergebnisdatei (Standard load_test_results/load_test_<Zeit>.json)')
+    parser.add_argument('--compare', help='Früheres Ergebnis (JSON) zum Vergleich')
+    return parser.parse_args(argv)
+
+def make_synthetic_uploads(directory: str, rows: int, month: str | None, seed: int = 1):
+    """Schreibt recl.xlsx und grp.xlsx im Layout der Exporte; gibt die Pfade zurück."""
+    import openpyxl
+
+    rng = random.Random(seed)
+    month_number = datetime.datetime.strptime(month, '%B').month if month else None
+
+    def random_date():
+        # Drei Viertel der Zeilen im gewählten Monat, der Rest verteilt
+        m = month_number if month_number and rng.random() < 0.75 else rng.randint(1, 12)
+        return datetime.datetime(2025, m, rng.randint(1, 28), rng.randint(7, 18), rng.randint(0, 59))
+
+    recl_path = os.path.join(directory, 'recl.xlsx')
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Export')
+    ws.append(['Beanstandungen Export'])
+    ws.append([f'Synthetisch, {rows} Zeilen'])
+    ws.append([])
+    header = [f'Spalte {i}' for i in range(42)]
+    header[4], header[7], header[9], header[13] = 'Erfasst', 'Benutzer', 'Status', 'Hauptthema'
+    header[16], header[18], header[19] = 'Begründung', 'Rolle', 'Entscheid'
+    ws.append(header)
+    for i in range(rows):
+        row = [f'r{i}_{c}' for c in range(42)]
+        date = random_date()
+        row[4] = row[10] = date.strftime('%d.%m.%Y %H:%M:%S')
+        row[7] = rng.choice(SYNTHETIC_USERS)
+        row[9] = rng.choice(['erledigt', 'offen'])
+        row[13] = rng.choice(SYNTHETIC_THEMEN)
+        row[16] = rng.choice(['Teil fehlt', 'Warten auf Kunde', 'Rückfrage', None])
+        row[18] = rng.choice(['Einsteller', 'Einsteller', 'Käufer'])
+        row[19] = rng.choice(['ok', 'ok', 'Wurde abgelehnt'])
+        ws.append(row)
+    wb.save(recl_path)
+
+    grp_path = os.path.join(directory, 'grp.xlsx')
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Export')
+    header = [f'Spalte {i}' for i in range(32)]
+    header[2], header[3], header[8] = 'Status', 'Benutzer', 'Datum'
+    ws.append(header)
+    for i in range(rows * 2):
+        row = [f'g{i}_{c}' for c in range(32)]
+        row[2] = rng.choice(['Verkauft', 'Verkauft', 'Storniert'])
+        row[3] = rng.choice(SYNTHETIC_USERS)
+        row[8] = random_date()
+        ws.append(row)
+    wb.save(grp_path)
+    return recl_path, grp_path
+
+def multipart_body(fields: dict, files: dict):
+    """Formular als multipart/form-data; gibt (Body, Content-Type) zurück."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: {XLSX_MIMETYPE}\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Weiterleitungen nicht folgen: ein 302 auf / bedeutet eine abgelehnte Analyse."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+def send(url: str, body: bytes, content_type: str, timeout: float) -> dict:
+    """Eine Anfrage; Latenz bis zum letzten Byte der Antwort."""
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': content_type})
+    start = time.perf_counter()
+    try:
+        with _opener.open(request, timeout=timeout) as response:
+            size = len(response.read())
+            status = response.status
+    except urllib.error.HTTPError as e:
+        size = len(e.read())
+        status = e.code
+    except (urllib.error.URLError, OSError) as e:
+        return {'status': None, 'latency': time.perf_counter() - start, 'bytes': 0, 'error': str(e)}
+    return {'status': status, 'latency': time.perf_counter() - start, 'bytes': size, 'error': None}
+
+def _host_used_kb() -> int | None:
+    """Belegter Hauptspeicher des Hosts (MemTotal - MemAvailable) in kB."""
+    try:
+        with open('/proc/meminfo') as f:
+            info = {line.split(':')[0]: int(line.split()[1]) for line in f}
+        return info['MemTotal'] - info['MemAvailable']
+    except (OSError, KeyError, ValueError, IndexError):
+        return None
+
+def _process_tree_rss_kb(root_pid: int) -> int | None:
+    """Summe von VmRSS über einen Prozess und alle Nachfahren (Linux /proc)."""
+    parents = {}
+    try:
+        pids = [int(name) for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return None
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                # Feld 4 ist die Eltern-PID; der Prozessname in Klammern kann Leerzeichen enthalten
+                parents[pid] = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+
+    tree, frontier = {root_pid}, [root_pid]
+    while frontier:
+        parent = frontier.pop()
+        children = [pid for pid, ppid in parents.items() if ppid == parent and pid not in tree]
+        tree.update(children)
+        frontier.extend(children)
+
+    total = 0
+    for pid in tree:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return total
+
+class MemorySampler(threading.Thread):
+    """Misst im Hintergrund den Spitzenwert des Host-Speichers und des Server-Prozessbaums."""
+
+    def __init__(self, server_pid: int | None = None, interval: float = 0.2):
+        super().__init__(daemon=True)
+        self.server_pid = server_pid
+        self.interval = interval
+        self.baseline_host_kb = _host_used_kb()
+        self.peak_host_kb = self.baseline_host_kb
+        self.peak_server_kb = None
+        self._done = threading.Event()
+
+    def sample(self):
+        host = _host_used_kb()
+        if host is not None:
+            self.peak_host_kb = max(self.peak_host_kb or 0, host)
+        if self.server_pid:
+            server = _process_tree_rss_kb(self.server_pid)
+            if server is not None:
+                self.peak_server_kb = max(self.peak_server_kb or 0, server)
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.sample()
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(workers: int, threads: int, mode: str | None, timeout: float):
+    """Startet die App mit gunicorn auf einem freien Port; gibt (Prozess, URL) zurück."""
+    port = _free_port()
+    env = dict(os.environ)
+    if mode:
+        env['ANALYSIS_MODE'] = mode
+    cmd = [sys.executable, '-m', 'gunicorn', '--chdir', BASE_DIR, '--bind', f'127.0.0.1:{port}',
+           '--workers', str(workers), '--threads', str(threads), '--timeout', str(int(timeout)),
+           '--log-level', 'warning', 'app:app']
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    url = f'http://127.0.0.1:{port}/'
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn beendet mit Code {proc.returncode}: {proc.stderr.read()}")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return proc, url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    stop_server(proc)
+    raise RuntimeError(f"Server unter {url} nicht erreichbar")
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+def percentile(values, p: float):
+    """Perzentil nach der Nearest-Rank-Methode; None ohne Werte."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+def run_load(url: str, bodies, concurrency: int, total: int | None, duration: float | None,
+             timeout: float) -> tuple[list, float]:
+    """Schickt die Anfragen mit `concurrency` Clients; gibt (Ergebnisse, Laufzeit) zurück."""
+    results = []
+    lock = threading.Lock()
+    counter = iter(range(10 ** 9))
+    start = time.perf_counter()
+
+    def client():
+        while True:
+            with lock:
+                n = next(counter)
+            if total is not None and n >= total:
+                return
+            if duration is not None and time.perf_counter() - start >= duration:
+                return
+            body, content_type = bodies[n % len(bodies)]
+            result = send(url, body, content_type, timeout)
+            with lock:
+                results.append(result)
+                done = len(results)
+            if done % max(1, concurrency) == 0:
+                print(f"  {done} Anfragen fertig", flush=True)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(client) for _ in range(concurrency)]:
+            future.result()
+    return results, time.perf_counter() - start
+
+def summarize(results, elapsed: float, expect_status: int) -> dict:
+    latencies = [r['latency'] for r in results]
+    ok = [r for r in results if r['status'] == expect_status]
+    ok_latencies = [r['latency'] for r in ok]
+    errors = len(results) - len(ok)
+
+    def rounded(value):
+        return round(value, 3) if value is not None else None
+
+    statuses = {}
+    for r in results:
+        key = str(r['status']) if r['status'] is not None else 'Verbindungsfehler'
+        statuses[key] = statuses.get(key, 0) + 1
+    return {
+        'requests': len(results),
+        'ok': len(ok),
+        'errors': errors,
+        'rejected_429': sum(1 for r in results if r['status'] == 429),
+        'error_rate': round(errors / len(results), 4) if results else None,
+        'status_counts': statuses,
+        'duration_seconds': round(elapsed, 3),
+        'throughput_rps': round(len(ok) / elapsed, 3) if elapsed > 0 else None,
+        # Latenzen der erfolgreichen Antworten; abgelehnte Anfragen sind meist sehr schnell
+        'latency_p50': rounded(percentile(ok_latencies, 50)),
+        'latency_p95': rounded(percentile(ok_latencies, 95)),
+        'latency_p99': rounded(percentile(ok_latencies, 99)),
+        'latency_max': rounded(max(ok_latencies) if ok_latencies else None),
+        'latency_mean': rounded(statistics.fmean(ok_latencies) if ok_latencies else None),
+        'latency_all_p95': rounded(percentile(latencies, 95)),
+    }
+
+def _git_revision() -> str | None:
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                capture_output=True, text=True, timeout=10)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+METRIC_LABELS = [
+    ('requests', 'Anfragen', ''),
+    ('error_rate', 'Fehlerquote', ''),
+    ('rejected_429', 'Abgelehnt (429)', ''),
+    ('throughput_rps', 'Durchsatz', '/s'),
+    ('latency_p50', 'Latenz p50', 's'),
+    ('latency_p95', 'Latenz p95', 's'),
+    ('latency_p99', 'Latenz p99', 's'),
+    ('latency_max', 'Latenz max', 's'),
+    ('peak_host_memory_mb', 'Host-Speicher Spitze', ' MB'),
+    ('peak_server_rss_mb', 'Server-RSS Spitze', ' MB'),
+]
+
+def print_report(result: dict, previous: dict | None = None):
+    metrics = result['metrics']
+    print(f"\n{'Messung':<22} {'Wert':>12}" + (f" {'Vorher':>12} {'Änderung':>10}" if previous else ''))
+    for key, label, unit in METRIC_LABELS:
+        value = metrics.get(key)
+        line = f"{label:<22} {('-' if value is None else f'{value}{unit}'):>12}"
+        if previous:
+            before = previous['metrics'].get(key)
+            line += f" {('-' if before is None else f'{before}{unit}'):>12}"
+            if isinstance(value, (int, float)) and isinstance(before, (int, float)) and before:
+                line += f" {(value - before) / before * 100:>+9.1f}%"
+        print(line)
+    print(f"Status: {metrics['status_counts']}")
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.concurrency < 1 or (args.duration is None and args.requests < 1):
+        print("Fehler: --concurrency und --requests müssen mindestens 1 sein!")
+        return 1
+    if bool(args.recl) != bool(args.grp):
+        print("Fehler: --recl und --grp nur zusammen angeben!")
+        return 1
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+
+    with tempfile.TemporaryDirectory(prefix='load_test_') as work_dir:
+        if args.recl:
+            recl_path, grp_path = args.recl, args.grp
+        else:
+            print(f"Synthetische Uploads erzeugen ({args.rows} recl-Zeilen) ...", flush=True)
+            recl_path, grp_path = make_synthetic_uploads(work_dir, args.rows, args.month or None, args.seed)
+        with open(recl_path, 'rb') as f:
+            recl = f.read()
+        with open(grp_path, 'rb') as f:
+            grp = f.read()
+
+        # Ein Formular je Benutzer; die Clients wechseln reihum (Schlüssel der fairen Warteschlange)
+        files = {'recl': ('recl.xlsx', recl), 'grp': ('grp.xlsx', grp)}
+        bodies = [multipart_body({'month': args.month, 'username': username}, files)
+                  for username in (args.username or [''])]
+
+        server = None
+        base_url = args.url
+        if not base_url:
+            print(f"gunicorn starten ({args.workers} Worker x {args.threads} Threads) ...", flush=True)
+            server, base_url = start_server(args.workers, args.threads, args.mode, args.timeout)
+        url = base_url.rstrip('/') + '/' + args.path.lstrip('/')
+
+        sampler = MemorySampler(server.pid if server else None)
+        sampler.start()
+        try:
+            print(f"Lasttest: {url}, {args.concurrency} Clients, "
+                  f"{f'{args.duration}s' if args.duration else f'{args.requests} Anfragen'}", flush=True)
+            results, elapsed = run_load(url, bodies, args.concurrency,
+                                        None if args.duration else args.requests, args.duration, args.timeout)
+        finally:
+            sampler.stop()
+            if server:
+                stop_server(server)
+
+    metrics = summarize(results, elapsed, args.expect_status)
+    if sampler.peak_host_kb is not None and sampler.baseline_host_kb is not None:
+        metrics['peak_host_memory_mb'] = round((sampler.peak_host_kb - sampler.baseline_host_kb) / 1024, 1)
+    else:
+        metrics['peak_host_memory_mb'] = None
+    metrics['peak_server_rss_mb'] = round(sampler.peak_server_kb / 1024, 1) if sampler.peak_server_kb else None
+
+    result = {
+        'label': args.label,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_revision': _git_revision(),
+        'config': {
+            'url': url if args.url else f'gunicorn{args.path}',
+            'concurrency': args.concurrency,
+            'requests': None if args.duration else args.requests,
+            'duration': args.duration,
+            'month': args.month,
+            'usernames': args.username or [''],
+            'expect_status': args.expect_status,
+            'uploads': 'vorhanden' if args.recl else f'synthetisch, {args.rows} Zeilen, seed {args.seed}',
+            'upload_bytes': len(recl) + len(grp),
+            'server': None if args.url else {
+                'workers': args.workers, 'threads': args.threads,
+                'analysis_mode': args.mode or os.environ.get('ANALYSIS_MODE', 'subprocess'),
+            },
+        },
+        'metrics': metrics,
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load_test_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+    print_report(result, previous)
+    print(f"\nErgebnis gespeichert: {output}")
+    return 0 if metrics['ok'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Mehrere recl- und grp-Exporte zu einem Rohdatensatz zusammenführen.
+
+Überlappende Exporte (je Filiale oder erneute Exporte derselben Wochen) werden
+gemeinsam in einem Prozess-Pool eingelesen. Die Datenzeilen aller Dateien
+werden über einen Inhalts-Hash je Zeile dedupliziert und nach Datum sortiert;
+Vorspann und Header kommen aus der ersten Datei. Das Ergebnis hat dasselbe
+Format wie pd.read_excel(..., header=None) für eine einzelne Datei, danach
+laufen die normalen Filter.
+
+Alle Dateien einer Art müssen dieselben Spalten haben (gleiche Header-Zeile).
+"""
+import io
+import os
+
+# recl: Zeilen 0-2 Vorspann, Zeile 3 Header; Datum in Spalte 4 (Spalte 0 nach dem Entfernen)
+RECL_HEADER_ROW = 3
+RECL_DATE_COLUMN = 4
+# grp: Zeile 0 Header; Datum in Spalte 8 (Spalte 4 nach dem Entfernen)
+GRP_HEADER_ROW = 0
+GRP_DATE_COLUMN = 8
+
+def _read_excel(source):
+    """Eine xlsx-Datei einlesen (läuft im Pool-Prozess); Puffer kommen als bytes."""
+    import pandas as pd
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return pd.read_excel(source, header=None, engine='openpyxl')
+
+def _picklable(source):
+    """Pfade bleiben Pfade, Puffer werden für die Übergabe an den Pool zu bytes."""
+    if hasattr(source, 'read'):
+        source.seek(0)
+        data = source.read()
+        source.seek(0)
+        return data
+    return source
+
+def read_files(recl_sources, grp_sources, workers: int | None = None):
+    """
+    Liest alle Dateien gleichzeitig ein; gibt (recl-Frames, grp-Frames) zurück.
+    recl-PDFs werden im Hauptprozess gelesen, sie verteilen ihre Seiten selbst
+    auf einen Prozess-Pool (siehe pdf_ingest.py).
+    """
+    from pdf_ingest import is_pdf, load_recl_pdf
+
+    sources = list(recl_sources) + list(grp_sources)
+    frames = [None] * len(sources)
+    pending = []
+    for number, source in enumerate(sources):
+        if number < len(recl_sources) and is_pdf(source):
+            frames[number] = load_recl_pdf(source)
+        else:
+            pending.append(number)
+
+    workers = min(len(pending), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        for number in pending:
+            frames[number] = _read_excel(sources[number])
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for number, frame in zip(pending, pool.map(_read_excel, [_picklable(sources[n]) for n in pending])):
+                frames[number] = frame
+    return frames[:len(recl_sources)], frames[len(recl_sources):]
+
+def _header_key(row) -> tuple:
+    """Header-Zeile zum Vergleichen: Text ohne doppelte Leerzeichen, leere Zellen am Ende ignoriert."""
+    import pandas as pd
+    values = ['' if pd.isna(value) else ' '.join(str(value).split()) for value in row]
+    while values and not values[-1]:
+        values.pop()
+    return tuple(values)
+
+def _parse_dates(values):
+    """
+    Datumswerte einer Datei: Format aus dem ersten Text-Wert wie bei den
+    Monatsfiltern (Datei für Datei, Exporte können sich unterscheiden). Die
+    Exporte schreiben Tag vor Monat: ein mehrdeutiger erster Wert wie 02.01.2025
+    ist der 2. Januar, sonst würde jede Datei je nach erstem Wert anders gelesen.
+    """
+    import pandas as pd
+    from pandas.tseries.api import guess_datetime_format
+
+    first = next((value for value in values if isinstance(value, str)), None)
+    date_format = guess_datetime_format(first, dayfirst=True) if first else None
+    return pd.to_datetime(values, format=date_format, errors='coerce')
+
+def merge_frames(frames, header_row: int, date_column: int, label: str = 'recl'):
+    """
+    Datenzeilen mehrerer Rohdaten-Frames zusammenführen: gleiche Zeilen (Inhalts-Hash)
+    nur einmal, nach Datum sortiert; Vorspann und Header aus dem ersten Frame.
+    """
+    import pandas as pd
+
+    width = max(len(frame.columns) for frame in frames)
+    frames = [frame.reindex(columns=range(width)) for frame in frames]
+    head = frames[0].iloc[:header_row + 1]
+    if len(head) <= header_row:
+        raise ValueError(f"{label}: Datei 1 hat keine Header-Zeile {header_row + 1}")
+    key = _header_key(head.iloc[header_row])
+    for number, frame in enumerate(frames[1:], start=2):
+        if len(frame) <= header_row or _header_key(frame.iloc[header_row]) != key:
+            raise ValueError(f"{label}: Spalten der Datei {number} passen nicht zu Datei 1 (Header-Zeile {header_row + 1})")
+
+    parts = [frame.iloc[header_row + 1:] for frame in frames]
+    data = pd.concat(parts, ignore_index=True)
+    total = len(data)
+
+    # Inhalts-Hash je Zeile (unabhängig von Datei und Position); die erste Fundstelle bleibt
+    hashes = pd.util.hash_pandas_object(data.astype(str), index=False)
+    data = data[~hashes.duplicated()]
+
+    # Nach Datum sortieren; nicht erkannte Daten ans Ende, sonst bleibt die Reihenfolge der Dateien.
+    # Erkannte Daten werden als Zeitstempel übernommen: nach dem Sortieren stünde sonst ein
+    # beliebiger Wert (z.B. 01.02.2025) vorne, aus dem die Monatsfilter das Format erraten.
+    if width > date_column:
+        dates = pd.concat([_parse_dates(part.iloc[:, date_column]) for part in parts], ignore_index=True)
+        dates = dates.loc[data.index]
+        data = data.copy()
+        data.iloc[:, date_column] = data.iloc[:, date_column].where(dates.isna(), dates.astype(object))
+        data = data.loc[dates.sort_values(kind='stable', na_position='last').index]
+
+    print(f"{label}: {len(frames)} Dateien, {total} Zeilen, {total - len(data)} Duplikate entfernt")
+    return pd.concat([head, data], ignore_index=True)
+
+def load_many(recl_sources, grp_sources, workers: int | None = None):
+    """Wie Reads_excel_columns.load_inputs für Listen von Dateien; gibt (df_raw, df_grp) zurück."""
+    recl_frames, grp_frames = read_files(recl_sources, grp_sources, workers)
+    df_raw = merge_frames(recl_frames, RECL_HEADER_ROW, RECL_DATE_COLUMN, 'recl')
+    df_grp = merge_frames(grp_frames, GRP_HEADER_ROW, GRP_DATE_COLUMN, 'grp')
+    return df_raw, df_grp
@@ -0,0 +1,194 @@
+"""
+recl-Beanstandungen aus PDF-Tabellen einlesen.
+
+Manche Partner schicken die Beanstandungsliste nur als PDF. Die Tabellen
+werden seitenweise in einem Prozess-Pool extrahiert (PyMuPDF, ersatzweise
+pdfplumber) und in dasselbe Rohformat gebracht wie pd.read_excel(recl,
+header=None): drei Vorspann-Zeilen, Header in Zeile 3, Spalten in der
+Reihenfolge des recl-Exports. Ab dort läuft die normale Auswertung.
+
+Die PDF-Tabelle muss die Spalten des recl-Exports in derselben Reihenfolge
+enthalten; auf Folgeseiten wiederholte Header-Zeilen werden entfernt.
+
+Das Ergebnis wird pro Datei-Hash in PDF_CACHE_DIR zwischengespeichert, ein
+erneuter Upload derselben Datei wird nicht noch einmal extrahiert.
+"""
+import hashlib
+import math
+import os
+import tempfile
+from contextlib import contextmanager
+
+PDF_MAGIC = b'%PDF'
+CACHE_DIR = os.environ.get('PDF_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'beanstandungen_pdf_cache'))
+# Bei Änderungen an der Normalisierung erhöhen, damit alte Cache-Einträge nicht mehr passen
+CACHE_VERSION = 1
+
+# Wie im Excel-Export: Zeilen 0-2 Vorspann, Zeile 3 Header
+RECL_PREAMBLE_ROWS = 3
+# Spalten bis einschließlich der zuletzt entfernten Spalte 40 (siehe RECL_COLS_TO_DROP)
+RECL_EXPORT_COLUMNS = 41
+
+# Leere Zelle wie bei pd.read_excel
+NAN = float('nan')
+
+# Kleinere PDFs werden ohne Prozess-Pool gelesen (Start der Prozesse lohnt nicht)
+MIN_PAGES_FOR_POOL = 8
+# Seiten je Auftrag an den Pool: mehrere Aufträge pro Prozess gleichen unterschiedlich volle Seiten aus
+TASKS_PER_WORKER = 4
+
+def is_pdf(source) -> bool:
+    """Erkennt PDFs am Dateianfang (auch bei .xlsx-Namen aus dem Upload)."""
+    if hasattr(source, 'read'):
+        position = source.tell()
+        head = source.read(len(PDF_MAGIC))
+        source.seek(position)
+    else:
+        try:
+            with open(source, 'rb') as f:
+                head = f.read(len(PDF_MAGIC))
+        except (OSError, TypeError):
+            return False
+    return head == PDF_MAGIC
+
+@contextmanager
+def _as_path(source):
+    """Pfad zur PDF-Datei; Puffer werden dafür in eine temporäre Datei geschrieben."""
+    if not hasattr(source, 'read'):
+        yield source
+        return
+    # Die Pool-Prozesse öffnen die Datei selbst
+    source.seek(0)
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+        f.write(source.read())
+    source.seek(0)
+    try:
+        yield f.name
+    finally:
+        os.unlink(f.name)
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _open_document(path: str):
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf
+    return pymupdf.open(path)
+
+def _page_count(path: str) -> int:
+    try:
+        with _open_document(path) as document:
+            return document.page_count
+    except ImportError:
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            return len(pdf.pages)
+
+def _extract_pages(path: str, start: int, stop: int) -> list:
+    """Tabellenzeilen der Seiten start..stop-1 (läuft im Pool-Prozess)."""
+    rows = []
+    try:
+        with _open_document(path) as document:
+            for number in range(start, stop):
+                for table in document[number].find_tables().tables:
+                    rows.extend(table.extract())
+    except ImportError:
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            for page in pdf.pages[start:stop]:
+                for table in page.extract_tables():
+                    rows.extend(table)
+    return rows
+
+def _cell(value):
+    """PDF-Zelltext wie pd.read_excel: leer -> NaN, ganze Zahlen als int, Zeilenumbrüche als Leerzeichen."""
+    if value is None:
+        return NAN
+    text = ' '.join(str(value).split())
+    if not text:
+        return NAN
+    if text.isdigit() and not (len(text) > 1 and text.startswith('0')):
+        return int(text)
+    return text
+
+def normalize_rows(rows):
+    """
+    Tabellenzeilen aller Seiten in das Rohformat des recl-Exports bringen:
+    drei leere Vorspann-Zeilen, Header-Zeile, Datenzeilen ohne wiederholte Header.
+    """
+    import pandas as pd
+
+    rows = [[_cell(value) for value in row] for row in rows]
+    rows = [row for row in rows if any(isinstance(value, (str, int)) for value in row)]
+    if not rows:
+        raise ValueError("PDF enthält keine Tabelle")
+
+    header = rows[0]
+    table = [header] + [row for row in rows[1:] if row != header]
+    width = max([RECL_EXPORT_COLUMNS] + [len(row) for row in table])
+
+    preamble = [[NAN] * width for _ in range(RECL_PREAMBLE_ROWS)]
+    table = [row + [NAN] * (width - len(row)) for row in table]
+    return pd.DataFrame(preamble + table, columns=range(width), dtype=object)
+
+def extract_tables(path: str, workers: int | None = None) -> list:
+    """Tabellenzeilen aller Seiten in Seitenreihenfolge; große PDFs seitenweise parallel."""
+    pages = _page_count(path)
+    workers = workers or os.cpu_count() or 1
+    if pages < MIN_PAGES_FOR_POOL or workers == 1:
+        return _extract_pages(path, 0, pages)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    step = max(1, math.ceil(pages / (workers * TASKS_PER_WORKER)))
+    ranges = [(start, min(start + step, pages)) for start in range(0, pages, step)]
+    rows = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        # map liefert in der Reihenfolge der Seiten
+        for part in pool.map(_extract_pages, [path] * len(ranges), *zip(*ranges)):
+            rows.extend(part)
+    return rows
+
+def load_recl_pdf(source, workers: int | None = None, cache_dir: str | None = CACHE_DIR):
+    """
+    recl-Rohdaten aus einem PDF (Pfad oder Puffer), im Format von
+    pd.read_excel(recl, header=None). Mit cache_dir=None ohne Zwischenspeicher.
+    """
+    import pandas as pd
+
+    with _as_path(source) as path:
+        cache_path = None
+        if cache_dir:
+            cache_path = os.path.join(cache_dir, f'{_file_hash(path)}.v{CACHE_VERSION}.pkl')
+            if os.path.exists(cache_path):
+                print(f"PDF aus Cache: {cache_path}")
+                return pd.read_pickle(cache_path)
+
+        frame = normalize_rows(extract_tables(path, workers))
+    print(f"PDF eingelesen: {len(frame) - RECL_PREAMBLE_ROWS - 1} Datenzeilen, {len(frame.columns)} Spalten")
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Erst vollständig schreiben, dann umbenennen (parallele Läufe lesen keine halben Dateien)
+        partial = f'{cache_path}.{os.getpid()}.tmp'
+        frame.to_pickle(partial)
+        os.replace(partial, cache_path)
+    return frame
+
+def read_head(source, sample_rows: int):
+    """Header-Zeile und erste Datenzeilen der ersten Seite (für die Vorprüfung)."""
+    with _as_path(source) as path:
+        rows = _extract_pages(path, 0, min(1, _page_count(path)))
+
+    rows = [tuple(None if value is None or not str(value).strip() else ' '.join(str(value).split()) for value in row)
+            for row in rows]
+    rows = [row for row in rows if any(value is not None for value in row)]
+    if not rows:
+        return None, []
+    return rows[0], [row for row in rows[1:sample_rows + 1] if row != rows[0]]
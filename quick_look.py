@@ -0,0 +1,299 @@
+"""
+Schnellansicht für sehr große Exporte: Hauptthema-Verteilung und Kurzübersicht
+als Näherung aus einer geschichteten Stichprobe, mit 95%-Konfidenzintervallen.
+
+Die Tabellenblätter werden mit dem xlsx-Leser der Upload-Prüfung als XML
+gestreamt (upload_validation.iter_rows, ohne openpyxl-Zellobjekte):
+
+1. Für jede recl-Datenzeile nur Datum (Spalte 4) und Einsteller (Spalte 7)
+   lesen. Schichten sind Monat x Einsteller; Monats- und Benutzerfilter wirken
+   auf ganze Schichten, deren Größe damit exakt bekannt ist.
+2. Aus jeder Schicht eine Zufallsstichprobe ziehen (proportional, mindestens
+   MIN_PER_STRATUM Zeilen) und nur diese Zeilen vollständig auswerten
+   (Einsteller-/Ablehnungs-Filter, Hauptthema).
+3. Summen und Anteile mit dem Schätzer für geschichtete Stichproben
+   hochrechnen; Anteile als Verhältnisschätzer.
+
+Die Verkäufe aus dem Gruppenreporting werden exakt gezählt (nur drei Spalten).
+Alle geschätzten Werte sind als Näherung gekennzeichnet; die vollständige
+Ergebnisdatei entsteht weiterhin mit der normalen Auswertung.
+
+Nur für einzelne Excel-Dateien (keine PDFs, keine Zusammenführung mehrerer Exporte).
+"""
+import datetime
+import math
+import os
+import random
+from contextlib import closing
+
+# Angestrebte Stichprobengröße (Zeilen) über alle Schichten
+SAMPLE_SIZE = int(os.environ.get('QUICK_LOOK_SAMPLE_SIZE', 2000))
+# Mindestens so viele Zeilen je Schicht, damit sich die Streuung schätzen lässt
+MIN_PER_STRATUM = 2
+# 95%-Konfidenzintervall
+Z_95 = 1.96
+
+# Excel-Zeilennummern der ersten Datenzeile (recl: 3 Zeilen Vorspann + Header)
+RECL_FIRST_ROW = 5
+GRP_FIRST_ROW = 2
+# Spalten der Rohdaten (wie bei pd.read_excel(header=None))
+RECL_DATE, RECL_USER, RECL_HAUPTTHEMA, RECL_ROLE, RECL_STATE = 4, 7, 13, 18, 19
+GRP_SOLD, GRP_USER, GRP_DATE = 2, 3, 8
+
+_EXCEL_EPOCH = datetime.datetime(1899, 12, 30)
+
+def _value(value):
+    """Zellwert wie bei pd.read_excel; leere Zellen und NA-Texte werden None."""
+    from chunked_report import NA_STRINGS
+
+    if isinstance(value, str) and value in NA_STRINGS:
+        return None
+    return value
+
+def iter_cells(source, columns, rows=None, first_row: int = 1):
+    """
+    Streamt das erste Tabellenblatt von `source` (Pfad oder Puffer) und liefert
+    (Excel-Zeilennummer, {Spalte: Wert}) nur für die angegebenen Spalten.
+    Mit `rows` (Menge von Zeilennummern) werden alle anderen Zeilen übersprungen.
+    """
+    from upload_validation import iter_rows
+
+    last = max(rows, default=0) if rows is not None else None
+    with closing(iter_rows(source, set(columns))) as sheet:
+        for index, cells in sheet:
+            number = index + 1
+            if last is not None and number > last:
+                break
+            if number < first_row or (rows is not None and number not in rows):
+                continue
+            yield number, {column: _value(cells.get(column)) for column in columns}
+
+def _month_of(value, date_format: str | None):
+    """(Jahr, Monat) eines Datumswerts; Zahlen sind Excel-Seriennummern."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        day = _EXCEL_EPOCH + datetime.timedelta(days=value)
+    elif isinstance(value, datetime.datetime):
+        day = value
+    elif isinstance(value, str) and date_format:
+        try:
+            day = datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            return None
+    else:
+        return None
+    return day.year, day.month
+
+def _date_format(values) -> str | None:
+    """Datumsformat aus dem ersten Text-Wert, wie bei den Monatsfiltern."""
+    from pandas.tseries.api import guess_datetime_format
+
+    for value in values:
+        if isinstance(value, str):
+            # Die Exporte schreiben Tag vor Monat (dd.mm.yyyy)
+            return guess_datetime_format(value, dayfirst=True)
+        if value is not None:
+            return None
+    return None
+
+def _seek_start(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+class Stratum:
+    """Zeilennummern einer Schicht und die Werte der Stichprobenzeilen."""
+    __slots__ = ('rows', 'sample')
+
+    def __init__(self):
+        self.rows = []
+        self.sample = []
+
+def sample_strata(recl, month_number: int | None, username: str | None, sample_size: int, seed: int = 0,
+                  job=None):
+    """
+    Durchlauf 1: Schichten (Monat, Einsteller) mit ihren Zeilennummern, nach Monat
+    und Benutzer gefiltert (das Datumsformat kommt wie bei filter_recl_rows aus der
+    ersten gezählten Zeile, dafür wird nur der Anfang gelesen). Durchlauf 2:
+    Stichprobe je Schicht vollständig lesen. `job` wie bei run_pipeline.
+    """
+    from job_control import check_job
+
+    # Datumsformat wie filter_recl_rows aus der ersten Zeile, die die Einsteller-Filter besteht
+    counted = (values for _, values in iter_cells(_seek_start(recl), (RECL_DATE, RECL_ROLE, RECL_STATE),
+                                                  first_row=RECL_FIRST_ROW) if _counted(values))
+    date_format = _date_format(values[RECL_DATE] for values in counted)
+
+    check_job(job, 'Durchlauf 1')
+    keys = iter_cells(_seek_start(recl), (RECL_DATE, RECL_USER), first_row=RECL_FIRST_ROW)
+
+    strata = {}
+    for number, values in keys:
+        user = values[RECL_USER]
+        if username and str(user if user is not None else 'nan') != username:
+            continue
+        month = _month_of(values[RECL_DATE], date_format)
+        if month_number and (month is None or month[1] != month_number):
+            continue
+        strata.setdefault((month, user), Stratum()).rows.append(number)
+
+    population = sum(len(stratum.rows) for stratum in strata.values())
+    rng = random.Random(seed)
+    for stratum in strata.values():
+        size = len(stratum.rows)
+        if population > sample_size:
+            size = min(size, max(MIN_PER_STRATUM, round(sample_size * size / population)))
+        stratum.sample = sorted(rng.sample(stratum.rows, size))
+
+    wanted = {number: stratum for stratum in strata.values() for number in stratum.sample}
+    check_job(job, 'Durchlauf 2')
+    details = {}
+    for number, values in iter_cells(_seek_start(recl), (RECL_HAUPTTHEMA, RECL_ROLE, RECL_STATE),
+                                     rows=wanted, first_row=RECL_FIRST_ROW):
+        details[number] = values
+    for stratum in strata.values():
+        stratum.sample = [details.get(number, {}) for number in stratum.sample]
+    return strata, population
+
+def _counted(values) -> bool:
+    """Zeile zählt als Beanstandung (Filter wie filter_recl_rows)."""
+    return values.get(RECL_ROLE) == 'Einsteller' and values.get(RECL_STATE) != 'Wurde abgelehnt'
+
+def _hauptthema(values) -> str:
+    # Wie recl_aggregates: leer oder NaN zählt als "Sonstiges"
+    return values.get(RECL_HAUPTTHEMA) or 'Sonstiges'
+
+def estimate_total(strata, value) -> tuple[float, float]:
+    """Hochgerechnete Summe von value(Zeile) und ihre Varianz (geschichtete Stichprobe)."""
+    total = variance = 0.0
+    for stratum in strata:
+        population, values = len(stratum.rows), [value(row) for row in stratum.sample]
+        n = len(values)
+        if not n:
+            continue
+        mean = sum(values) / n
+        total += population * mean
+        if 1 < n < population:
+            spread = sum((v - mean) ** 2 for v in values) / (n - 1)
+            variance += population ** 2 * (1 - n / population) * spread / n
+    return total, variance
+
+def _interval(estimate: float, variance: float, lower: float = 0.0):
+    margin = Z_95 * math.sqrt(variance)
+    return estimate, max(lower, estimate - margin), estimate + margin
+
+def hauptthema_estimate(strata):
+    """Hauptthema-Verteilung mit Konfidenzintervallen für Anzahl und Anteil."""
+    import pandas as pd
+
+    strata = list(strata)
+    # Reihenfolge des ersten Auftretens, damit gleich häufige Themen stabil sortiert sind
+    themes = dict.fromkeys(_hauptthema(row) for stratum in strata for row in stratum.sample if _counted(row))
+    total, total_variance = estimate_total(strata, lambda row: float(_counted(row)))
+    rows = []
+    for theme in themes:
+        def hit(row, theme=theme):
+            return float(_counted(row) and _hauptthema(row) == theme)
+        count, variance = estimate_total(strata, hit)
+        share = count / total if total else 0.0
+        # Verhältnisschätzer: Varianz über die Residuen Treffer - Anteil * Beanstandung
+        _, share_variance = estimate_total(strata, lambda row: hit(row) - share * float(_counted(row)))
+        share_variance = share_variance / total ** 2 if total else 0.0
+        summe, summe_von, summe_bis = _interval(count, variance)
+        anteil, anteil_von, anteil_bis = _interval(share * 100, share_variance * 100 ** 2)
+        rows.append((theme, round(summe), round(summe_von), round(summe_bis),
+                     round(anteil, 2), round(anteil_von, 2), round(min(anteil_bis, 100.0), 2)))
+
+    rows.sort(key=lambda row: row[1], reverse=True)
+    summe, summe_von, summe_bis = _interval(total, total_variance)
+    rows.append(('Gesamt', round(summe), round(summe_von), round(summe_bis), 100.0, 100.0, 100.0))
+    return pd.DataFrame(rows, columns=[
+        'Hauptthema', 'Summe (≈)', 'Summe von', 'Summe bis',
+        'In % gegenüber allen Beanstandungen (≈)', 'In % von', 'In % bis',
+    ])
+
+def count_sales(grp, month_number: int | None, username: str | None):
+    """Verkäufe je User exakt aus dem Gruppenreporting (Filter wie filter_grp_rows)."""
+    import pandas as pd
+    from Reads_excel_columns import grp_aggregates
+
+    rows = [values for _, values in iter_cells(_seek_start(grp), (GRP_SOLD, GRP_USER, GRP_DATE),
+                                               first_row=GRP_FIRST_ROW)]
+    rows = [values for values in rows if values[GRP_SOLD] == 'Verkauft' and
+            (not username or str(values[GRP_USER] if values[GRP_USER] is not None else 'nan') == username)]
+    if month_number:
+        date_format = _date_format(values[GRP_DATE] for values in rows)
+        rows = [values for values in rows if (_month_of(values[GRP_DATE], date_format) or (0, 0))[1] == month_number]
+    users = pd.DataFrame({0: ['Verkauft'] * len(rows), 1: [values[GRP_USER] for values in rows]})
+    return grp_aggregates(users)['verkauft']
+
+def kurzuebersicht_estimate(strata: dict, verkauft, user_directory: str | None = None):
+    """Kurzübersicht je User: Beanstandungen und Quote geschätzt, Verkäufe exakt."""
+    import pandas as pd
+    from Reads_excel_columns import sales_table, user_regionen_table
+    from user_directory import load_directory
+
+    by_user = {}
+    for (_, user), stratum in strata.items():
+        if user is not None:
+            by_user.setdefault(user, []).append(stratum)
+
+    base = user_regionen_table(sales_table(verkauft), load_directory(user_directory))
+    sold = verkauft.to_dict()
+    rows = []
+    total = total_variance = 0.0
+    for user, plz, region, standort in base[['User', 'PLZ', 'Region', 'Stadort']].itertuples(index=False, name=None):
+        count, variance = estimate_total(by_user.get(user, []), lambda row: float(_counted(row)))
+        total += count
+        total_variance += variance
+        rows.append(_kurzuebersicht_row(user, plz, region, standort, count, variance, int(sold.get(user, 0))))
+    rows.append(_kurzuebersicht_row('Gesamt', '', '', '', total, total_variance, int(sum(sold.get(user, 0) for user in base['User']))))
+    return pd.DataFrame(rows, columns=[
+        'User', 'PLZ', 'Region', 'Stadort',
+        'Beanstandungen (≈)', 'Beanstandungen von', 'Beanstandungen bis', 'Verkauft',
+        'Beanstandungsquote(%) (≈)', 'Quote von', 'Quote bis',
+    ])
+
+def _kurzuebersicht_row(user, plz, region, standort, count, variance, verkauft: int):
+    anzahl, von, bis = _interval(count, variance)
+    quote = [round(value / verkauft * 100, 2) if verkauft > 0 else 0.0 for value in (anzahl, von, bis)]
+    return (user, plz, region, standort, round(anzahl), round(von), round(bis), verkauft, *quote)
+
+def quick_look(recl, grp, month: str | None = None, username: str | None = None,
+               sample_size: int = SAMPLE_SIZE, user_directory: str | None = None, seed: int = 0,
+               job=None) -> dict:
+    """
+    Näherungswerte für Hauptthema-Analyse und Kurzübersicht. `recl` und `grp`
+    sind Pfade oder Puffer je einer Excel-Datei; gibt Tabellen und Stichprobenangaben zurück.
+    `job` (job_control.Job) wird zwischen den Durchläufen geprüft.
+    """
+    from collections import OrderedDict
+    from job_control import check_job
+    from pdf_ingest import is_pdf
+    from Reads_excel_columns import MONTH_MAP, as_file_list
+
+    recl_files, grp_files = as_file_list(recl), as_file_list(grp)
+    if len(recl_files) != 1 or len(grp_files) > 1:
+        raise ValueError("Die Schnellansicht braucht genau eine recl-Datei und höchstens eine grp-Datei")
+    recl, grp = recl_files[0], grp_files[0] if grp_files else None
+    if is_pdf(recl):
+        raise ValueError("Die Schnellansicht liest nur Excel-Dateien, keine PDFs")
+
+    month_number = MONTH_MAP.get(month.strip()) if month and month.strip() else None
+    strata, population = sample_strata(recl, month_number, username, sample_size, seed, job=job)
+    sampled = sum(len(stratum.sample) for stratum in strata.values())
+    print(f"Schnellansicht: {sampled} von {population} Zeilen in {len(strata)} Schichten (Monat x Einsteller)")
+
+    safe_month = month or "Alle_Monate"
+    tables = OrderedDict()
+    tables[f'Hauptthema_Analyse_{safe_month}'] = hauptthema_estimate(strata.values())
+    if grp is not None:
+        check_job(job, 'den Verkäufen')
+        verkauft = count_sales(grp, month_number, username)
+        tables[f'Kurzübersicht_{safe_month}'] = kurzuebersicht_estimate(strata, verkauft, user_directory)
+    return {
+        'tables': tables,
+        'sampled': sampled,
+        'population': population,
+        'strata': len(strata),
+        'exact': sampled == population,
+    }
@@ -0,0 +1,92 @@
+"""
+Layout der Registerkarten der Ergebnisdatei.
+
+Jeder Registerkarten-Typ wird hier einmal beschrieben: Spaltenbreiten, ob Header
+und Index geschrieben werden, Spalten mit Zeilenumbruch und Diagramme. Die
+Auswertung schreibt nur noch Daten (siehe report_renderer.py); Änderungen am
+Aussehen sind Änderungen an diesen Daten.
+
+Schlüssel je Layout:
+    widths        Spaltenbreiten je Spaltenbuchstabe (Standardbreite ist oft ~8.43)
+    header        Spaltenüberschriften im Header-Format schreiben (Standard True)
+    index         Index des DataFrames als erste Spalte schreiben (Standard False)
+    wrap_columns  Spalten, deren Datenzellen umbrechen und oben ausgerichtet sind
+    chart         Diagramm (siehe CHART-Schlüssel unten)
+"""
+
+# Formate, die für alle Registerkarten gelten (wie bei DataFrame.to_excel)
+HEADER_STYLE = {
+    'bold': True,
+    'border': 'thin',
+    'horizontal': 'center',
+    'vertical': 'top',
+}
+WRAP_STYLE = {
+    'wrap_text': True,
+    'vertical': 'top',
+}
+NUMBER_FORMATS = {
+    'datetime': 'YYYY-MM-DD HH:MM:SS',
+    'date': 'YYYY-MM-DD',
+}
+
+# Detailtabellen (Alle, Erledigt, Offen): Rohdaten inkl. Header-Zeile aus der Datei
+DETAIL_WIDTHS = {'A': 15, 'B': 10, 'C': 15, 'D': 10, 'E': 10, 'F': 10, 'G': 15,
+                 'H': 25, 'I': 25, 'J': 40, 'K': 10, 'L': 20, 'M': 20, 'N': 30}
+
+SHEET_LAYOUTS = {
+    'detail': {
+        'widths': DETAIL_WIDTHS,
+        'header': False,
+    },
+    'hauptthema': {
+        'widths': {'A': 25, 'B': 15, 'C': 40},
+        # Kreisdiagramm über die Hauptthemen (Spalte A) und ihre Summe (Spalte B), ohne Gesamt-Zeile
+        'chart': {
+            'kind': 'pie',
+            'title': 'Verteilung der Hauptthemen',
+            'categories_column': 1,
+            'values_column': 2,
+            'skip_last_row': True,
+            'anchor': 'E2',
+            'style': 10,
+            'legend_position': 'r',
+            'layout': {'x': 0.1, 'y': 0.1, 'w': 0.8, 'h': 0.8},
+            'data_labels': {'show_percent': True, 'show_category': True, 'number_format': '0.00%'},
+            # Diagrammgröße (Einheiten sind Excel-intern)
+            'width': 30,
+            'height': 15,
+        },
+    },
+    'pivot': {
+        'widths': {'A': 25},
+        'index': True,
+    },
+    'gruppenreporting': {
+        'widths': {'A': 15, 'B': 15, 'C': 35, 'D': 15, 'E': 35, 'F': 25},
+        'header': False,
+    },
+    'verkaeufe': {
+        'widths': {'A': 15, 'B': 15},
+    },
+    'user_regionen': {
+        'widths': {'A': 15, 'B': 15, 'C': 15, 'D': 25},
+    },
+    'kurzuebersicht': {
+        'widths': {'A': 10, 'B': 10, 'C': 15, 'D': 25, 'E': 15, 'F': 15, 'G': 25},
+    },
+    'offene_faelle': {
+        'widths': {'A': 10, 'B': 10, 'C': 15, 'D': 25, 'E': 25, 'F': 25,
+                   'G': 45, 'H': 20, 'I': 20},
+        # Begründungen sind mehrzeilig
+        'wrap_columns': ['G'],
+    },
+    'regionen': {
+        'widths': {'A': 25, 'B': 12, 'C': 15, 'D': 12, 'E': 25},
+    },
+    # Hinweis- und Fehlerblätter, wenn für eine Auswertung keine Daten vorliegen
+    'hinweis': {},
+    'hinweis_ohne_header': {
+        'header': False,
+    },
+}
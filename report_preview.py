@@ -0,0 +1,219 @@
+"""
+Vorschau der Auswertungstabellen im Browser, ohne Ergebnisdatei.
+
+Für einen Vorschau-Auftrag werden die Uploads einmal gefiltert und nur die
+Zählwerte (recl_agg, grp_agg) berechnet. Daraus entstehen mit denselben
+Funktionen wie in der Ergebnisdatei die Auswertungstabellen (Hauptthema,
+Pivot, Verkäufe, Kurzübersicht, Offene Fälle, ...). Seitenwechsel und
+Sortierung lesen nur noch die gespeicherten Tabellen. Die vollständige
+Ergebnisdatei wird erst beim Download erstellt.
+
+Jeder Auftrag liegt in einem eigenen Arbeitsverzeichnis des TempJanitor
+(temp_janitor.py): die Uploads als Dateien und die Tabellen als Pickle. Damit
+findet jeder gunicorn-Worker die Vorschau, nicht nur der, der sie erstellt hat,
+und die Uploads zählen zur Speichergrenze der Arbeitsverzeichnisse statt im
+Speicher der Worker zu liegen.
+"""
+import math
+import os
+import pickle
+import re
+import time
+from collections import OrderedDict
+
+from report_layout import SHEET_LAYOUTS
+from temp_janitor import OWNER_FILE
+
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+
+class SummaryTables:
+    """
+    Gleiche Schnittstelle wie report_renderer.ReportRenderer.write, sammelt die
+    Registerkarten aber als DataFrames (Registerkartenname -> Tabelle).
+    """
+
+    def __init__(self):
+        self.tables = OrderedDict()
+
+    def write(self, df, sheet_name: str, layout: str):
+        # Index (z.B. Hauptthemen der Pivot-Tabelle) wird zur ersten Spalte
+        if SHEET_LAYOUTS[layout].get('index', False):
+            df = df.rename_axis(df.index.name or '').reset_index()
+        self.tables[sheet_name] = df
+        return df
+
+def summary_tables(month: str | None, recl_agg: dict | None, grp_agg: dict | None,
+                   user_directory: str | None = None) -> OrderedDict:
+    """Schritte 8-9 und 14-18 aus den Zählwerten, als Tabellen statt Registerkarten."""
+    from Reads_excel_columns import write_grp_summaries, write_recl_summaries
+
+    collector = SummaryTables()
+    write_recl_summaries(collector, month, recl_agg)
+    write_grp_summaries(collector, month, recl_agg, grp_agg, user_directory)
+    return collector.tables
+
+def build_preview(month: str | None, username: str | None, recl: list[str], grp: list[str],
+                  user_directory: str | None = None, job=None) -> dict:
+    """
+    Vorschau-Auftrag aus den gespeicherten Uploads (je Feld eine Liste von Pfaden,
+    siehe multi_ingest.py): Zählwerte und Auswertungstabellen. `job` wie bei run_pipeline.
+    """
+    from Reads_excel_columns import load_inputs, report_aggregates
+
+    df_raw, df_grp = load_inputs(recl, grp or None, debug_dumps=False)
+    recl_agg, grp_agg = report_aggregates(df_raw, df_grp, month, username, job=job)
+    return {
+        'month': month,
+        'username': username,
+        'tables': summary_tables(month, recl_agg, grp_agg, user_directory),
+    }
+
+# Präfix der Arbeitsverzeichnisse von Vorschau-Aufträgen; der Rest des Namens ist die Auftrags-ID
+PREVIEW_PREFIX = 'preview_'
+# Auftrag (Monat, User, Tabellen, Namen der Uploads) im Arbeitsverzeichnis
+JOB_FILE = 'preview.pkl'
+_JOB_ID = re.compile(r'[A-Za-z0-9_]+')
+
+class PreviewCache:
+    """
+    Vorschau-Aufträge nach Auftrags-ID, je Auftrag ein Arbeitsverzeichnis im
+    `workspace`. Höchstens `max_jobs` Aufträge, jeder höchstens `ttl` Sekunden
+    nach dem letzten Ansehen; darüber hinaus fällt der am längsten nicht mehr
+    angesehene Auftrag heraus. Bei Platzmangel darf der Janitor Aufträge löschen.
+    """
+
+    def __init__(self, workspace, max_jobs: int = 20, ttl: float = 1800.0):
+        self.workspace = workspace
+        self.max_jobs = max(1, max_jobs)
+        self.ttl = ttl
+
+    @classmethod
+    def from_env(cls, workspace):
+        """Grenzen aus PREVIEW_MAX_JOBS und PREVIEW_TTL."""
+        return cls(
+            workspace,
+            max_jobs=int(os.environ.get('PREVIEW_MAX_JOBS', 20)),
+            ttl=float(os.environ.get('PREVIEW_TTL', 1800)),
+        )
+
+    def _directory(self, job_id: str) -> str | None:
+        if not _JOB_ID.fullmatch(job_id or ''):
+            return None
+        return os.path.join(self.workspace.root, PREVIEW_PREFIX + job_id)
+
+    def _jobs(self) -> list[tuple[float, str]]:
+        """
+        (Zeitpunkt des letzten Ansehens, Verzeichnis) aller gespeicherten Aufträge,
+        die ältesten zuerst. Aufträge, deren Auswertung noch läuft, zählen nicht.
+        """
+        jobs = []
+        if not os.path.isdir(self.workspace.root):
+            return jobs
+        for entry in os.scandir(self.workspace.root):
+            if entry.name.startswith(PREVIEW_PREFIX) and os.path.exists(os.path.join(entry.path, JOB_FILE)):
+                try:
+                    jobs.append((os.path.getmtime(os.path.join(entry.path, OWNER_FILE)), entry.path))
+                except OSError:
+                    pass
+        jobs.sort()
+        return jobs
+
+    def create(self, needed: int = 0) -> str:
+        """Arbeitsverzeichnis für einen neuen Auftrag (für die Uploads); WorkspaceFull wie beim Janitor."""
+        return self.workspace.create(PREVIEW_PREFIX, needed)
+
+    def put(self, directory: str, job: dict) -> str:
+        """
+        Auftrag in seinem Arbeitsverzeichnis speichern und freigeben; gibt die
+        Auftrags-ID zurück. `job['recl']`/`job['grp']` sind Pfade in `directory`.
+        """
+        stored = dict(job)
+        for field in ('recl', 'grp'):
+            stored[field] = [os.path.relpath(path, directory) for path in job.get(field, [])]
+        target = os.path.join(directory, JOB_FILE)
+        with open(f'{target}.tmp', 'wb') as f:
+            pickle.dump(stored, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{target}.tmp', target)
+        # Ab jetzt gehört der Auftrag keinem Worker mehr
+        self.workspace.release(directory)
+
+        now = time.time()
+        jobs = self._jobs()
+        for stamp, path in jobs:
+            if now - stamp > self.ttl:
+                self.workspace.remove(path)
+        jobs = [(stamp, path) for stamp, path in jobs if now - stamp <= self.ttl]
+        for _, path in jobs[:max(0, len(jobs) - self.max_jobs)]:
+            self.workspace.remove(path)
+        return os.path.basename(directory)[len(PREVIEW_PREFIX):]
+
+    def get(self, job_id: str) -> dict | None:
+        """Auftrag mit absoluten Pfaden der Uploads; None, wenn unbekannt oder abgelaufen."""
+        directory = self._directory(job_id)
+        if directory is None:
+            return None
+        try:
+            if time.time() - os.path.getmtime(os.path.join(directory, OWNER_FILE)) > self.ttl:
+                self.workspace.remove(directory)
+                return None
+            with open(os.path.join(directory, JOB_FILE), 'rb') as f:
+                job = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            # Nie angelegt, abgelaufen oder gerade von einem anderen Worker gelöscht
+            return None
+        self.workspace.touch(directory)
+        for field in ('recl', 'grp'):
+            job[field] = [os.path.join(directory, name) for name in job.get(field, [])]
+        return job
+
+    def stats(self) -> dict:
+        return {'preview_jobs': len(self._jobs()), 'preview_max_jobs': self.max_jobs}
+
+def _display(value) -> str:
+    """Zellwert für die HTML-Tabelle."""
+    import pandas as pd
+
+    if value is None or (not isinstance(value, str) and pd.api.types.is_scalar(value) and pd.isna(value)):
+        return ''
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else f'{value:.2f}'
+    return str(value)
+
+def table_page(table, page: int = 1, per_page: int = PAGE_SIZE, sort: str | None = None,
+               descending: bool = False) -> dict:
+    """
+    Eine Seite einer Auswertungstabelle, optional nach einer Spalte sortiert.
+    Die Gesamt-Zeile am Ende wird nicht mitsortiert und auf jeder Seite angezeigt.
+    """
+    body, total = table, None
+    if len(table) and str(table.iloc[-1, 0]) == 'Gesamt':
+        body, total = table.iloc[:-1], table.iloc[-1]
+
+    columns = [str(column) for column in table.columns]
+    if sort in columns:
+        column = table.columns[columns.index(sort)]
+        try:
+            body = body.sort_values(column, ascending=not descending, kind='stable', na_position='last')
+        except TypeError:
+            # Gemischte Typen (z.B. PLZ als Zahl und Text) als Text vergleichen
+            body = body.sort_values(column, ascending=not descending, kind='stable', na_position='last',
+                                    key=lambda values: values.astype(str))
+    else:
+        sort = None
+
+    per_page = min(max(1, per_page), MAX_PAGE_SIZE)
+    pages = max(1, math.ceil(len(body) / per_page))
+    page = min(max(1, page), pages)
+    rows = body.iloc[(page - 1) * per_page:page * per_page]
+    return {
+        'columns': columns,
+        'rows': [[_display(value) for value in row] for row in rows.itertuples(index=False, name=None)],
+        'total': [_display(value) for value in total] if total is not None else None,
+        'count': len(body),
+        'page': page,
+        'pages': pages,
+        'per_page': per_page,
+        'sort': sort,
+        'descending': descending,
+    }
@@ -0,0 +1,255 @@
+"""
+Schreibt DataFrames nach den Layouts aus report_layout.py in eine Arbeitsmappe.
+
+Die Arbeitsmappe ist write-only: Zeilen werden direkt in die Datei gestreamt,
+Formatobjekte (Header, Zeilenumbruch) werden einmal pro Prozess erzeugt und von
+allen Zellen geteilt. Registerkarten werden in der Reihenfolge ihres Anlegens
+gespeichert; in mehrere offene Registerkarten kann abwechselnd geschrieben werden.
+
+Große Registerkarten (ab MIN_ROWS_FOR_POOL Zeilen) werden im eigenen
+Analyse-Prozess (Reads_excel_columns.py, siehe pool_workers) in einem
+Prozess-Pool serialisiert: jeder Pool-Prozess erzeugt den XML-Teil einer
+Registerkarte, beim Speichern ersetzen diese Teile die leeren Platzhalter im
+Paket (Formate, workbook.xml, Diagramm usw. kommen aus dem Hauptprozess).
+Damit die Format-IDs in allen Prozessen gleich sind, legt jede Arbeitsmappe
+zuerst dieselben festen Formate an (siehe _register_styles); Strings stehen
+inline in den Zellen, es gibt keine gemeinsame String-Tabelle.
+"""
+import datetime
+import io
+import os
+import zipfile
+from types import SimpleNamespace
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import column_index_from_string
+
+from report_layout import HEADER_STYLE, NUMBER_FORMATS, SHEET_LAYOUTS, WRAP_STYLE
+
+# Formatobjekte aus den Layout-Daten, von allen Zellen geteilt
+_SIDE = Side(style=HEADER_STYLE['border'])
+HEADER_FONT = Font(bold=HEADER_STYLE['bold'])
+HEADER_BORDER = Border(left=_SIDE, right=_SIDE, top=_SIDE, bottom=_SIDE)
+HEADER_ALIGNMENT = Alignment(horizontal=HEADER_STYLE['horizontal'], vertical=HEADER_STYLE['vertical'])
+WRAP_ALIGNMENT = Alignment(wrap_text=WRAP_STYLE['wrap_text'], vertical=WRAP_STYLE['vertical'])
+
+# Registerkarten ab dieser Zeilenzahl gehen an den Prozess-Pool (kleinere lohnen die Übertragung nicht)
+MIN_ROWS_FOR_POOL = 2000
+# Anzahl Pool-Prozesse im Analyse-Prozess; 0 bzw. leer = Anzahl CPUs, 1 = ohne Pool
+WRITER_WORKERS = int(os.environ.get('REPORT_WRITER_WORKERS') or 0)
+
+def pool_workers() -> int:
+    """
+    Pool-Größe für den eigenen Analyse-Prozess. Im Web-Prozess (Threads, Analyseplätze
+    aus admission.py) bleibt es bei workers=1: dort wird nicht geforkt.
+    """
+    return WRITER_WORKERS or os.cpu_count() or 1
+
+# Teil der einzigen Registerkarte einer Arbeitsmappe im Paket
+_FIRST_SHEET_PART = 'xl/worksheets/sheet1.xml'
+
+def _cell(ws, value, header: bool = False):
+    """WriteOnlyCell mit derselben Darstellung wie bei DataFrame.to_excel."""
+    if value is None or value is pd.NaT or (not isinstance(value, str) and pd.api.types.is_scalar(value) and pd.isna(value)):
+        value = None
+    if isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    elif isinstance(value, np.generic):
+        value = value.item()
+    cell = WriteOnlyCell(ws, value=value)
+    if isinstance(value, datetime.datetime):
+        cell.number_format = NUMBER_FORMATS['datetime']
+    elif isinstance(value, datetime.date):
+        cell.number_format = NUMBER_FORMATS['date']
+    if header:
+        cell.font = HEADER_FONT
+        cell.border = HEADER_BORDER
+        cell.alignment = HEADER_ALIGNMENT
+    return cell
+
+def _register_styles(workbook):
+    """
+    Alle Formatkombinationen, die _cell und ReportRenderer.write erzeugen, in
+    fester Reihenfolge anlegen. Die Format-IDs hängen dann nicht davon ab, welche
+    Zellen zuerst geschrieben werden, und sind in jedem Prozess gleich.
+    """
+    # Zellen brauchen nur die Arbeitsmappe (parent.parent) für die Formatlisten
+    stub = SimpleNamespace(parent=workbook)
+    for value in (None, datetime.datetime(2000, 1, 1), datetime.date(2000, 1, 1)):
+        for header in (False, True):
+            for wrap in (False, True):
+                cell = _cell(stub, value, header)
+                if wrap:
+                    cell.alignment = WRAP_ALIGNMENT
+                cell.style_id
+
+def _fill(worksheet, df, spec: dict):
+    """Header und Zeilen eines DataFrames nach Layout in eine leere Registerkarte schreiben."""
+    index = spec.get('index', False)
+    # 0-basierte Positionen der Spalten mit Zeilenumbruch
+    wrap_positions = {column_index_from_string(letter) - 1 for letter in spec.get('wrap_columns', ())}
+
+    if spec.get('header', True):
+        labels = [str(column) for column in df.columns]
+        if index:
+            labels.insert(0, df.index.name)
+        worksheet.append([_cell(worksheet, label, header=label is not None) for label in labels])
+
+    for label, row in zip(df.index, df.itertuples(index=False, name=None)):
+        cells = [_cell(worksheet, value) for value in row]
+        if index:
+            cells.insert(0, _cell(worksheet, label, header=True))
+        for position in wrap_positions:
+            if position < len(cells):
+                cells[position].alignment = WRAP_ALIGNMENT
+        worksheet.append(cells)
+
+def _serialize_sheet(df, sheet_name: str, layout: str) -> bytes | None:
+    """
+    XML-Teil einer Registerkarte (läuft im Pool-Prozess). None, wenn dabei ein
+    Format entstanden ist, das nicht zu den festen Formaten gehört; dann schreibt
+    der Hauptprozess die Registerkarte selbst.
+    """
+    renderer = ReportRenderer(workers=1)
+    renderer.write(df, sheet_name, layout)
+    package = io.BytesIO()
+    renderer.save(package)
+
+    canonical = io.BytesIO()
+    ReportRenderer(workers=1).save(canonical)
+    with zipfile.ZipFile(package) as archive, zipfile.ZipFile(canonical) as reference:
+        if archive.read('xl/styles.xml') != reference.read('xl/styles.xml'):
+            return None
+        return archive.read(_FIRST_SHEET_PART)
+
+def _replace_parts(package, parts: dict, target):
+    """Paket neu schreiben, dabei die angegebenen Teile (Name -> Inhalt) ersetzen."""
+    with zipfile.ZipFile(package) as source, \
+            zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for info in source.infolist():
+            data = parts.get(info.filename)
+            archive.writestr(info, data if data is not None else source.read(info.filename))
+
+def _add_chart(ws, spec: dict, data_rows: int):
+    """Diagramm nach Layout-Spezifikation; Daten ab Zeile 2 (Zeile 1 ist der Header)."""
+    from openpyxl.chart import PieChart, Reference
+    from openpyxl.chart.label import DataLabelList
+    from openpyxl.chart.layout import Layout, ManualLayout
+    from openpyxl.chart.legend import Legend
+
+    if spec['kind'] != 'pie':
+        raise ValueError(f"Unbekannter Diagrammtyp: {spec['kind']}")
+
+    n = data_rows - 1 if spec.get('skip_last_row') else data_rows
+    labels = Reference(ws, min_col=spec['categories_column'], min_row=2, max_row=1 + n)
+    data = Reference(ws, min_col=spec['values_column'], min_row=2, max_row=1 + n)
+
+    chart = PieChart()
+    chart.title = spec.get('title')
+    chart.add_data(data, titles_from_data=False)
+    chart.set_categories(labels)
+    chart.style = spec.get('style', 10)
+
+    chart.legend = Legend()
+    chart.legend.position = spec.get('legend_position', 'r')
+    chart.legend.overlay = False
+
+    if 'layout' in spec:
+        chart.layout = Layout(manualLayout=ManualLayout(**spec['layout']))
+
+    chart.series[0].title = None
+
+    labels_spec = spec.get('data_labels')
+    if labels_spec:
+        chart.dataLabels = DataLabelList()
+        chart.dataLabels.showSerName = False
+        chart.dataLabels.showPercent = labels_spec.get('show_percent', False)
+        chart.dataLabels.numFmt = labels_spec.get('number_format')
+        chart.dataLabels.showLegendKey = False
+        chart.dataLabels.showCatName = labels_spec.get('show_category', False)
+
+    chart.width = spec.get('width', chart.width)
+    chart.height = spec.get('height', chart.height)
+    ws.add_chart(chart, spec['anchor'])
+
+class ReportRenderer:
+    """
+    Registerkarten nach Layout-Namen aus report_layout.SHEET_LAYOUTS schreiben.
+    Ohne `workers` (oder mit 1) ohne Prozess-Pool.
+    """
+
+    def __init__(self, workers: int | None = None):
+        self.workbook = openpyxl.Workbook(write_only=True)
+        _register_styles(self.workbook)
+        self.workers = workers or 1
+        self._pool = None
+        # Im Pool serialisierte Registerkarten: (Platzhalter, Future, DataFrame, Layout)
+        self._pending = []
+
+    def open(self, sheet_name: str, layout: str):
+        """Leere Registerkarte mit den Spaltenbreiten des Layouts anlegen (für append)."""
+        worksheet = self.workbook.create_sheet(sheet_name)
+        # Spaltenbreiten müssen vor der ersten Zeile gesetzt werden
+        for letter, width in SHEET_LAYOUTS[layout].get('widths', {}).items():
+            worksheet.column_dimensions[letter].width = width
+        return worksheet
+
+    def append(self, worksheet, df):
+        """Zeilen eines DataFrames ohne Header und Index anhängen."""
+        for row in df.itertuples(index=False, name=None):
+            worksheet.append([_cell(worksheet, value) for value in row])
+
+    def write(self, df, sheet_name: str, layout: str):
+        """
+        Ganzes DataFrame als neue Registerkarte schreiben, wie DataFrame.to_excel.
+        Große Registerkarten werden bei mehreren Prozessen im Pool serialisiert,
+        die Zeilen kommen dann erst beim Speichern in die Datei.
+        """
+        spec = SHEET_LAYOUTS[layout]
+        worksheet = self.open(sheet_name, layout)
+        if self.workers > 1 and len(df) >= MIN_ROWS_FOR_POOL:
+            if self._pool is None:
+                from concurrent.futures import ProcessPoolExecutor
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            future = self._pool.submit(_serialize_sheet, df, sheet_name, layout)
+            self._pending.append((worksheet, future, df, layout))
+        else:
+            _fill(worksheet, df, spec)
+
+        # Das Diagramm gehört zum Platzhalter, damit Zeichnung und Beziehungen im Paket stehen
+        if 'chart' in spec:
+            _add_chart(worksheet, spec['chart'], len(df))
+        return worksheet
+
+    def save(self, target):
+        """Arbeitsmappe in eine Datei oder einen Puffer (z.B. BytesIO) schreiben."""
+        if not self._pending:
+            self.workbook.save(target)
+            return
+
+        serialized = []
+        try:
+            for worksheet, future, df, layout in self._pending:
+                try:
+                    xml = future.result()
+                except Exception as e:
+                    # Kein leerer Platzhalter in der Ergebnisdatei: dann schreibt der Hauptprozess selbst
+                    print(f"Registerkarte '{worksheet.title}' im Pool fehlgeschlagen, wird direkt geschrieben: {e}")
+                    xml = None
+                if xml is None:
+                    _fill(worksheet, df, SHEET_LAYOUTS[layout])
+                else:
+                    serialized.append((worksheet, xml))
+        finally:
+            self._pool.shutdown()
+            self._pool = None
+            self._pending = []
+
+        package = io.BytesIO()
+        self.workbook.save(package)
+        # Die Pfade der Registerkarten stehen erst nach dem Speichern fest
+        _replace_parts(package, {worksheet.path[1:]: xml for worksheet, xml in serialized}, target)
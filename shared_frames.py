@@ -0,0 +1,226 @@
+"""
+Eingelesene Rohdaten (df_raw, df_grp) für mehrere Analyse-Prozesse gemeinsam.
+
+Beim ZIP-Export startet die Web-App für jeden Bericht einen eigenen
+Analyse-Prozess. Ohne Übergabe liest jeder Prozess dieselben xlsx-Uploads neu
+ein (bei großen Exporten über eine Minute je Bericht) und hält eine eigene Kopie
+der Rohdaten. Mit `--frames <Datei>` legt der erste Prozess die eingelesenen
+Rohdaten spaltenweise in einer Datei im Upload-Verzeichnis ab; alle weiteren
+Prozesse binden die Datei per mmap ein, statt die Uploads zu lesen.
+
+Format: ein kurzer Kopf (Spalten, Index, Datentypen) als Pickle, danach die
+Spalten als zusammenhängende Puffer (auf 64 Byte ausgerichtet).
+
+- Zahlen- und Datumsspalten werden ohne Kopie direkt auf die Seiten der Datei
+  abgebildet. Die Abbildung ist privat (mmap.ACCESS_COPY): gleichzeitige
+  Prozesse teilen sich dieselben Seiten im Seiten-Cache, nur geänderte Seiten
+  werden kopiert.
+- Text-Spalten (die Rohdaten sind wegen Vorspann und Header fast nur
+  object-Spalten) werden als Wörterbuch abgelegt, ebenfalls in den gemeinsamen
+  Seiten: die Zellen als Ganzzahl-Codes, die verschiedenen Texte einer Spalte
+  als UTF-8-Bytes mit Offsets (ähnlich einer Arrow-String-Spalte). Nur die wenigen
+  übrigen Werte (Zahlen, Datum, NaN) stehen im Kopf.
+
+Eine object-Spalte in pandas braucht Python-Objekte: beim Einbinden erzeugt
+jeder Prozess jeden verschiedenen Text einer Spalte einmal aus den gemeinsamen
+Bytes, die Zellen verweisen darauf. Ganz ohne Kopie ginge das nur mit
+Arrow-gestützten Spalten, also mit pyarrow; das ist keine Abhängigkeit der App
+(deshalb speichert auch checkpoints.py Pickles statt Parquet).
+
+Die Datei gehört zu genau einem Paar Eingabedateien (checkpoints.inputs_key);
+passt der Schlüssel nicht, wird neu eingelesen. Mit --job-id übernimmt der
+Checkpoint 'ingest' diese Aufgabe, die Datei wird dann nicht geschrieben.
+"""
+import mmap
+import os
+import pickle
+
+# Name der Datei im Upload-Verzeichnis eines ZIP-Exports
+FRAMES_FILE = 'frames.bin'
+# Bei Änderungen am Format erhöhen
+FRAMES_VERSION = 2
+MAGIC = b'BSFRAMES'
+ALIGNMENT = 64
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def _value_key(value):
+    """
+    Schlüssel für das Wörterbuch einer object-Spalte: Typ und Wert, damit 1, 1.0
+    und True verschiedene Einträge bleiben; fehlende Werte (NaN, NaT) je Typ einer.
+    """
+    try:
+        missing = value != value
+    except (TypeError, ValueError):
+        missing = False
+    return (type(value), None) if missing is True else (type(value), value)
+
+def _encode_objects(values):
+    """
+    object-Spalte -> (Codes, Texte, übrige Werte). Jeder Wert (nach _value_key)
+    bekommt einen Code; die Texte zuerst, dann die übrigen Werte.
+    """
+    import numpy as np
+
+    positions = {}
+    categories = []
+    codes = np.empty(len(values), dtype=np.int64)
+    for number, value in enumerate(values):
+        key = _value_key(value)
+        code = positions.get(key)
+        if code is None:
+            code = positions[key] = len(categories)
+            categories.append(value)
+        codes[number] = code
+
+    order = sorted(range(len(categories)), key=lambda code: type(categories[code]) is not str)
+    remap = np.empty(len(categories), dtype=np.int64)
+    remap[order] = np.arange(len(categories))
+    texts = [categories[code] for code in order if type(categories[code]) is str]
+    others = [categories[code] for code in order[len(texts):]]
+    dtype = np.min_scalar_type(max(len(categories) - 1, 0))
+    return remap[codes].astype(dtype), texts, others
+
+def _text_buffers(texts: list[str]):
+    """
+    Texte als (Offsets, UTF-8-Bytes). Die Offsets zählen Zeichen: beim Einbinden
+    wird der Puffer einer Spalte in einem Schritt dekodiert und dann zerschnitten.
+    """
+    import numpy as np
+
+    bounds = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in texts], out=bounds[1:])
+    offsets = bounds.astype(np.min_scalar_type(int(bounds[-1])))
+    return offsets, np.frombuffer(''.join(texts).encode('utf-8', 'surrogatepass'), dtype=np.uint8)
+
+def _column_layout(frame) -> tuple[list, list]:
+    """Beschreibung und Puffer der Spalten eines Frames."""
+    import numpy as np
+
+    columns, buffers = [], []
+    for position in range(frame.shape[1]):
+        series = frame.iloc[:, position]
+        if not isinstance(series.dtype, np.dtype):
+            # Erweiterte Datentypen (z.B. Datum mit Zeitzone) bleiben im Kopf
+            columns.append(('pickle', series.array))
+        elif series.dtype == object:
+            codes, texts, others = _encode_objects(series.to_numpy())
+            offsets, data = _text_buffers(texts)
+            columns.append(('objects', codes.dtype.str, offsets.dtype.str, len(texts), len(data), others))
+            buffers.extend([codes, offsets, data])
+        else:
+            columns.append(('array', series.dtype.str))
+            buffers.append(np.ascontiguousarray(series.to_numpy()))
+    return columns, buffers
+
+def publish(df_raw, df_grp, path: str, key: str):
+    """Rohdaten in `path` ablegen; erst vollständig schreiben, dann umbenennen."""
+    frames, buffers = [], []
+    for frame in (df_raw, df_grp):
+        columns, frame_buffers = _column_layout(frame)
+        frames.append({'columns': frame.columns, 'index': frame.index, 'layout': columns, 'rows': len(frame)})
+        buffers.extend(frame_buffers)
+
+    offsets, offset = [], 0
+    for buffer in buffers:
+        offsets.append(offset)
+        offset = _aligned(offset + buffer.nbytes)
+    head = pickle.dumps({'version': FRAMES_VERSION, 'key': key, 'frames': frames, 'offsets': offsets},
+                        protocol=pickle.HIGHEST_PROTOCOL)
+    start = _aligned(len(MAGIC) + 8 + len(head))
+
+    partial = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(partial, 'wb') as f:
+            f.write(MAGIC)
+            f.write(len(head).to_bytes(8, 'little'))
+            f.write(head)
+            for buffer, buffer_offset in zip(buffers, offsets):
+                f.seek(start + buffer_offset)
+                buffer.tofile(f)
+            f.truncate(start + offset)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    print(f"Rohdaten für weitere Analysen abgelegt: {path} ({os.path.getsize(path)} Bytes)")
+
+def attach(path: str, key: str):
+    """
+    Abgelegte Rohdaten einbinden; gibt (df_raw, df_grp) zurück oder None, wenn
+    die Datei fehlt oder zu anderen Eingabedateien gehört.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            print(f"{path} ist keine Rohdaten-Datei, Uploads werden eingelesen")
+            return None
+        head = pickle.loads(f.read(int.from_bytes(f.read(8), 'little')))
+        if head.get('version') != FRAMES_VERSION or head.get('key') != key:
+            print(f"{path} passt nicht zu den Eingabedateien, Uploads werden eingelesen")
+            return None
+        start = _aligned(f.tell())
+        # Privat abgebildet: lesende Prozesse teilen die Seiten, Schreibzugriffe bleiben im Prozess
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY) if os.path.getsize(path) > start else None
+
+    offsets = iter(head['offsets'])
+
+    def view(dtype, count):
+        """Puffer ohne Kopie aus den abgebildeten Seiten."""
+        offset = start + next(offsets)
+        return np.frombuffer(mapped, dtype=dtype, count=count, offset=offset) if count else np.empty(0, dtype=dtype)
+
+    frames = []
+    for frame in head['frames']:
+        rows = frame['rows']
+        arrays = {}
+        for position, column in enumerate(frame['layout']):
+            if column[0] == 'pickle':
+                values = column[1]
+            elif column[0] == 'objects':
+                _, dtype, offsets_dtype, count, size, others = column
+                codes = view(dtype, rows)
+                bounds = view(offsets_dtype, count + 1).tolist()
+                text = str(memoryview(view('u1', size)), 'utf-8', 'surrogatepass')
+                lookup = np.empty(count + len(others), dtype=object)
+                lookup[:count] = [text[bounds[n]:bounds[n + 1]] for n in range(count)]
+                lookup[count:] = others
+                values = lookup.take(codes)
+            else:
+                values = view(column[1], rows)
+            arrays[position] = values
+        df = pd.DataFrame(arrays, index=frame['index'], copy=False)
+        df.columns = frame['columns']
+        frames.append(df)
+    print(f"Rohdaten aus {path} übernommen (ohne erneutes Einlesen)")
+    return frames[0], frames[1]
+
+def load_shared(path: str, recl_files: list, grp_files: list, load):
+    """
+    Rohdaten aus `path`, falls ein anderer Prozess sie für dieselben Eingabedateien
+    schon abgelegt hat; sonst mit `load()` einlesen und für die nächsten ablegen.
+    """
+    from checkpoints import inputs_key
+
+    key = inputs_key(recl_files, grp_files)
+    try:
+        frames = attach(path, key)
+    except Exception as e:
+        print(f"Rohdaten aus {path} nicht lesbar, Uploads werden eingelesen: {e}")
+        frames = None
+    if frames is not None:
+        return frames
+
+    df_raw, df_grp = load()
+    try:
+        publish(df_raw, df_grp, path, key)
+    except Exception as e:
+        # Ohne abgelegte Rohdaten liest der nächste Prozess die Uploads selbst
+        print(f"Rohdaten konnten nicht abgelegt werden: {e}")
+    return df_raw, df_grp
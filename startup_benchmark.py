@@ -0,0 +1,125 @@
+"""
+Startzeit-Messung für Reads_excel_columns.py.
+
+Jeder Auftrag startet einen neuen Interpreter, die Startzeit fällt also pro
+Analyse an. Gemessen wird jeweils in frischen Prozessen:
+
+  - import:      Import des Moduls (darf pandas, numpy und openpyxl nicht laden)
+  - first_byte:  Zeit vom Start des Skripts bis zum ersten Byte auf stdout
+  - early_exit:  Gesamtlaufzeit, wenn die recl-Datei fehlt (Abbruch vor pandas)
+
+Liegt der Median einer Messung über dem Budget, endet das Skript mit Exit-Code 1.
+
+Aufruf:
+    python startup_benchmark.py
+    python startup_benchmark.py --runs 10 --import-budget 0.1 --recl recl.xlsx --grp grp.xlsx
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(BASE_DIR, 'Reads_excel_columns.py')
+
+# Module, die erst bei der eigentlichen Analyse geladen werden sollen
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl')
+
+# Budgets in Sekunden (Median über alle Läufe)
+DEFAULT_BUDGETS = {
+    'import': 0.15,
+    'first_byte': 0.30,
+    'early_exit': 0.30,
+}
+
+IMPORT_PROBE = f"""
+import json, sys, time
+sys.path.insert(0, {BASE_DIR!r})
+start = time.perf_counter()
+import Reads_excel_columns
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Startzeit von Reads_excel_columns.py messen')
+    parser.add_argument('--runs', type=int, default=5, help='Anzahl Läufe je Messung')
+    parser.add_argument('--recl', help='recl.xlsx für die first_byte-Messung (optional)')
+    parser.add_argument('--grp', help='grp.xlsx für die first_byte-Messung (optional)')
+    for name, budget in DEFAULT_BUDGETS.items():
+        parser.add_argument(f'--{name.replace("_", "-")}-budget', type=float, default=budget,
+                            help=f'Budget für {name} in Sekunden (Standard {budget})')
+    return parser.parse_args(argv)
+
+def measure_import():
+    """Importzeit des Moduls in einem frischen Interpreter und die dabei geladenen schweren Module."""
+    result = subprocess.run([sys.executable, '-c', IMPORT_PROBE], capture_output=True, text=True, check=True)
+    probe = json.loads(result.stdout)
+    return probe['elapsed'], probe['loaded']
+
+def measure_first_byte(cmd, cwd):
+    """Zeit vom Start bis zum ersten Byte auf stdout; der Prozess wird danach beendet."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        first = proc.stdout.read(1)
+        elapsed = time.perf_counter() - start
+    finally:
+        proc.kill()
+        proc.wait()
+        proc.stdout.close()
+    if not first:
+        raise RuntimeError(f"Keine Ausgabe von: {' '.join(cmd)}")
+    return elapsed
+
+def measure_early_exit(cwd):
+    """Gesamtlaufzeit bei fehlender recl-Datei."""
+    missing = os.path.join(cwd, 'fehlt.xlsx')
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, SCRIPT, '--recl', missing], cwd=cwd, capture_output=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode == 0:
+        raise RuntimeError("Fehlende recl-Datei wurde nicht erkannt")
+    return elapsed
+
+def main(argv=None):
+    args = parse_args(argv)
+    budgets = {name: getattr(args, f'{name}_budget') for name in DEFAULT_BUDGETS}
+    samples = {name: [] for name in DEFAULT_BUDGETS}
+    failures = []
+
+    with tempfile.TemporaryDirectory(prefix='startup_benchmark_') as work_dir:
+        if args.recl:
+            cmd = [sys.executable, SCRIPT, '--recl', os.path.abspath(args.recl)]
+            if args.grp:
+                cmd.extend(['--grp', os.path.abspath(args.grp)])
+        else:
+            cmd = [sys.executable, SCRIPT, '--recl', os.path.join(work_dir, 'fehlt.xlsx')]
+
+        for _ in range(args.runs):
+            elapsed, loaded = measure_import()
+            samples['import'].append(elapsed)
+            if loaded:
+                failures.append(f"Import lädt schwere Module: {', '.join(loaded)}")
+            samples['first_byte'].append(measure_first_byte(cmd, work_dir))
+            samples['early_exit'].append(measure_early_exit(work_dir))
+
+    print(f"Python {sys.version.split()[0]}, {args.runs} Läufe")
+    print(f"{'Messung':<12} {'Median':>9} {'Max':>9} {'Budget':>9}")
+    for name, values in samples.items():
+        median = statistics.median(values)
+        status = 'ok' if median <= budgets[name] else 'ZU LANGSAM'
+        print(f"{name:<12} {median:>8.3f}s {max(values):>8.3f}s {budgets[name]:>8.3f}s  {status}")
+        if median > budgets[name]:
+            failures.append(f"{name}: {median:.3f}s > Budget {budgets[name]:.3f}s")
+
+    for failure in dict.fromkeys(failures):
+        print(f"FEHLER: {failure}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Arbeitsverzeichnisse der Analysen mit Speicherplatz-Grenze.
+
+Alle temporären Verzeichnisse der Web-App (Uploads, Kopien für den
+Analyse-Prozess, Ergebnisdateien) liegen unter einem gemeinsamen
+Verzeichnis (ANALYSIS_WORK_DIR). Jedes Verzeichnis enthält eine Marke mit
+der Prozess-ID seines Besitzers; ihr Änderungsdatum ist das Alter des
+Verzeichnisses.
+
+Bei jedem neuen Verzeichnis räumt der Janitor auf:
+
+- Nicht mehr benutzte Verzeichnisse älter als ANALYSIS_WORK_DIR_MAX_AGE Sekunden
+  werden immer gelöscht (z.B. eines abgestürzten oder per Timeout beendeten
+  Workers). Noch benutzte bleiben, auch wenn sie älter sind.
+- Überschreitet der belegte Platz plus der erwartete Bedarf des neuen Auftrags
+  ANALYSIS_WORK_DIR_QUOTA_MB, werden nicht mehr benutzte Verzeichnisse gelöscht,
+  die ältesten zuerst. Nicht mehr benutzt: der Besitzer-Prozess läuft nicht mehr
+  (Absturz, gunicorn-Timeout), ist dieser Prozess und hat es freigegeben, oder
+  das Verzeichnis hat keinen Besitzer mehr (release, z.B. Vorschau-Aufträge).
+- Reicht der Platz danach nicht, wird der neue Auftrag mit WorkspaceFull
+  abgelehnt, statt mitten in der Analyse an einer vollen Platte zu scheitern.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+WORK_DIR = os.environ.get('ANALYSIS_WORK_DIR', os.path.join(tempfile.gettempdir(), 'beanstandungen_jobs'))
+# Name der Besitzer-Marke in jedem Arbeitsverzeichnis
+OWNER_FILE = '.owner'
+
+class WorkspaceFull(Exception):
+    """Kein Platz für einen neuen Auftrag; die App antwortet mit 507."""
+
+def _size(path: str) -> int:
+    """Belegte Bytes eines Verzeichnisses (rekursiv)."""
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(directory, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def _mb(size: int) -> str:
+    return f'{size / (1024 * 1024):.1f}'
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        # Prozess existiert, gehört aber einem anderen Benutzer
+        return True
+    return True
+
+class TempJanitor:
+    def __init__(self, root: str = WORK_DIR, quota_bytes: int = 2048 * 1024 * 1024, max_age: float = 3600.0):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.max_age = max_age
+        # Verzeichnisse dieses Prozesses, die noch benutzt werden
+        self._active = set()
+        self._lock = threading.Lock()
+
+        self.created_total = 0
+        self.evicted_expired = 0
+        self.evicted_quota = 0
+        self.refused_total = 0
+
+    @classmethod
+    def from_env(cls):
+        """Grenzen aus ANALYSIS_WORK_DIR_QUOTA_MB und ANALYSIS_WORK_DIR_MAX_AGE."""
+        return cls(
+            quota_bytes=int(float(os.environ.get('ANALYSIS_WORK_DIR_QUOTA_MB', 2048)) * 1024 * 1024),
+            max_age=float(os.environ.get('ANALYSIS_WORK_DIR_MAX_AGE', 3600)),
+        )
+
+    def _entries(self) -> list[tuple[float, str, int | None]]:
+        """(Zeitpunkt der Marke, Pfad, Besitzer-PID) aller Arbeitsverzeichnisse, die ältesten zuerst."""
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for entry in os.scandir(self.root):
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            marker = os.path.join(entry.path, OWNER_FILE)
+            try:
+                stamp = os.path.getmtime(marker)
+                with open(marker, encoding='utf-8') as f:
+                    owner = int(f.read().strip() or 0) or None
+            except (OSError, ValueError):
+                # Ohne Marke (halb angelegt oder von Hand kopiert): Alter des Verzeichnisses, kein Besitzer
+                stamp, owner = entry.stat(follow_symlinks=False).st_mtime, None
+            entries.append((stamp, entry.path, owner))
+        entries.sort()
+        return entries
+
+    def _in_use(self, path: str, owner: int | None) -> bool:
+        """Erwartet gehaltenen Lock."""
+        if owner == os.getpid():
+            return path in self._active
+        return owner is not None and _process_alive(owner)
+
+    def _delete(self, path: str):
+        shutil.rmtree(path, ignore_errors=True)
+        self._active.discard(path)
+
+    def sweep(self, needed: int = 0) -> int:
+        """
+        Abgelaufene Verzeichnisse löschen und, falls für `needed` Bytes der Platz
+        nicht reicht, nicht mehr benutzte Verzeichnisse (älteste zuerst).
+        Gibt den danach belegten Platz zurück. Erwartet gehaltenen Lock.
+        """
+        now = time.time()
+        remaining = []
+        for stamp, path, owner in self._entries():
+            # Noch benutzte Verzeichnisse (z.B. Uploads eines langen ZIP-Exports) bleiben auch nach Ablauf
+            if now - stamp > self.max_age and not self._in_use(path, owner):
+                self._delete(path)
+                self.evicted_expired += 1
+                print(f"Arbeitsverzeichnis nach {now - stamp:.0f}s gelöscht: {path}")
+            else:
+                remaining.append((stamp, path, owner, _size(path)))
+
+        used = sum(size for *_, size in remaining)
+        for stamp, path, owner, size in remaining:
+            if used + needed <= self.quota_bytes:
+                break
+            if self._in_use(path, owner):
+                continue
+            self._delete(path)
+            used -= size
+            self.evicted_quota += 1
+            print(f"Arbeitsverzeichnis wegen Speichergrenze gelöscht ({size} Bytes): {path}")
+        return used
+
+    def create(self, prefix: str, needed: int = 0) -> str:
+        """
+        Neues Arbeitsverzeichnis für einen Auftrag, der voraussichtlich `needed`
+        Bytes belegt. Wirft WorkspaceFull, wenn der Platz auch nach dem Aufräumen
+        nicht reicht.
+        """
+        with self._lock:
+            used = self.sweep(needed)
+            if used + needed > self.quota_bytes:
+                self.refused_total += 1
+                raise WorkspaceFull(
+                    f"Nicht genügend Speicherplatz für die Analyse: {_mb(used)} MB belegt, {_mb(needed)} MB benötigt, "
+                    f"Grenze {_mb(self.quota_bytes)} MB. Bitte später erneut versuchen."
+                )
+            os.makedirs(self.root, exist_ok=True)
+            path = tempfile.mkdtemp(prefix=prefix.replace(os.sep, '_'), dir=self.root)
+            with open(os.path.join(path, OWNER_FILE), 'w', encoding='utf-8') as f:
+                f.write(str(os.getpid()))
+            self._active.add(path)
+            self.created_total += 1
+            return path
+
+    def touch(self, path: str):
+        """Verzeichnis wird noch benutzt (z.B. Uploads eines langen ZIP-Exports): Alter neu beginnen."""
+        try:
+            os.utime(os.path.join(path, OWNER_FILE))
+        except OSError:
+            pass
+
+    def release(self, path: str):
+        """
+        Verzeichnis bleibt liegen, gehört aber keinem Prozess mehr (z.B. Vorschau-Aufträge,
+        die jeder Worker lesen darf): es läuft nach dem Höchstalter ab und darf bei
+        Platzmangel gelöscht werden.
+        """
+        with self._lock:
+            try:
+                with open(os.path.join(path, OWNER_FILE), 'w', encoding='utf-8'):
+                    pass
+            except OSError:
+                pass
+            self._active.discard(path)
+
+    def remove(self, path: str):
+        """Verzeichnis löschen und freigeben."""
+        with self._lock:
+            self._delete(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._entries()
+            return {
+                'workdir_quota_bytes': self.quota_bytes,
+                'workdir_max_age_seconds': self.max_age,
+                'workdir_bytes': sum(_size(path) for _, path, _ in entries),
+                'workdir_dirs': len(entries),
+                'workdir_created_total': self.created_total,
+                'workdir_evicted_expired': self.evicted_expired,
+                'workdir_evicted_quota': self.evicted_quota,
+                'workdir_refused_total': self.refused_total,
+            }
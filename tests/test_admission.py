@@ -0,0 +1,140 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+from job_control import Job, JobStopped
+
+def wait_until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Bedingung nicht rechtzeitig erfüllt"
+        time.sleep(0.01)
+
+def queue_waiter(controller, client: str, **kwargs):
+    """Startet einen Thread, der für `client` wartet; kehrt zurück, sobald er in der Warteschlange steht."""
+    result = {}
+    depth = controller.stats()['queue_depth']
+
+    def run():
+        try:
+            controller.acquire(client, **kwargs)
+            result['admitted'] = True
+        except Exception as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    wait_until(lambda: controller.stats()['queue_depth'] > depth)
+    return thread, result
+
+def test_free_slot_is_taken_without_queueing():
+    controller = AdmissionController(max_active=2)
+    controller.acquire('a')
+    controller.acquire('b')
+    stats = controller.stats()
+    assert stats['active'] == 2
+    assert stats['queue_depth'] == 0
+
+def test_slots_are_handed_out_round_robin_across_clients():
+    controller = AdmissionController(max_active=1, max_queue=10, max_queue_per_client=5, queue_timeout=5)
+    controller.acquire('holder')
+    order = []
+    lock = threading.Lock()
+    threads = []
+
+    def run(label: str):
+        controller.acquire(label[0])
+        with lock:
+            order.append(label)
+        controller.release()
+
+    # Client a stellt drei Anfragen vor den zwei von Client b
+    for label in ('a1', 'a2', 'a3', 'b1', 'b2'):
+        depth = controller.stats()['queue_depth']
+        thread = threading.Thread(target=run, args=(label,), daemon=True)
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: controller.stats()['queue_depth'] > depth)
+
+    controller.release()
+    for thread in threads:
+        thread.join(2)
+    assert order == ['a1', 'b1', 'a2', 'b2', 'a3']
+    assert controller.stats()['active'] == 0
+
+def test_per_client_limit_rejects_with_retry_after():
+    controller = AdmissionController(max_active=1, max_queue=10, max_queue_per_client=1, queue_timeout=5)
+    controller.acquire('holder')
+    thread, _ = queue_waiter(controller, 'a')
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire('a')
+    assert rejected.value.retry_after >= 1
+    # Andere Clients dürfen weiter warten
+    controller.check('b')
+    stats = controller.stats()
+    assert stats['rejected_user_limit'] == 1
+    assert stats['queue_depth_per_user'] == {'a': 1}
+
+    controller.release()
+    thread.join(2)
+
+def test_full_queue_rejects_with_retry_after():
+    controller = AdmissionController(max_active=1, max_queue=1, max_queue_per_client=5, queue_timeout=5,
+                                     initial_duration=30)
+    controller.acquire('holder')
+    thread, _ = queue_waiter(controller, 'a')
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire('b')
+    # Ein wartender Auftrag plus der neue bei einem Platz: zwei Runden zu je 30s
+    assert rejected.value.retry_after == 60
+    with pytest.raises(AdmissionRejected):
+        controller.check('b')
+    assert controller.stats()['rejected_queue_full'] == 2
+
+    # Folgeaufträge (bounded=False) warten trotz voller Warteschlange
+    unbounded, result = queue_waiter(controller, 'b', bounded=False)
+    controller.release()
+    thread.join(2)
+    controller.release()
+    unbounded.join(2)
+    assert result == {'admitted': True}
+
+def test_queue_timeout_leaves_the_queue():
+    controller = AdmissionController(max_active=1, queue_timeout=0.2)
+    controller.acquire('holder')
+
+    start = time.monotonic()
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire('a')
+    assert time.monotonic() - start >= 0.2
+    assert rejected.value.retry_after >= 1
+    stats = controller.stats()
+    assert stats['rejected_timeout'] == 1
+    assert stats['queue_depth'] == 0
+    assert stats['queue_depth_per_user'] == {}
+
+def test_cancelled_job_leaves_the_queue():
+    controller = AdmissionController(max_active=1, queue_timeout=30)
+    controller.acquire('holder')
+    job = Job('0123abcd', timeout=None)
+    thread, result = queue_waiter(controller, 'a', job=job)
+
+    start = time.monotonic()
+    job.cancel()
+    thread.join(2)
+    # Innerhalb eines Prüfintervalls, nicht erst nach queue_timeout
+    assert time.monotonic() - start < 2
+    assert isinstance(result.get('error'), JobStopped)
+    assert result['error'].reason == 'cancelled'
+    assert job.reason == 'cancelled'
+    stats = controller.stats()
+    assert stats['queue_depth'] == 0
+    assert stats['cancelled_waiting_total'] == 1
+
+    # Der abgebrochene Auftrag bekommt den frei werdenden Platz nicht
+    controller.release()
+    assert controller.stats()['active'] == 0
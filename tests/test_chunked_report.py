@@ -0,0 +1,31 @@
+import io
+
+import openpyxl
+import pytest
+
+from load_test import make_synthetic_uploads
+from Reads_excel_columns import run_pipeline
+
+def sheets(output) -> list:
+    """(Registerkarte, Zeilen) der Ergebnisdatei in Reihenfolge."""
+    output.seek(0)
+    workbook = openpyxl.load_workbook(output, read_only=True)
+    return [(ws.title, list(ws.iter_rows(values_only=True))) for ws in workbook.worksheets]
+
+@pytest.fixture(scope='module')
+def uploads(tmp_path_factory):
+    return make_synthetic_uploads(str(tmp_path_factory.mktemp('uploads')), rows=300, month='July', seed=1)
+
+@pytest.mark.parametrize('month, username', [(None, None), ('July', None), ('July', 'arval1'), ('March', 'nobody')])
+@pytest.mark.parametrize('chunk_size', [1, 37])
+def test_chunked_output_matches_normal_path(uploads, tmp_path, month, username, chunk_size):
+    recl, grp = uploads
+    user_directory = str(tmp_path / 'user_regionen.db')
+
+    normal, chunked = io.BytesIO(), io.BytesIO()
+    run_pipeline(recl, grp, month, username, output=normal, user_directory=user_directory)
+    run_pipeline(recl, grp, month, username, output=chunked, chunk_size=chunk_size, user_directory=user_directory)
+
+    expected = sheets(normal)
+    assert [title for title, _ in sheets(chunked)] == [title for title, _ in expected]
+    assert sheets(chunked) == expected
@@ -0,0 +1,57 @@
+import os
+import signal
+import sys
+import time
+
+import pytest
+
+import job_control
+from job_control import run_process
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'killpg'), reason='Prozessgruppen nur unter POSIX')
+
+# Startet einen "Pool-Prozess" in derselben Gruppe, der den Hauptprozess überlebt, und gibt seine PID aus
+LEFTOVER = '''
+import subprocess, sys
+child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+print(child.pid)
+'''
+
+def alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # Zombie (noch nicht von init abgeholt) zählt als beendet
+    with open(f'/proc/{pid}/stat') as f:
+        return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+
+@pytest.fixture
+def signals(monkeypatch):
+    """Zeichnet die an Prozessgruppen geschickten Signale auf (0 = nur Prüfung)."""
+    sent = []
+    killpg = os.killpg
+
+    def record(pgid, sig):
+        sent.append(sig)
+        killpg(pgid, sig)
+    monkeypatch.setattr(job_control.os, 'killpg', record)
+    return sent
+
+def test_clean_exit_sends_no_kill(tmp_path, signals):
+    result = run_process([sys.executable, '-c', 'print("ok")'], str(tmp_path))
+
+    assert result.returncode == 0 and result.stdout.strip() == 'ok'
+    # Gruppe leer: nur die Prüfung, kein SIGKILL an eine womöglich neu vergebene Gruppen-ID
+    assert signals == [0]
+
+def test_leftover_pool_processes_are_killed(tmp_path, signals):
+    result = run_process([sys.executable, '-c', LEFTOVER], str(tmp_path))
+    child = int(result.stdout)
+
+    assert signals == [0, signal.SIGKILL]
+    deadline = time.monotonic() + 5
+    while alive(child) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not alive(child)
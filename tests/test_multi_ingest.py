@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+from multi_ingest import RECL_DATE_COLUMN, RECL_HEADER_ROW, merge_frames
+
+def raw_frame(rows, header=('Nr', 'Datum', 'Thema')) -> pd.DataFrame:
+    """Rohdaten wie pd.read_excel(header=None): Vorspann-Zeile, Header, Datenzeilen."""
+    return pd.DataFrame([['Export', None, None], list(header)] + [list(row) for row in rows], dtype=object)
+
+def data_rows(merged: pd.DataFrame) -> list:
+    return [tuple(row) for row in merged.iloc[2:].itertuples(index=False, name=None)]
+
+def test_duplicates_across_files_are_removed_and_rows_sorted_by_date():
+    first = raw_frame([(1, '03.01.2025', 'Motor'), (2, '01.01.2025', 'Reifen'), (3, '02.01.2025', 'Motor')])
+    second = raw_frame([(3, '02.01.2025', 'Motor'), (4, '04.01.2025', 'Elektrik')])
+
+    merged = merge_frames([first, second], header_row=1, date_column=1)
+
+    # Vorspann und Header aus der ersten Datei
+    assert list(merged.iloc[0]) == ['Export', None, None]
+    assert list(merged.iloc[1]) == ['Nr', 'Datum', 'Thema']
+    assert [row[0] for row in data_rows(merged)] == [2, 3, 1, 4]
+    assert list(merged.iloc[2:, 1]) == list(pd.to_datetime(['2025-01-01', '2025-01-02', '2025-01-03', '2025-01-04']))
+
+def test_unparsed_dates_go_last_in_file_order():
+    first = raw_frame([(1, 'unbekannt', 'Motor'), (2, '02.01.2025', 'Reifen')])
+    second = raw_frame([(3, None, 'Motor'), (4, '01.01.2025', 'Reifen')])
+
+    merged = merge_frames([first, second], header_row=1, date_column=1)
+    assert [row[0] for row in data_rows(merged)] == [4, 2, 1, 3]
+
+def test_header_mismatch_raises_value_error():
+    first = raw_frame([(1, '01.01.2025', 'Motor')])
+    shifted = raw_frame([(2, '02.01.2025', 'Motor')], header=('Nr', 'Thema', 'Datum'))
+
+    with pytest.raises(ValueError, match='Datei 2'):
+        merge_frames([first, shifted], header_row=1, date_column=1)
+    with pytest.raises(ValueError, match='Header-Zeile'):
+        merge_frames([first.iloc[:1]], header_row=1, date_column=1)
+
+def test_overlapping_splits_give_the_rows_of_the_single_file(tmp_path):
+    from load_test import make_synthetic_uploads
+
+    recl, _ = make_synthetic_uploads(str(tmp_path), rows=200, month='July')
+    single = pd.read_excel(recl, header=None, engine='openpyxl')
+    first_data = RECL_HEADER_ROW + 1
+    # Zwei Exporte, die sich um 50 Zeilen überschneiden
+    split = first_data + 120
+    first = single.iloc[:split]
+    second = pd.concat([single.iloc[:first_data], single.iloc[split - 50:]], ignore_index=True)
+
+    expected = merge_frames([single], RECL_HEADER_ROW, RECL_DATE_COLUMN)
+    merged = merge_frames([first, second], RECL_HEADER_ROW, RECL_DATE_COLUMN)
+    pd.testing.assert_frame_equal(merged, expected)
@@ -0,0 +1,36 @@
+import pytest
+
+from job_control import Job, JobStopped
+from load_test import make_synthetic_uploads
+from quick_look import quick_look
+
+@pytest.fixture(scope='module')
+def uploads(tmp_path_factory):
+    return make_synthetic_uploads(str(tmp_path_factory.mktemp('uploads')), rows=200, month=None, seed=1)
+
+def test_small_export_is_read_completely(uploads):
+    recl, grp = uploads
+    result = quick_look(recl, grp, sample_size=1000)
+
+    # Stichprobe größer als die Datei: alle Zeilen, Werte exakt
+    assert result['exact'] and result['sampled'] == result['population'] == 200
+    hauptthema = next(iter(result['tables'].values()))
+    assert hauptthema['Hauptthema'].iloc[-1] == 'Gesamt'
+
+def test_cancelled_job_stops_between_passes(uploads):
+    recl, grp = uploads
+    job = Job('abc', timeout=None)
+    job.cancel()
+
+    with pytest.raises(JobStopped, match='abgebrochen vor Durchlauf 1') as stopped:
+        quick_look(recl, grp, job=job)
+    assert stopped.value.reason == 'cancelled'
+
+def test_deadline_stops_the_quick_look(uploads):
+    recl, grp = uploads
+    job = Job('abc', timeout=1)
+    job.deadline = 0.0
+
+    with pytest.raises(JobStopped, match='Frist') as stopped:
+        quick_look(recl, grp, job=job)
+    assert stopped.value.reason == 'timeout'
@@ -0,0 +1,102 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from temp_janitor import OWNER_FILE, TempJanitor, WorkspaceFull
+
+@pytest.fixture
+def dead_pid():
+    """PID eines beendeten Prozesses."""
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+@pytest.fixture
+def live_pid():
+    """PID eines laufenden anderen Prozesses (z.B. eines anderen gunicorn-Workers)."""
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+    yield process.pid
+    process.kill()
+    process.wait()
+
+def work_dir(root, name: str, owner: int | None, age: float = 0.0, size: int = 0) -> str:
+    """Arbeitsverzeichnis wie von TempJanitor.create, mit Besitzer, Alter und Inhalt."""
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    with open(os.path.join(path, 'data.bin'), 'wb') as f:
+        f.write(b'x' * size)
+    marker = os.path.join(path, OWNER_FILE)
+    with open(marker, 'w', encoding='utf-8') as f:
+        f.write(str(owner or ''))
+    stamp = time.time() - age
+    os.utime(marker, (stamp, stamp))
+    return path
+
+def test_expired_directories_of_finished_processes_are_removed(tmp_path, dead_pid):
+    janitor = TempJanitor(str(tmp_path), max_age=60)
+    expired = work_dir(tmp_path, 'expired', dead_pid, age=120)
+    orphan = work_dir(tmp_path, 'orphan', None, age=120)
+    fresh = work_dir(tmp_path, 'fresh', dead_pid, age=10)
+
+    janitor.create('job_')
+    assert not os.path.exists(expired)
+    assert not os.path.exists(orphan)
+    assert os.path.exists(fresh)
+    assert janitor.stats()['workdir_evicted_expired'] == 2
+
+def test_expired_directories_still_in_use_are_kept(tmp_path, live_pid):
+    janitor = TempJanitor(str(tmp_path), max_age=0.05)
+    other_worker = work_dir(tmp_path, 'other_worker', live_pid, age=120)
+    own = janitor.create('own_')
+    released = janitor.create('released_')
+    janitor.release(released)
+    time.sleep(0.1)
+
+    janitor.create('job_')
+    # Besitzer-Prozess läuft noch bzw. Verzeichnis dieses Prozesses noch nicht freigegeben
+    assert os.path.exists(other_worker)
+    assert os.path.exists(own)
+    assert not os.path.exists(released)
+
+def test_quota_evicts_oldest_unused_directories_first(tmp_path, dead_pid, live_pid):
+    janitor = TempJanitor(str(tmp_path), quota_bytes=3100, max_age=3600)
+    in_use = work_dir(tmp_path, 'in_use', live_pid, age=300, size=1000)
+    oldest = work_dir(tmp_path, 'oldest', dead_pid, age=200, size=1000)
+    newer = work_dir(tmp_path, 'newer', dead_pid, age=100, size=1000)
+
+    # Gut 3000 belegt, 1000 benötigt: nur das älteste nicht mehr benutzte Verzeichnis muss weichen
+    janitor.create('job_', needed=1000)
+    assert os.path.exists(in_use)
+    assert not os.path.exists(oldest)
+    assert os.path.exists(newer)
+    assert janitor.stats()['workdir_evicted_quota'] == 1
+
+def test_workspace_full_when_directories_in_use_fill_the_quota(tmp_path, live_pid):
+    janitor = TempJanitor(str(tmp_path), quota_bytes=1500, max_age=3600)
+    in_use = work_dir(tmp_path, 'in_use', live_pid, size=1000)
+
+    with pytest.raises(WorkspaceFull):
+        janitor.create('job_', needed=1000)
+    assert os.path.exists(in_use)
+    stats = janitor.stats()
+    assert stats['workdir_refused_total'] == 1
+    assert stats['workdir_dirs'] == 1
+
+def test_workspace_full_is_answered_with_507(tmp_path, monkeypatch):
+    import app as web
+    from load_test import make_synthetic_uploads
+
+    recl, grp = make_synthetic_uploads(str(tmp_path), rows=20, month=None)
+    monkeypatch.setattr(web, 'LOG_FILE', str(tmp_path / 'analysis.log'))
+    monkeypatch.setattr(web.workspace, 'root', str(tmp_path / 'work'))
+    monkeypatch.setattr(web.workspace, 'quota_bytes', 1)
+
+    with open(recl, 'rb') as recl_file, open(grp, 'rb') as grp_file:
+        response = web.app.test_client().post('/preview', data={
+            'month': '', 'recl': (recl_file, 'recl.xlsx'), 'grp': (grp_file, 'grp.xlsx'),
+        })
+    assert response.status_code == 507
+    assert 'Speicherplatz' in response.get_data(as_text=True)
@@ -0,0 +1,302 @@
+"""
+Schnelle Vorprüfung der hochgeladenen recl- und grp-Dateien.
+
+Die Dateien werden nur lesend als xlsx-Archiv geöffnet; gelesen werden nur
+die Zeilen bis zur Header-Zeile (openpyxl würde auch im read-only Modus alle
+Shared Strings laden, was bei großen Exporten Sekunden dauert). Geprüft wird
+nur die Header-Zeile: die Spaltenanzahl und die Bezeichnungen der Spalten, auf
+die sich die Analyse stützt (RECL_LABELS, GRP_LABELS). Verglichen wird ohne
+Leerzeichen am Rand und ohne Groß-/Kleinschreibung; weicht der ERP-Export ab,
+lassen sich die Bezeichnungen per Umgebungsvariable ersetzen, z.B.
+
+    UPLOAD_RECL_LABELS='E=Erfasst am|Erfasst;S=Rolle'
+
+(Spalte=Bezeichnung, mehrere zulässige mit |; nicht genannte Spalten behalten
+ihre Standardbezeichnung, eine leere Bezeichnung lässt jede zu). Die Werte der
+Datenzeilen (Rolle 'Einsteller', Status, 'Verkauft') filtert die Analyse
+selbst; ein Export, dessen erste Zeilen z.B. nur offene Fälle enthalten, ist
+gültig.
+
+Jede Prüfung liefert eine Liste von Fehlermeldungen; eine leere Liste heißt,
+dass die Datei verarbeitet werden kann.
+
+Derselbe Leser streamt für die Schnellansicht (quick_look.py) ganze
+Tabellenblätter spaltenweise (iter_rows).
+"""
+import os
+import zipfile
+from contextlib import closing
+from functools import lru_cache
+import xml.etree.ElementTree as ET
+
+# recl: Zeilen 0-2 sind Vorspann, Zeile 3 ist der Header (siehe Schritt 2)
+RECL_HEADER_ROW = 3
+# Spaltenpositionen in der Original-Datei (vor dem Entfernen der Spalten)
+RECL_DECISION_COLUMN = 19
+RECL_MIN_COLUMNS = RECL_DECISION_COLUMN + 1
+# Erwartete Bezeichnungen: Datum (E), User (H), Status (J), Hauptthema (N), Rolle (S), Entscheid (T)
+RECL_LABELS = {'E': ('Erfasst',), 'H': ('Benutzer',), 'J': ('Status',),
+               'N': ('Hauptthema',), 'S': ('Rolle',), 'T': ('Entscheid',)}
+
+# grp: Zeile 0 ist der Header
+GRP_HEADER_ROW = 0
+# Gruppenreporting übernimmt die Spalten 2, 3, 4, 5, 8 und 15
+GRP_MIN_COLUMNS = 16
+# Erwartete Bezeichnungen: Status 'Verkauft' (C), User (D), Datum (I)
+GRP_LABELS = {'C': ('Status',), 'D': ('Benutzer',), 'I': ('Datum',)}
+
+NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+def _column_name(position: int) -> str:
+    """Excel-Spaltenbuchstabe zur 0-basierten Position, z.B. 18 -> 'S'."""
+    name = ''
+    position += 1
+    while position:
+        position, rest = divmod(position - 1, 26)
+        name = chr(65 + rest) + name
+    return name
+
+@lru_cache(maxsize=None)
+def _column_index(ref: str) -> int:
+    """0-basierte Spaltenposition aus einer Zellreferenz, z.B. 'S5' -> 18."""
+    index = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+def _row_width(row) -> int:
+    width = len(row)
+    while width and (row[width - 1] is None or (isinstance(row[width - 1], str) and not row[width - 1].strip())):
+        width -= 1
+    return width
+
+def _normalize(label) -> str:
+    """Bezeichnung für den Vergleich: ohne Leerzeichen am Rand und mehrfache Leerzeichen, klein."""
+    return ' '.join(str(label).split()).casefold()
+
+def _labels(defaults: dict, variable: str) -> dict:
+    """
+    Erwartete Bezeichnungen (0-basierte Position -> zulässige Bezeichnungen);
+    Einträge aus der Umgebungsvariable `variable` ersetzen die Standardwerte.
+    """
+    labels = dict(defaults)
+    for entry in os.environ.get(variable, '').split(';'):
+        if entry.strip():
+            column, _, names = entry.partition('=')
+            labels[column.strip().upper()] = tuple(name for name in names.split('|') if name.strip())
+    return {_column_index(column): names for column, names in labels.items()}
+
+def _first_sheet_path(zf) -> str:
+    """Pfad des ersten Tabellenblatts im xlsx-Archiv."""
+    try:
+        workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+        rel_id = workbook.find(f'{NS}sheets/{NS}sheet').get(f'{REL_NS}id')
+        rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+        for rel in rels.iter(f'{PKG_REL_NS}Relationship'):
+            if rel.get('Id') == rel_id:
+                target = rel.get('Target')
+                return target.lstrip('/') if target.startswith('/') else 'xl/' + target
+    except (KeyError, AttributeError, ET.ParseError):
+        pass
+    return 'xl/worksheets/sheet1.xml'
+
+def _cell_value(cell, shared: set):
+    """Wert einer <c>-Zelle; Verweise auf Shared Strings werden als ('s', index) vorgemerkt."""
+    kind = cell.get('t', 'n')
+    if kind == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iter(f'{NS}t'))
+    value = cell.find(f'{NS}v')
+    if value is None or value.text is None:
+        return None
+    if kind == 's':
+        index = int(value.text)
+        shared.add(index)
+        return ('s', index)
+    if kind in ('str', 'd'):
+        return value.text
+    if kind == 'e':
+        return None
+    if kind == 'b':
+        return value.text == '1'
+    number = float(value.text)
+    return int(number) if number.is_integer() else number
+
+def _shared_strings(zf, needed: set | None) -> dict:
+    """Liest sharedStrings.xml nur bis zum höchsten benötigten Index (None: alle)."""
+    strings = {}
+    if needed is not None and not needed:
+        return strings
+    try:
+        f = zf.open('xl/sharedStrings.xml')
+    except KeyError:
+        return strings
+    highest = max(needed) if needed is not None else None
+    with f:
+        index = 0
+        for _, elem in ET.iterparse(f):
+            if elem.tag != f'{NS}si':
+                continue
+            if needed is None or index in needed:
+                # Text direkt in <t> oder in formatierten Abschnitten <r><t>, ohne Lautschrift <rPh>
+                parts = [elem.find(f'{NS}t')] + [run.find(f'{NS}t') for run in elem.findall(f'{NS}r')]
+                strings[index] = ''.join(part.text or '' for part in parts if part is not None)
+            elem.clear()
+            index += 1
+            if highest is not None and index > highest:
+                break
+    return strings
+
+def _sheet_rows(zf):
+    """
+    (0-basierte Zeilennummer, <row>-Element) des ersten Tabellenblatts; fehlende
+    (leere) Zeilen stehen nicht im Archiv. Das Element wird danach geleert.
+    """
+    number = -1
+    with zf.open(_first_sheet_path(zf)) as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag != f'{NS}row':
+                continue
+            number = int(elem.get('r')) - 1 if elem.get('r') else number + 1
+            yield number, elem
+            elem.clear()
+
+def _row_cells(row, shared: set, columns=None) -> dict:
+    """{0-basierte Spalte: Wert} einer <row>, mit `columns` nur diese Spalten."""
+    cells = {}
+    for position, cell in enumerate(row.iter(f'{NS}c')):
+        ref = cell.get('r')
+        # nur die Buchstaben, damit der Cache je Spalte greift
+        column = _column_index(ref.rstrip('0123456789')) if ref else position
+        if columns is None or column in columns:
+            cells[column] = _cell_value(cell, shared)
+    return cells
+
+def iter_rows(source, columns=None):
+    """
+    Streamt das erste Tabellenblatt von `source` (Pfad oder Puffer) und liefert
+    (0-basierte Zeilennummer, {Spalte: Wert}), mit `columns` nur für diese
+    Spalten. Shared Strings werden vorab vollständig gelesen.
+    """
+    with zipfile.ZipFile(source) as zf:
+        strings = _shared_strings(zf, None)
+        with closing(_sheet_rows(zf)) as rows:
+            for number, row in rows:
+                cells = _row_cells(row, set(), columns)
+                yield number, {column: strings.get(value[1]) if isinstance(value, tuple) else value
+                               for column, value in cells.items()}
+
+def _read_header(source, header_row: int):
+    """
+    Liest die Header-Zeile direkt aus dem xlsx-Archiv; None, wenn die Datei
+    weniger Zeilen hat. Vom Tabellenblatt werden nur die Zeilen bis zur
+    Header-Zeile gelesen, von den Shared Strings nur der Anfang.
+    """
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    try:
+        with zipfile.ZipFile(source) as zf:
+            header, shared = None, set()
+            with closing(_sheet_rows(zf)) as rows:
+                for number, row in rows:
+                    if number > header_row:
+                        break
+                    if number == header_row:
+                        header = _row_cells(row, shared)
+                        break
+            strings = _shared_strings(zf, shared)
+    finally:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+    if header is None:
+        return None
+    row = [None] * (max(header) + 1 if header else 0)
+    for position, value in header.items():
+        row[position] = strings.get(value[1]) if isinstance(value, tuple) else value
+    return tuple(row)
+
+def _open(label: str, source, header_row: int, allow_pdf: bool = False):
+    from pdf_ingest import is_pdf
+    if allow_pdf and is_pdf(source):
+        # PDF-Tabelle: Header ist die erste Tabellenzeile der ersten Seite
+        from pdf_ingest import read_head
+        try:
+            return read_head(source, 0)[0], []
+        except Exception as e:
+            return None, [f"{label}: PDF konnte nicht gelesen werden: {e}"]
+    try:
+        return _read_header(source, header_row), []
+    except (zipfile.BadZipFile, KeyError, OSError, ValueError, ET.ParseError) as e:
+        return None, [f"{label}: Datei ist keine gültige Excel-Datei (.xlsx){' oder PDF' if allow_pdf else ''}: {e}"]
+
+def _wrong_labels(header, expected: dict) -> list[str]:
+    """Abweichende Bezeichnungen der Header-Zeile als "Spalte X heißt '...', erwartet '...'"."""
+    wrong = []
+    for position, names in sorted(expected.items()):
+        value = header[position] if position < len(header) else None
+        if names and (value is None or _normalize(value) not in {_normalize(name) for name in names}):
+            wrong.append(f"Spalte {_column_name(position)} heißt {'' if value is None else str(value)!r}, "
+                         f"erwartet {' oder '.join(repr(name) for name in names)}")
+    return wrong
+
+def validate_recl(source) -> list[str]:
+    """Prüft die Header-Zeile einer recl-Datei (Pfad oder Puffer, xlsx oder PDF)."""
+    header, errors = _open('recl', source, RECL_HEADER_ROW, allow_pdf=True)
+    if errors:
+        return errors
+
+    if header is None:
+        return [f"recl: Datei hat weniger als {RECL_HEADER_ROW + 1} Zeilen, Header-Zeile {RECL_HEADER_ROW + 1} fehlt"]
+    width = _row_width(header)
+    if width < RECL_MIN_COLUMNS:
+        return [f"recl: Header-Zeile {RECL_HEADER_ROW + 1} hat {width} Spalten, erwartet mindestens "
+                f"{RECL_MIN_COLUMNS} (bis Spalte {_column_name(RECL_MIN_COLUMNS - 1)}). "
+                f"Wurde die grp-Datei ins recl-Feld gelegt?"]
+    wrong = _wrong_labels(header, _labels(RECL_LABELS, 'UPLOAD_RECL_LABELS'))
+    if wrong:
+        return [f"recl: Header-Zeile {RECL_HEADER_ROW + 1}: {'; '.join(wrong[:3])}. Sind die Spalten verschoben, "
+                f"fehlen die Vorspann-Zeilen oder wurde die grp-Datei ins recl-Feld gelegt?"]
+    return errors
+
+def validate_grp(source) -> list[str]:
+    """Prüft die Header-Zeile einer Gruppenreporting-Datei (Pfad oder Puffer)."""
+    header, errors = _open('grp', source, GRP_HEADER_ROW)
+    if errors:
+        return errors
+
+    if header is None:
+        return ["grp: Datei ist leer"]
+    width = _row_width(header)
+    if width < GRP_MIN_COLUMNS:
+        return [f"grp: Header-Zeile hat {width} Spalten, erwartet mindestens {GRP_MIN_COLUMNS} "
+                f"(bis Spalte {_column_name(GRP_MIN_COLUMNS - 1)}). Wurde die recl-Datei ins grp-Feld gelegt?"]
+    wrong = _wrong_labels(header, _labels(GRP_LABELS, 'UPLOAD_GRP_LABELS'))
+    if wrong:
+        return [f"grp: Header-Zeile: {'; '.join(wrong[:3])}. Sind die Spalten verschoben, fehlt die Header-Zeile "
+                f"oder wurde die recl-Datei ins grp-Feld gelegt?"]
+    return errors
+
+def _each(validate, sources) -> list[str]:
+    """Prüft eine Datei oder eine Liste von Dateien; bei mehreren mit Dateiangabe in der Meldung."""
+    if not isinstance(sources, (list, tuple)):
+        return validate(sources)
+    errors = []
+    for number, source in enumerate(sources, start=1):
+        name = os.path.basename(source) if isinstance(source, str) else f"Datei {number}"
+        messages = validate(source)
+        errors += [f"[{name}] {message}" for message in messages] if len(sources) > 1 else messages
+    return errors
+
+def validate_uploads(recl, grp=None) -> list[str]:
+    """
+    Prüft recl und (falls vorhanden) grp; gibt alle Fehlermeldungen zurück.
+    Beide können auch Listen von Dateien sein.
+    """
+    errors = _each(validate_recl, recl)
+    if grp is not None:
+        errors += _each(validate_grp, grp)
+    return errors
@@ -0,0 +1,164 @@
+"""
+Dauerhaftes Verzeichnis User -> PLZ, Region, Standort (SQLite).
+
+Bisher wurden PLZ, Region und Standort in der Registerkarte "User Regionen"
+nach jedem Lauf von Hand ausgefüllt. Das Verzeichnis wird einmal gepflegt
+(z.B. aus einer ausgefüllten Ergebnisdatei importiert) und bei jeder Analyse
+per Merge an die User-Liste angehängt.
+
+Im Prozess wird das Verzeichnis zwischengespeichert und nur neu geladen, wenn
+sich die Datei geändert hat.
+
+Aufruf:
+    python user_directory.py import Ergebnis_March.xlsx
+    python user_directory.py import regionen.csv --db /pfad/user_regionen.db
+    python user_directory.py show
+"""
+import argparse
+import os
+import sqlite3
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DIRECTORY = os.environ.get('USER_DIRECTORY', os.path.join(BASE_DIR, 'user_regionen.db'))
+
+# Benutzerliste für das Formular, den ZIP-Export aller User und die vorberechneten Berichte (drop_folder.py)
+USERNAMES = [
+    'Schweizz', 'leo2810', 'RRGLEM', 'arval1', 'bankno', 'alpher', 'SixtRAC',
+    'Allianz2', 'mosocc', 'tesla01', 'gemone', 'RRGSIL', 'gautsc', 'rssavo', 'BMWLea'
+]
+
+# Spalten wie in der Registerkarte "User Regionen" (inkl. der bestehenden Schreibweise "Stadort")
+COLUMNS = ['User', 'PLZ', 'Region', 'Stadort']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_regionen (
+    user     TEXT PRIMARY KEY,
+    plz      TEXT NOT NULL DEFAULT '',
+    region   TEXT NOT NULL DEFAULT '',
+    standort TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_user_regionen_region ON user_regionen (region);
+CREATE INDEX IF NOT EXISTS idx_user_regionen_standort ON user_regionen (standort);
+"""
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def _connect(path: str):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+def _empty():
+    import pandas as pd
+    return pd.DataFrame({column: pd.Series(dtype=object) for column in COLUMNS})
+
+def load_directory(path: str | None = None):
+    """
+    Liefert das Verzeichnis als DataFrame mit den Spalten User, PLZ, Region, Stadort.
+    Existiert die Datei nicht, ist das Ergebnis leer.
+    """
+    import pandas as pd
+
+    path = path or DEFAULT_DIRECTORY
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return _empty()
+
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        conn = _connect(path)
+        try:
+            directory = pd.read_sql_query(
+                "SELECT user AS User, plz AS PLZ, region AS Region, standort AS Stadort FROM user_regionen",
+                conn
+            )
+        finally:
+            conn.close()
+        _cache[path] = (mtime, directory)
+        return directory
+
+def save_entries(entries, path: str | None = None) -> int:
+    """Fügt Einträge (User, PLZ, Region, Stadort) ein oder aktualisiert sie."""
+    path = path or DEFAULT_DIRECTORY
+    rows = [
+        tuple('' if value is None else str(value).strip() for value in entry)
+        for entry in entries
+        if entry[0] is not None and str(entry[0]).strip()
+    ]
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT INTO user_regionen (user, plz, region, standort) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(user) DO UPDATE SET plz = excluded.plz, region = excluded.region, "
+                "standort = excluded.standort",
+                rows
+            )
+    finally:
+        conn.close()
+    return len(rows)
+
+def import_file(source: str, path: str | None = None) -> int:
+    """
+    Importiert eine CSV-Datei oder die Registerkarte "User Regionen" einer
+    Ergebnisdatei. Leere Felder überschreiben keine bereits gepflegten Werte.
+    """
+    import pandas as pd
+
+    if source.lower().endswith('.csv'):
+        table = pd.read_csv(source, dtype=str, sep=None, engine='python')
+    else:
+        table = pd.read_excel(source, sheet_name='User Regionen', dtype=str)
+    missing = [column for column in COLUMNS if column not in table.columns]
+    if missing:
+        raise ValueError(f"Spalten fehlen in {source}: {', '.join(missing)}")
+
+    table = table[COLUMNS].fillna('')
+    table = table[(table['User'].str.strip() != '') & (table['User'] != 'Gesamt')]
+
+    # Vorhandene Werte behalten, wenn das Feld in der Quelle leer ist
+    existing = load_directory(path).set_index('User')
+    entries = []
+    for user, plz, region, standort in table.itertuples(index=False, name=None):
+        user = user.strip()
+        if user in existing.index:
+            known = existing.loc[user]
+            plz = plz.strip() or known['PLZ']
+            region = region.strip() or known['Region']
+            standort = standort.strip() or known['Stadort']
+        entries.append((user, plz, region, standort))
+    return save_entries(entries, path)
+
+def main(argv=None):
+    db_help = f'Pfad zur Verzeichnisdatei (Standard {DEFAULT_DIRECTORY})'
+    parser = argparse.ArgumentParser(description='User-Regionen-Verzeichnis pflegen')
+    parser.add_argument('--db', default=None, help=db_help)
+    # --db auch nach dem Befehl; SUPPRESS, damit ein --db vor dem Befehl nicht überschrieben wird
+    db_option = argparse.ArgumentParser(add_help=False)
+    db_option.add_argument('--db', default=argparse.SUPPRESS, help=db_help)
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_cmd = commands.add_parser('import', parents=[db_option],
+                                     help='CSV oder Ergebnisdatei (Registerkarte "User Regionen") importieren')
+    import_cmd.add_argument('source')
+    commands.add_parser('show', parents=[db_option], help='Verzeichnis anzeigen')
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        if not os.path.exists(args.source):
+            print(f"Fehler: Datei {args.source} nicht gefunden!")
+            return 1
+        count = import_file(args.source, args.db)
+        print(f"{count} Einträge importiert in {args.db or DEFAULT_DIRECTORY}")
+    else:
+        directory = load_directory(args.db)
+        print(directory.to_string(index=False) if len(directory) else "Verzeichnis ist leer")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
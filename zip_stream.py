@@ -0,0 +1,54 @@
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _ChunkSink:
+    """Nicht-seekbares Ziel für ZipFile, das geschriebene Bytes bis zum Abholen puffert."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Gibt die bisher geschriebenen Bytes zurück und leert den Puffer."""
+        if self._buffer:
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            yield data
+
+
+def iter_file(source, chunk_size: int = CHUNK_SIZE):
+    """Liest eine Datei (Pfad oder Puffer wie BytesIO) blockweise."""
+    if hasattr(source, 'read'):
+        source.seek(0)
+        yield from iter(lambda: source.read(chunk_size), b'')
+        return
+    with open(source, 'rb') as f:
+        yield from iter(lambda: f.read(chunk_size), b'')
+
+
+def stream_zip(entries):
+    """
+    Erzeugt ein ZIP-Archiv als Folge von Byte-Blöcken.
+
+    `entries` liefert Paare (Dateiname im Archiv, Iterator über Byte-Blöcke).
+    Jeder Eintrag wird erst angefordert, wenn der vorherige vollständig
+    geschrieben ist; im Speicher liegt nie mehr als ein Block.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for arcname, chunks in entries:
+            with zf.open(arcname, 'w') as dest:
+                for chunk in chunks:
+                    dest.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    # Central Directory am Ende des Archivs
+    yield from sink.drain()